@@ -0,0 +1,403 @@
+"""
+Challenge bank compiler for Code Racer
+Normalizes every snippet, drops exact and whitespace-only duplicates, checks
+each answer against the snippet's AST and streams what is left into a
+challenge pack
+
+Compiled challenges are kept in a content-addressed index keyed by a hash of
+the challenge as written, so a rebuild only re-checks challenges that are
+new or changed since the last one.
+
+    python bank_compiler.py harvested.pack clean.pack
+"""
+
+import argparse
+import ast
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import tokenize
+from itertools import islice
+
+from race_engine import is_choice_prompt
+from user_dirs import cache_dir
+
+
+# Bump when normalizing or checking changes, so older index entries are not reused
+COMPILER_VERSION = 2
+
+# A challenge with fewer valid questions than this is dropped
+MIN_QUESTIONS = 1
+
+# Challenges looked up in the index at a time
+BATCH_SIZE = 1024
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# A word of prose rather than part of quoted code like self.loop or check()
+_PROSE_WORD = re.compile(r"(?<![\w.'\"(\[=,])[A-Za-z]+(?![\w.(\['\"=,)\]])")
+# Quoted text, including a quote left open where the question was cut short
+_QUOTED = re.compile(r"(?<!\w)[rRbBuUfF]{0,2}(?:'[^']*(?:'|$)|\"[^\"]*(?:\"|$))")
+_OPTION = re.compile(r"\n  \d+\) ")
+
+# Question wording (question_gen's included) that names no snippet variable,
+# even when the snippet uses the same word as a name
+_STOPWORDS = frozenset({
+    "a", "adds", "an", "and", "are", "assigns", "at", "by", "calls", "checks", "class", "condition",
+    "defined", "do", "does", "for", "from", "function", "in", "initialized", "is", "it", "line",
+    "loop", "multiplies", "of", "on", "or", "output", "over", "prints", "return", "returned", "runs",
+    "set", "starts", "subtracts", "the", "to", "updated", "updates", "where", "which", "while", "with",
+})
+
+# Question words and the constructs one of which must start on the answer line
+_CONSTRUCT_WORDS = (
+    ({"loop", "loops"}, (ast.For, ast.AsyncFor, ast.While)),
+    ({"return", "returns", "returned"}, (ast.Return,)),
+    ({"call", "calls", "called"}, (ast.Call,)),
+    ({"condition", "check", "checks", "comparison"}, (ast.If, ast.While, ast.Compare, ast.IfExp, ast.Assert)),
+)
+_PRINT_WORDS = {"print", "prints", "output", "outputs"}
+_DEFINITION_WORDS = {"defined", "definition", "defines"}
+# Question words that need an assignment to the named variable on the answer line
+_INITIALIZE_WORDS = {"initialize", "initializes", "initialized"}  # Its first assignment
+_UPDATE_WORDS = {"update", "updates", "updated"}  # Not its first assignment, or one that reads it
+_ASSIGN_WORDS = {"assign", "assigns", "assigned", "set"} | _INITIALIZE_WORDS | _UPDATE_WORDS
+# Wording for an assignment that reads the variable (not "adds x and y", which is just arithmetic)
+_CHANGE = re.compile(r"\b(?:adds?(?: \w+)? to|subtracts?(?: \w+)? from|multipl(?:y|ies)|increments?)\b", re.IGNORECASE)
+
+
+class BankIndex:
+    """Compiled challenges keyed by a hash of the challenge as written"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cache_dir(), f"bank-index-v{COMPILER_VERSION}.sqlite")
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS challenges (hash TEXT PRIMARY KEY, compiled TEXT)")
+
+    def get_many(self, keys):
+        """{hash: compiled challenge} for the given hashes that are indexed"""
+        found = {}
+        keys = list(keys)
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, compiled in self.db.execute(
+                f"SELECT hash, compiled FROM challenges WHERE hash IN ({placeholders})", chunk
+            ):
+                found[key] = json.loads(compiled)
+        return found
+
+    def store(self, rows) -> None:
+        """Save (hash, compiled challenge) rows"""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO challenges VALUES (?, ?)",
+            ((key, json.dumps(compiled, separators=(",", ":"))) for key, compiled in rows),
+        )
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def source_hash(challenge) -> str:
+    """Content address of a challenge as written (and the compiler version)"""
+    text = json.dumps([challenge["code"], challenge["questions"]], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(f"{COMPILER_VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+
+def normalize_snippet(code: str):
+    """(normalized code, leading lines removed)
+
+    Line endings become \\n, tabs become four spaces, trailing whitespace is
+    stripped and blank lines at either end are dropped.
+    """
+    lines = [line.expandtabs(4).rstrip() for line in code.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    start = 0
+    while start < len(lines) and not lines[start]:
+        start += 1
+    end = len(lines)
+    while end > start and not lines[end - 1]:
+        end -= 1
+    return "\n".join(lines[start:end]), start
+
+
+def duplicate_key(code: str) -> str:
+    """Hash shared by snippets that differ only in whitespace"""
+    try:
+        parts = []
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in (tokenize.NL, tokenize.ENDMARKER):
+                continue
+            # Indentation counts as structure, not by its width
+            parts.append(tokenize.tok_name[token.type] if token.type in (tokenize.INDENT, tokenize.DEDENT, tokenize.NEWLINE) else token.string)
+        text = "\0".join(parts)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        text = "\n".join(" ".join(line.split()) for line in code.split("\n") if line.strip())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _target_names(target):
+    """Variables and ".attributes" an assignment target stores to (the container's, for a subscript)"""
+    if isinstance(target, ast.Name):
+        return {target.id}
+    if isinstance(target, ast.Attribute):
+        return {"." + target.attr}
+    if isinstance(target, (ast.Subscript, ast.Starred)):
+        return _target_names(target.value)
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return set().union(*map(_target_names, target.elts))
+    return set()
+
+
+def _read_names(node):
+    """Names and attributes an expression reads"""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, ast.Attribute):
+            names.add(child.attr)
+    return names
+
+
+class _SnippetFacts:
+    """What the answer checks need to know about a parsed snippet"""
+
+    def __init__(self, tree, lines):
+        self.lines = lines
+        self.starts = {}  # Line -> types of the nodes starting on it
+        self.spans = {}  # Line -> last line of the statements starting on it
+        self.names = set()  # Names the snippet defines
+        self.identifiers = set()  # Every name, attribute and keyword the snippet uses
+        self.stores = {}  # Line -> (_target_names stored, whether the value reads them) per assignment on it
+        self.first_stores = {}  # Target name -> line of its first assignment
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)) and node.value is not None:
+                stored = set().union(*map(_target_names, node.targets if isinstance(node, ast.Assign) else [node.target]))
+                reads = isinstance(node, ast.AugAssign) or bool({name.lstrip(".") for name in stored} & _read_names(node.value))
+                self.stores.setdefault(node.lineno, []).append((stored, reads))
+                for name in stored:
+                    self.first_stores[name] = min(self.first_stores.get(name, node.lineno), node.lineno)
+            lineno = getattr(node, "lineno", None)
+            if lineno is not None:
+                self.starts.setdefault(lineno, set()).add(type(node))
+                if isinstance(node, ast.stmt):
+                    self.spans[lineno] = max(self.spans.get(lineno, lineno), node.end_lineno)
+                if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "print":
+                    self.starts[lineno].add("print")
+            if isinstance(node, ast.Name):
+                self.identifiers.add(node.id)
+                if isinstance(node.ctx, ast.Store):
+                    self.names.add(node.id)
+            elif isinstance(node, ast.Attribute):
+                self.identifiers.add(node.attr)
+                if isinstance(node.ctx, ast.Store):
+                    self.names.add(node.attr)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self.names.add(node.name)
+            elif isinstance(node, ast.arg):
+                self.names.add(node.arg)
+            elif isinstance(node, ast.keyword) and node.arg:
+                self.identifiers.add(node.arg)
+        self.identifiers |= self.names
+
+    def problem(self, question: str, answer: int):
+        """Why an answer cannot be right for a question, or None"""
+        text = self.lines[answer - 1]
+        starts = self.starts.get(answer, set())
+        # Text cut short with "..." may end in part of a name
+        words = set(_WORD.findall(_QUOTED.sub(" ", re.sub(r"\w*\.\.\.", " ", question))))
+        # Prose words only, and none that the snippet uses as a name (a variable called loop)
+        lowered = {word.lower() for word in _PROSE_WORD.findall(_QUOTED.sub(" ", question)) if word not in self.identifiers}
+
+        span = "\n".join(self.lines[answer - 1:self.spans.get(answer, answer)])
+        named = words & self.names - _STOPWORDS
+        for name in sorted(named):
+            if not re.search(rf"\b{re.escape(name)}\b", span):
+                return f"line {answer} does not mention {name}"
+        changes = _CHANGE.search(_QUOTED.sub(" ", question)) is not None
+        if lowered & _ASSIGN_WORDS or changes:
+            # Any name used counts, even a word like "loop" and a container that is only subscripted
+            prefixes = tuple(re.findall(r"(\w+)\.\.\.", question))
+            problem = self._assignment_problem(answer, lowered, changes, words & self.identifiers, prefixes)
+            if problem is not None:
+                return problem
+        for question_words, node_types in _CONSTRUCT_WORDS:
+            if lowered & question_words and not any(issubclass(t, node_types) for t in starts if isinstance(t, type)):
+                return f"line {answer} has no {sorted(lowered & question_words)[0]}"
+        if lowered & _PRINT_WORDS and "print" not in starts:
+            return f"line {answer} does not print"
+        if lowered & _DEFINITION_WORDS:
+            if "function" in lowered and not starts & {ast.FunctionDef, ast.AsyncFunctionDef}:
+                return f"line {answer} defines no function"
+            if "class" in lowered and ast.ClassDef not in starts:
+                return f"line {answer} defines no class"
+        if re.search(r"\bthe else\b", question) and not text.lstrip().startswith(("else", "elif")):
+            return f"line {answer} is not an else"
+        return None
+
+    def _assignment_problem(self, answer: int, lowered, changes: bool, named, prefixes):
+        """Why the answer line is not the assignment a question describes, or None
+
+        named are the snippet's names in the question and prefixes the starts
+        of names cut short; with neither, any assignment will do.
+        """
+        stores = []
+        for stored, reads in self.stores.get(answer, ()):
+            if named or prefixes:
+                stored = {name for name in stored if name.lstrip(".") in named or name.lstrip(".").startswith(prefixes)}
+            if stored:
+                stores.append((stored, reads))
+        what = " or ".join(sorted(named - _STOPWORDS or named)) or "anything"
+        if not stores:
+            return f"line {answer} does not assign {what}"
+        if changes and not any(reads for _, reads in stores):
+            return f"line {answer} does not change {what} from its old value"
+        if lowered & _UPDATE_WORDS and not any(
+            reads or any(self.first_stores[name] < answer for name in stored) for stored, reads in stores
+        ):
+            return f"line {answer} first assigns {what} rather than updating it"
+        if lowered & _INITIALIZE_WORDS and not any(
+            self.first_stores[name] == answer for stored, _ in stores for name in stored
+        ):
+            return f"line {answer} is not where {what} is first assigned"
+        return None
+
+
+def check_questions(code: str, questions):
+    """(valid questions, problems) for a normalized snippet"""
+    lines = code.split("\n")
+    try:
+        facts = _SnippetFacts(ast.parse(code), lines)
+    except (SyntaxError, ValueError):
+        # Only the line range can be checked
+        facts = None
+    valid = []
+    problems = []
+    for q in questions:
+        question, answer = q["question"], q["answer"]
+        if is_choice_prompt(question):
+            options = len(_OPTION.findall(question))
+            problem = None if 1 <= answer <= options else f"answer {answer} is not one of {options} options"
+        elif not 1 <= answer <= len(lines):
+            problem = f"answer {answer} is outside lines 1-{len(lines)}"
+        elif not lines[answer - 1].strip():
+            problem = f"line {answer} is blank"
+        else:
+            problem = facts.problem(question, answer) if facts is not None else None
+        if problem is None:
+            valid.append({"question": question, "answer": answer})
+        else:
+            problems.append(f"{question.split(chr(10))[0]!r}: {problem}")
+    return valid, problems
+
+
+def compile_challenge(challenge):
+    """The normalized, checked challenge and its duplicate key and problems"""
+    code, shift = normalize_snippet(challenge["code"])
+    questions = [
+        q if is_choice_prompt(q["question"]) else {"question": q["question"], "answer": q["answer"] - shift}
+        for q in challenge["questions"]
+    ]
+    valid, problems = check_questions(code, questions)
+    return {
+        "code": code,
+        "questions": valid,
+        "duplicate_key": duplicate_key(code),
+        "problems": problems,
+    }
+
+
+class CompileReport:
+    """Counts (and problems) from compiling a bank"""
+
+    def __init__(self):
+        self.read = 0
+        self.checked = 0  # Not found in the index
+        self.duplicates = 0
+        self.dropped = 0  # Too few valid questions left
+        self.bad_questions = 0
+        self.written = 0
+        self.problems = []  # (difficulty, first code line, problem)
+
+    def summary(self) -> str:
+        return (f"{self.read} challenges read ({self.checked} checked, {self.read - self.checked} unchanged): "
+                f"{self.duplicates} duplicates and {self.dropped} without valid questions dropped, "
+                f"{self.bad_questions} bad questions removed, {self.written} written")
+
+
+def _compiled(difficulty, challenges, index: BankIndex, seen: set, report: CompileReport):
+    challenges = iter(challenges)
+    while True:
+        batch = [c if isinstance(c, dict) else c.to_dict() for c in islice(challenges, BATCH_SIZE)]
+        if not batch:
+            return
+        keys = [source_hash(c) for c in batch]
+        known = index.get_many(set(keys))
+        fresh = {}
+        for key, challenge in zip(keys, batch):
+            if key not in known and key not in fresh:
+                fresh[key] = compile_challenge(challenge)
+        index.store(fresh.items())
+        known.update(fresh)
+        report.read += len(batch)
+        report.checked += len(fresh)
+
+        for key in keys:
+            compiled = known[key]
+            report.bad_questions += len(compiled["problems"])
+            first_line = compiled["code"].split("\n", 1)[0]
+            report.problems.extend((difficulty, first_line, problem) for problem in compiled["problems"])
+            if compiled["duplicate_key"] in seen:
+                report.duplicates += 1
+                continue
+            if len(compiled["questions"]) < MIN_QUESTIONS:
+                report.dropped += 1
+                continue
+            # Only kept challenges count, so a later valid copy of a dropped one is kept
+            seen.add(compiled["duplicate_key"])
+            report.written += 1
+            yield {"code": compiled["code"], "questions": compiled["questions"]}
+
+
+def compile_bank(bank, index: BankIndex, report: CompileReport):
+    """The bank cleaned up for write_pack, filling in the report as it is read
+
+    Duplicates are found across difficulties too; the first one read is kept.
+    """
+    seen = set()
+    return {difficulty: _compiled(difficulty, challenges, index, seen, report) for difficulty, challenges in bank.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check, deduplicate and pack a Code Racer challenge bank")
+    parser.add_argument("source", help="challenge pack to compile")
+    parser.add_argument("output", help="challenge pack to write")
+    parser.add_argument("--show", type=int, default=20, metavar="N", help="problems to print (default 20)")
+    args = parser.parse_args()
+
+    from challenge_pack import ChallengePack, PackError, write_pack
+
+    index = BankIndex()
+    report = CompileReport()
+    try:
+        with ChallengePack(args.source) as source:
+            write_pack(args.output, compile_bank(source, index, report))
+    except (OSError, PackError) as error:
+        sys.exit(f"bank_compiler: {error}")
+    finally:
+        index.close()
+    print(report.summary())
+    for difficulty, first_line, problem in report.problems[:args.show]:
+        print(f"  {difficulty:<13} {first_line[:40]:<40}  {problem}")
+    if len(report.problems) > args.show:
+        print(f"  ... and {len(report.problems) - args.show} more")
+
+
+if __name__ == "__main__":
+    main()
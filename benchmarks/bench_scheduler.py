@@ -0,0 +1,97 @@
+"""
+Benchmark for the adaptive challenge scheduler
+Simulates a player racing a large synthetic bank and times picking the
+next challenge, recording a race, and saving / loading the state file
+
+Run from the repository root:
+    python benchmarks/bench_scheduler.py --bank-size 100000 --races 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Sequence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from race_engine import Challenge, RaceClock, RaceSession  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+
+
+class SyntheticChallenges(Sequence):
+    """A bank difficulty of distinct challenges built on demand"""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        lines = [f"x = {index}", "y = x + 1", "print(y)"]
+        return Challenge(lines, ["Which line defines x?", "Which line prints?"], [1, 3])
+
+
+def play(session: RaceSession, rng: random.Random, error_rate: float) -> None:
+    """Answer every question, missing some first"""
+    while not session.finished:
+        if rng.random() < error_rate:
+            session.submit(0)
+        session.submit(session.current_answer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the challenge scheduler")
+    parser.add_argument("--bank-size", type=int, default=100_000)
+    parser.add_argument("--races", type=int, default=20_000)
+    parser.add_argument("--error-rate", type=float, default=0.2, help="chance of a miss before each answer")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bank = {"beginner": SyntheticChallenges(args.bank_size)}
+    scheduler = Scheduler(rng=rng)
+
+    pick_ns = record_ns = 0
+    reviews = 0
+    for _ in range(args.races):
+        start = time.perf_counter_ns()
+        index, challenge = scheduler.pick(bank, "beginner")
+        pick_ns += time.perf_counter_ns() - start
+        if index in scheduler.deck("beginner").entries:
+            reviews += 1
+        # Races take no time, so speed never costs a grade
+        session = RaceSession("beginner", challenge, clock=RaceClock(lambda: 0))
+        play(session, rng, args.error_rate)
+        start = time.perf_counter_ns()
+        scheduler.record(index, session)
+        record_ns += time.perf_counter_ns() - start
+
+    deck = scheduler.deck("beginner")
+    print(f"{args.races} races over a {args.bank_size}-challenge bank: "
+          f"{len(deck.entries)} challenges seen, {reviews} reviews")
+    print(f"pick:   {pick_ns / args.races / 1000:.1f} us per race")
+    print(f"record: {record_ns / args.races / 1000:.1f} us per race")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "state.sched")
+        start = time.perf_counter()
+        scheduler.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = Scheduler(path)
+        load_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+    assert len(loaded.deck("beginner").entries) == len(deck.entries)
+    print(f"state file: {size} bytes ({size / max(1, len(deck.entries)):.1f} per challenge), "
+          f"saved in {saved * 1000:.1f} ms, loaded in {load_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cold start benchmark for Code Racer
+Starts fresh Python processes and times importing code_racer (with
+-X importtime) and launching the app until HomeScreen has painted
+
+Run from the repository root:
+    python benchmarks/bench_startup.py --output startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_tui import ROOT, compare, git_commit
+
+
+# Modules only a race needs; none of them should load before a difficulty is picked
+DEFERRED_MODULES = ("game_screen", "builtin_challenges", "race_engine", "race_server", "leaderboard", "challenge_pack", "scheduler", "session_snapshot")
+
+FIRST_PAINT_SCRIPT = """
+import asyncio, sys, time
+sys.path.insert(0, {root!r})
+from code_racer import CodeRacerApp, HomeScreen
+
+async def main():
+    app = CodeRacerApp()
+    async with app.run_test(size=(120, 50)) as pilot:
+        while not isinstance(app.screen, HomeScreen):
+            await pilot.pause()
+        await pilot.pause()
+        print(time.time_ns())
+        print(",".join(sorted(name for name in {deferred!r} if name in sys.modules)))
+
+asyncio.run(main())
+"""
+
+
+def import_times():
+    """Self and cumulative import time in microseconds for every module code_racer pulls in"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import code_racer"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def first_paint():
+    """Milliseconds from spawning a process to HomeScreen painting, and any deferred modules loaded"""
+    script = FIRST_PAINT_SCRIPT.format(root=ROOT, deferred=DEFERRED_MODULES)
+    start = time.time_ns()
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    # The last two lines; the second may be empty
+    painted, loaded = result.stdout.split("\n")[-3:-1]
+    return (int(painted) - start) / 1e6, [name for name in loaded.split(",") if name]
+
+
+def summarize(samples):
+    return {
+        name: {
+            "runs": len(values),
+            "min_ms": round(min(values), 3),
+            "median_ms": round(statistics.median(values), 3),
+            "mean_ms": round(statistics.fmean(values), 3),
+            "max_ms": round(max(values), 3),
+        }
+        for name, values in samples.items()
+    }
+
+
+def run(runs: int):
+    samples = {"import_code_racer": [], "import_textual_app": [], "spawn_to_home_paint": []}
+    loaded = set()
+    slowest = {}
+    for _ in range(runs):
+        times = import_times()
+        samples["import_code_racer"].append(times["code_racer"][1] / 1000)
+        samples["import_textual_app"].append(times["textual.app"][1] / 1000)
+        for name, (self_us, _) in times.items():
+            slowest[name] = max(slowest.get(name, 0), self_us)
+        paint_ms, deferred_loaded = first_paint()
+        samples["spawn_to_home_paint"].append(paint_ms)
+        loaded.update(deferred_loaded)
+
+    from textual import __version__ as textual_version
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "textual": textual_version,
+        "timestamp": time.time(),
+        "results": summarize(samples),
+        "deferred_modules_loaded_at_home": sorted(loaded),
+        "slowest_imports_us": dict(sorted(slowest.items(), key=lambda item: -item[1])[:15]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Code Racer's cold start")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to time")
+    parser.add_argument("--output", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare against an earlier JSON result")
+    args = parser.parse_args()
+
+    # Keep the benchmark off the player's real leaderboard and caches
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["XDG_DATA_HOME"] = os.path.join(scratch, "data")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(scratch, "cache")
+        report = run(args.runs)
+
+    for name, result in report["results"].items():
+        print(f"{name:28} median {result['median_ms']:9.3f} ms  (min {result['min_ms']:.3f}, "
+              f"max {result['max_ms']:.3f}, {result['runs']} runs)")
+    loaded = report["deferred_modules_loaded_at_home"]
+    print(f"race-only modules loaded by the home screen: {', '.join(loaded) if loaded else 'none'}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmarks for the Code Racer TUI hot paths
+Drives CodeRacerApp headlessly through Textual's App.run_test() and times
+startup, race start, answering, results and ESC/restart cycles
+
+Answers are timed by the app itself (its answer.check and answer.feedback
+measurements), from the Enter key being handled to the feedback being
+repainted. Timing them around Pilot would mostly measure Pilot's own
+fixed waits.
+
+Run from the repository root:
+    python benchmarks/bench_tui.py --output bench.json
+    python benchmarks/bench_tui.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from perf_stats import PerfStats  # noqa: E402
+
+
+SIZE = (120, 50)
+
+
+def ms_since(start: int) -> float:
+    return (time.perf_counter_ns() - start) / 1e6
+
+
+async def settle(pilot, until) -> None:
+    """Let the app process messages until until() is true"""
+    while True:
+        await pilot.pause()
+        if until():
+            return
+
+
+class SamplingPerfStats(PerfStats):
+    """PerfStats that also keeps every duration, in ms, for exact medians"""
+
+    def __init__(self):
+        super().__init__()
+        self.samples = {}
+
+    def record(self, name: str, ns: int) -> None:
+        super().record(name, ns)
+        self.samples.setdefault(name, []).append(ns / 1e6)
+
+
+async def answer(pilot, app, line: int) -> float:
+    """Type a line number and press Enter; the app's time from Enter to repainted feedback"""
+    feedback = app.perf.samples.setdefault("answer.feedback", [])
+    answered = len(feedback)
+    for digit in str(line):
+        await pilot.press(digit)
+    await pilot.press("enter")
+    await settle(pilot, lambda: len(feedback) > answered)
+    return feedback[-1]
+
+
+def check_visible(screen, *widgets) -> None:
+    """Fail if a widget is laid out off screen, where its renders would never be timed"""
+    for widget in widgets:
+        if not widget.region.intersection(screen.region):
+            raise RuntimeError(f"#{widget.id} is off screen at {widget.region}")
+
+
+async def bench_startup(app_factory, samples):
+    from code_racer import HomeScreen
+
+    start = time.perf_counter_ns()
+    app = app_factory()
+    async with app.run_test(size=SIZE) as pilot:
+        await settle(pilot, lambda: isinstance(app.screen, HomeScreen))
+        samples["startup_to_home"].append(ms_since(start))
+
+
+async def bench_race(app_factory, samples, cycles: int):
+    from code_racer import HomeScreen
+    from game_screen import GameScreen
+
+    app = app_factory()
+    app.perf = SamplingPerfStats()
+    async with app.run_test(size=SIZE) as pilot:
+        await settle(pilot, lambda: isinstance(app.screen, HomeScreen))
+        for _ in range(cycles):
+            start = time.perf_counter_ns()
+            app.start_race("intermediate")
+            await settle(pilot, lambda: isinstance(app.screen, GameScreen) and app.screen.is_mounted)
+            samples["start_race_to_first_paint"].append(ms_since(start))
+            check_visible(app.screen, app.screen.timer, app.screen.progress, app.screen.code_display)
+
+            session = app.screen.session
+            # One wrong answer per race so the miss path is timed too
+            samples["feedback_wrong"].append(await answer(pilot, app, session.current_answer % len(session.challenge.lines) + 1))
+            while session.total_questions - session.current_question_idx > 1:
+                samples["feedback_correct"].append(await answer(pilot, app, session.current_answer))
+            samples["feedback_results"].append(await answer(pilot, app, session.current_answer))
+
+            start = time.perf_counter_ns()
+            await pilot.press("escape")
+            await settle(pilot, lambda: isinstance(app.screen, HomeScreen))
+            samples["escape_to_home"].append(ms_since(start))
+        # check_answer alone, for every answer above
+        samples["answer_check"].extend(app.perf.samples.get("answer.check", ()))
+
+
+def summarize(samples):
+    return {
+        name: {
+            "runs": len(values),
+            "min_ms": round(min(values), 3),
+            "median_ms": round(statistics.median(values), 3),
+            "mean_ms": round(statistics.fmean(values), 3),
+            "max_ms": round(max(values), 3),
+        }
+        for name, values in samples.items()
+        if values
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline) -> None:
+    print(f"{'benchmark':28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        old, new = before["median_ms"], result["median_ms"]
+        change = (new - old) / old if old else 0.0
+        print(f"{name:28} {old:10.3f} {new:10.3f} {change:+8.1%}")
+
+
+async def run(args):
+    from textual import __version__ as textual_version
+
+    from code_racer import CodeRacerApp
+
+    random.seed(args.seed)
+    samples = {name: [] for name in (
+        "startup_to_home", "start_race_to_first_paint", "feedback_wrong",
+        "feedback_correct", "feedback_results", "answer_check", "escape_to_home",
+    )}
+    for _ in range(args.startups):
+        await bench_startup(CodeRacerApp, samples)
+    await bench_race(CodeRacerApp, samples, args.cycles)
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "textual": textual_version,
+        "timestamp": time.time(),
+        "results": summarize(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Code Racer TUI headlessly")
+    parser.add_argument("--startups", type=int, default=5, help="app start-ups to time")
+    parser.add_argument("--cycles", type=int, default=20, help="race / ESC cycles to time")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare against an earlier JSON result")
+    args = parser.parse_args()
+
+    # Keep benchmark races off the player's real leaderboard and caches
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["XDG_DATA_HOME"] = os.path.join(scratch, "data")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(scratch, "cache")
+        report = asyncio.run(run(args))
+
+    for name, result in report["results"].items():
+        print(f"{name:28} median {result['median_ms']:9.3f} ms  (min {result['min_ms']:.3f}, "
+              f"max {result['max_ms']:.3f}, {result['runs']} runs)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
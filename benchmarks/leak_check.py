@@ -0,0 +1,126 @@
+"""
+Memory leak check for Code Racer's race cycle
+Drives CodeRacerApp headlessly through many start race / answer / results /
+ESC cycles and fails if the number of live screens and widgets grows, or if
+traced memory still grows over the second half of the run (bounded caches
+in Textual and the highlighter fill up during the first few hundred races)
+
+Run from the repository root:
+    python benchmarks/leak_check.py --cycles 1000
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_tui import SIZE, settle
+
+
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+
+
+def live_counts():
+    """Live GameScreen and widget objects"""
+    from textual.widget import Widget
+
+    from game_screen import GameScreen
+
+    gc.collect()
+    screens = widgets = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, GameScreen):
+            screens += 1
+        elif isinstance(obj, Widget):
+            widgets += 1
+    return screens, widgets
+
+
+async def race(pilot, app, difficulty: str) -> None:
+    """One full race: start, a wrong answer, every right answer, results, ESC"""
+    from code_racer import HomeScreen
+    from game_screen import GameScreen
+
+    app.start_race(difficulty)
+    await settle(pilot, lambda: isinstance(app.screen, GameScreen))
+    screen = app.screen
+    session = screen.session
+    answer_input = screen.query_one("#answer-input")
+    answer_input.value = str(session.current_answer % len(session.challenge.lines) + 1)
+    screen.submit_answer()
+    while not session.finished:
+        answer_input.value = str(session.current_answer)
+        screen.submit_answer()
+    await pilot.pause()
+    await pilot.press("escape")
+    await settle(pilot, lambda: isinstance(app.screen, HomeScreen))
+
+
+async def run(args):
+    from code_racer import CodeRacerApp, HomeScreen
+
+    # Traced from the start, so memory freed after the warm-up counts too
+    tracemalloc.start()
+    app = CodeRacerApp()
+    async with app.run_test(size=SIZE) as pilot:
+        await settle(pilot, lambda: isinstance(app.screen, HomeScreen))
+        for cycle in range(args.warmup):
+            await race(pilot, app, DIFFICULTIES[cycle % len(DIFFICULTIES)])
+        app.leaderboard.flush()
+
+        gc.collect()
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        baseline_screens, baseline_widgets = live_counts()
+        start = time.perf_counter()
+        halfway = args.cycles // 2
+        halfway_bytes = baseline_bytes
+        for cycle in range(1, args.cycles + 1):
+            await race(pilot, app, DIFFICULTIES[cycle % len(DIFFICULTIES)])
+            if cycle % args.report_every == 0 or cycle == halfway:
+                app.leaderboard.flush()
+                gc.collect()
+                current = tracemalloc.get_traced_memory()[0]
+                if cycle == halfway:
+                    halfway_bytes = current
+                print(f"cycle {cycle:5d}: {(current - baseline_bytes) / 1024:+9.1f} KiB traced")
+        elapsed = time.perf_counter() - start
+        app.leaderboard.flush()
+        gc.collect()
+        final_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        final_screens, final_widgets = live_counts()
+
+    print(f"{args.cycles} race cycles in {elapsed:.1f} s ({elapsed / args.cycles * 1000:.1f} ms per cycle)")
+    print(f"game screens: {baseline_screens} -> {final_screens}, widgets: {baseline_widgets} -> {final_widgets}")
+    growth = final_bytes - baseline_bytes
+    print(f"traced memory: {growth / 1024:+.1f} KiB over all {args.cycles} cycles")
+    per_cycle = (final_bytes - halfway_bytes) / max(1, args.cycles - halfway)
+    print(f"second half: {per_cycle:+.1f} bytes per cycle")
+    ok = final_screens <= len(DIFFICULTIES) and final_widgets <= baseline_widgets and per_cycle <= args.max_bytes_per_cycle
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that memory stays flat over many races")
+    parser.add_argument("--cycles", type=int, default=1000, help="race cycles to run after warming up")
+    parser.add_argument("--warmup", type=int, default=30, help="race cycles before measuring")
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--max-bytes-per-cycle", type=int, default=256,
+                        help="allowed traced memory growth per cycle")
+    args = parser.parse_args()
+
+    # Keep benchmark races off the player's real leaderboard and caches
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["XDG_DATA_HOME"] = os.path.join(scratch, "data")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(scratch, "cache")
+        ok = asyncio.run(run(args))
+    print("OK: memory is flat" if ok else "FAIL: memory grows with every race")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Memory footprint check for the challenge data model
+Builds a synthetic bank as plain dicts and as Challenge objects, measures
+both with tracemalloc and fails if Challenge loses its advantage
+
+Run from the repository root: python benchmarks/memory_footprint.py
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from race_engine import Challenge  # noqa: E402
+
+
+CHALLENGES = 20000
+
+# Challenge objects must use at most this fraction of the dict layout's memory
+MAX_RATIO = 0.6
+
+PROMPTS = [
+    "Where is the result list initialized?",
+    "Which line starts the loop?",
+    "Where is the comparison?",
+    "Which line updates the total?",
+    "Where is the result returned?",
+]
+
+
+def raw_challenge(i: int):
+    # Every snippet is distinct, as they would be in a harvested bank
+    code = "\n".join(f"value_{i}_{line} = compute({line}, {i})" for line in range(7))
+    return {"code": code, "questions": [{"question": p, "answer": n + 1} for n, p in enumerate(PROMPTS)]}
+
+
+def measure(build):
+    """Bytes allocated by build() that are still alive afterwards"""
+    sources = [raw_challenge(i) for i in range(CHALLENGES)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    bank = build(sources)
+    del sources
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(bank) == CHALLENGES
+    return after - before
+
+
+def build_dicts(sources):
+    # A copy of what json.loads would produce for each challenge
+    return [
+        {"code": "".join(s["code"]), "questions": [{"question": "".join(q["question"]), "answer": q["answer"]} for q in s["questions"]]}
+        for s in sources
+    ]
+
+
+def build_challenges(sources):
+    return [Challenge.from_dict(s) for s in sources]
+
+
+def main() -> int:
+    dict_bytes = measure(build_dicts)
+    challenge_bytes = measure(build_challenges)
+    ratio = challenge_bytes / dict_bytes
+    print(f"dict layout:      {dict_bytes / CHALLENGES:8.0f} bytes per challenge")
+    print(f"Challenge layout: {challenge_bytes / CHALLENGES:8.0f} bytes per challenge ({ratio:.0%})")
+    if ratio > MAX_RATIO:
+        print(f"FAIL: Challenge uses more than {MAX_RATIO:.0%} of the dict layout")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
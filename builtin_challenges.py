@@ -0,0 +1,235 @@
+"""
+Built-in challenges for Code Racer
+The hand-written challenge bank, importable without the Textual UI
+"""
+
+from race_engine import build_bank
+
+
+# Expanded code challenges organized by difficulty
+CODE_CHALLENGES = {
+    "beginner": [
+        {
+            "code": '''total = 0
+for i in range(5):
+    total += i
+print(total)''',
+            "questions": [
+                {"question": "Where is total initialized?", "answer": 1},
+                {"question": "Which line starts the loop?", "answer": 2},
+                {"question": "Where does the addition happen?", "answer": 3},
+                {"question": "Which line outputs the result?", "answer": 4},
+                {"question": "What does this print?\n  1) 9\n  2) 10\n  3) 0\n  4) 5", "answer": 2},
+            ]
+        },
+        {
+            "code": '''name = "Python"
+length = len(name)
+print(length)''',
+            "questions": [
+                {"question": "Where is the variable 'name' created?", "answer": 1},
+                {"question": "Which line calculates the length?", "answer": 2},
+                {"question": "Where is the output statement?", "answer": 3},
+                {"question": "What does this print?\n  1) 16\n  2) 12\n  3) 7\n  4) 6", "answer": 4},
+            ]
+        },
+        {
+            "code": '''x = 10
+y = 20
+result = x + y
+print(result)''',
+            "questions": [
+                {"question": "Where is x assigned?", "answer": 1},
+                {"question": "Which line adds x and y?", "answer": 3},
+                {"question": "Where is y defined?", "answer": 2},
+                {"question": "What does this print?\n  1) 40\n  2) 29\n  3) 20\n  4) 30", "answer": 4},
+            ]
+        },
+        {
+            "code": '''numbers = [1, 2, 3, 4, 5]
+first = numbers[0]
+last = numbers[-1]
+print(first, last)''',
+            "questions": [
+                {"question": "Where is the list created?", "answer": 1},
+                {"question": "Which line gets the first element?", "answer": 2},
+                {"question": "Where is the last element accessed?", "answer": 3},
+                {"question": "What does this print?\n  1) 1 10\n  2) 1 5\n  3) 1 15\n  4) 0 5", "answer": 2},
+                {"question": "What is last at the end?\n  1) 4\n  2) 6\n  3) 10\n  4) 5", "answer": 4},
+            ]
+        },
+        {
+            "code": '''age = 25
+if age >= 18:
+    print("Adult")
+else:
+    print("Minor")''',
+            "questions": [
+                {"question": "Where is the condition check?", "answer": 2},
+                {"question": "Which line prints 'Adult'?", "answer": 3},
+                {"question": "Where is the else clause?", "answer": 4},
+                {"question": "What does this print?\n  1) 18\n  2) Adult\n  3) 25\n  4) Minor", "answer": 2},
+            ]
+        },
+    ],
+    "intermediate": [
+        {
+            "code": '''lower_str = ""
+for letter in my_str:
+    if "A" <= letter <= "Z":
+        lower_str += chr(ord(letter) + 32)
+    else:
+        lower_str += letter
+return lower_str''',
+            "questions": [
+                {"question": "Where does the loop start?", "answer": 2},
+                {"question": "Which line initializes the empty string?", "answer": 1},
+                {"question": "Where is the uppercase check condition?", "answer": 3},
+                {"question": "Which line converts uppercase to lowercase?", "answer": 4},
+                {"question": "Where is the result returned?", "answer": 7},
+            ]
+        },
+        {
+            "code": '''total = 0
+for num in numbers:
+    if num % 2 == 0:
+        total += num
+return total''',
+            "questions": [
+                {"question": "Where is the total initialized?", "answer": 1},
+                {"question": "Which line checks if a number is even?", "answer": 3},
+                {"question": "Where does the loop begin?", "answer": 2},
+                {"question": "Which line adds to the total?", "answer": 4},
+                {"question": "Where is the result returned?", "answer": 5},
+            ]
+        },
+        {
+            "code": '''def find_max(lst):
+    max_val = lst[0]
+    for num in lst:
+        if num > max_val:
+            max_val = num
+    return max_val''',
+            "questions": [
+                {"question": "Where is the function defined?", "answer": 1},
+                {"question": "Which line initializes max_val?", "answer": 2},
+                {"question": "Where is the comparison?", "answer": 4},
+                {"question": "Which line updates max_val?", "answer": 5},
+            ]
+        },
+        {
+            "code": '''words = ["hello", "world", "python"]
+result = []
+for word in words:
+    result.append(word.upper())
+print(result)''',
+            "questions": [
+                {"question": "Where is the result list initialized?", "answer": 2},
+                {"question": "Which line converts to uppercase?", "answer": 4},
+                {"question": "Where does the loop start?", "answer": 3},
+                {"question": "Which line prints the output?", "answer": 5},
+                {"question": "What does this print?\n  1) ['HELLO', 'WORLD', 'PYTHON']\n  2) world\n  3) python\n  4) hello", "answer": 1},
+            ]
+        },
+        {
+            "code": '''count = 0
+while count < 10:
+    if count % 3 == 0:
+        print(count)
+    count += 1''',
+            "questions": [
+                {"question": "Where is the while loop condition?", "answer": 2},
+                {"question": "Which line checks divisibility by 3?", "answer": 3},
+                {"question": "Where is count incremented?", "answer": 5},
+                {"question": "Which line prints the count?", "answer": 4},
+                {"question": "What does this print?\n  1) -1 | 3 | 6 | 9\n  2) 0 | 3 | 6 | 9\n  3) 0 | 3 | 6 | 19\n  4) 10", "answer": 2},
+            ]
+        },
+    ],
+    "advanced": [
+        {
+            "code": '''result = []
+for i in range(len(data)):
+    if data[i] > 0:
+        result.append(data[i] * 2)
+    else:
+        result.append(0)
+return result''',
+            "questions": [
+                {"question": "Where is the result list created?", "answer": 1},
+                {"question": "Which line checks if a value is positive?", "answer": 3},
+                {"question": "Where does the multiplication happen?", "answer": 4},
+                {"question": "Which line appends zero for negative values?", "answer": 6},
+                {"question": "Where is the result returned?", "answer": 7},
+            ]
+        },
+        {
+            "code": '''def fibonacci(n):
+    if n <= 1:
+        return n
+    return fibonacci(n-1) + fibonacci(n-2)
+
+result = fibonacci(5)''',
+            "questions": [
+                {"question": "Where does the function definition start?", "answer": 1},
+                {"question": "Which line contains the base case check?", "answer": 2},
+                {"question": "Where is the recursive call?", "answer": 4},
+                {"question": "Which line calls the function?", "answer": 6},
+                {"question": "Where is the base case return?", "answer": 3},
+                {"question": "What is result at the end?\n  1) 6\n  2) 15\n  3) 5\n  4) 10", "answer": 3},
+            ]
+        },
+        {
+            "code": '''matrix = [[1, 2], [3, 4], [5, 6]]
+flat = []
+for row in matrix:
+    for item in row:
+        flat.append(item)
+print(flat)''',
+            "questions": [
+                {"question": "Where is the matrix defined?", "answer": 1},
+                {"question": "Which line starts the outer loop?", "answer": 3},
+                {"question": "Where is the inner loop?", "answer": 4},
+                {"question": "Which line appends to flat?", "answer": 5},
+                {"question": "What does this print?\n  1) [1, 2, 3, 3, 5, 6]\n  2) [1, 2, 13, 4, 5, 6]\n  3) [1, 2, 3, 4, 5, 6]\n  4) 1", "answer": 3},
+            ]
+        },
+        {
+            "code": '''def quick_sort(arr):
+    if len(arr) <= 1:
+        return arr
+    pivot = arr[len(arr) // 2]
+    left = [x for x in arr if x < pivot]
+    middle = [x for x in arr if x == pivot]
+    right = [x for x in arr if x > pivot]
+    return quick_sort(left) + middle + quick_sort(right)''',
+            "questions": [
+                {"question": "Where is the base case?", "answer": 2},
+                {"question": "Which line selects the pivot?", "answer": 4},
+                {"question": "Where is the left partition created?", "answer": 5},
+                {"question": "Which line contains the recursive calls?", "answer": 8},
+                {"question": "Where is the right partition?", "answer": 7},
+            ]
+        },
+        {
+            "code": '''class Node:
+    def __init__(self, data):
+        self.data = data
+        self.next = None
+
+head = Node(1)
+head.next = Node(2)''',
+            "questions": [
+                {"question": "Where is the class defined?", "answer": 1},
+                {"question": "Which line initializes the data attribute?", "answer": 3},
+                {"question": "Where is the next pointer set to None?", "answer": 4},
+                {"question": "Which line creates the first node?", "answer": 6},
+                {"question": "Where is the second node linked?", "answer": 7},
+            ]
+        },
+    ]
+}
+
+
+# The built-in challenges as compact Challenge objects
+BUILTIN_BANK = build_bank(CODE_CHALLENGES)
@@ -0,0 +1,167 @@
+"""
+Challenge packs for Code Racer
+An on-disk challenge bank with a compact offset index per difficulty, read
+through mmap so that picking a challenge only decodes that one record
+
+Pack layout (all integers little-endian):
+    header   magic b"CRPK", version u16, difficulty count u16
+    table    per difficulty: name length u8, name (utf-8), count u32, index offset u64
+    records  one UTF-8 JSON object per challenge ({"code": ..., "questions": [...]})
+    indexes  per difficulty: count + 1 u64 file offsets, record i is [off[i], off[i + 1])
+"""
+
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+
+from race_engine import Challenge
+
+
+MAGIC = b"CRPK"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHH")
+_TABLE_ENTRY = struct.Struct("<IQ")
+_OFFSET = struct.Struct("<Q")
+_SPAN = struct.Struct("<QQ")
+
+
+class PackError(Exception):
+    """Raised when a file is not a readable challenge pack"""
+
+
+def write_pack(path, bank) -> None:
+    """Write a bank ({difficulty: [challenge, ...]}) to a challenge pack
+
+    Challenges may be Challenge objects or challenge dicts.
+
+    Challenges are streamed to disk one at a time and the file is swapped
+    into place atomically once complete.
+    """
+    names = list(bank)
+    encoded_names = [name.encode("utf-8") for name in names]
+    table_size = sum(1 + len(name) + _TABLE_ENTRY.size for name in encoded_names)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * (_HEADER.size + table_size))
+
+        offsets = {}
+        for name in names:
+            spans = [f.tell()]
+            for challenge in bank[name]:
+                if isinstance(challenge, Challenge):
+                    record = challenge.to_dict()
+                else:
+                    record = {"code": challenge["code"], "questions": challenge["questions"]}
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+                spans.append(f.tell())
+            offsets[name] = spans
+
+        table = []
+        for name, encoded in zip(names, encoded_names):
+            spans = offsets[name]
+            table.append((encoded, len(spans) - 1, f.tell()))
+            f.write(struct.pack(f"<{len(spans)}Q", *spans))
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(table)))
+        for encoded, count, index_offset in table:
+            f.write(bytes((len(encoded),)) + encoded)
+            f.write(_TABLE_ENTRY.pack(count, index_offset))
+    os.replace(tmp_path, path)
+
+
+class PackDifficulty(Sequence):
+    """The challenges of one difficulty, decoded into Challenges only when indexed"""
+
+    __slots__ = ("_map", "_index_offset", "_count")
+
+    def __init__(self, mapped, index_offset: int, count: int):
+        self._map = mapped
+        self._index_offset = index_offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("challenge index out of range")
+        start, end = _SPAN.unpack_from(self._map, self._index_offset + i * _OFFSET.size)
+        return Challenge.from_dict(json.loads(self._map[start:end]))
+
+
+class ChallengePack:
+    """Read-only challenge bank backed by a memory-mapped pack file
+
+    Behaves like a built bank: pack["beginner"] is a sequence of
+    Challenges, so random.choice(pack[difficulty]) reads one record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PackError(f"{path}: empty file")
+        try:
+            self._difficulties = self._read_table()
+        except (PackError, struct.error, UnicodeDecodeError) as e:
+            self.close()
+            raise PackError(f"{path}: {e}") from None
+
+    def _read_table(self):
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise PackError("not a challenge pack")
+        if version != VERSION:
+            raise PackError(f"unsupported pack version {version}")
+
+        difficulties = {}
+        pos = _HEADER.size
+        for _ in range(count):
+            name_len = self._map[pos]
+            name = self._map[pos + 1:pos + 1 + name_len].decode("utf-8")
+            pos += 1 + name_len
+            challenge_count, index_offset = _TABLE_ENTRY.unpack_from(self._map, pos)
+            pos += _TABLE_ENTRY.size
+            difficulties[name] = PackDifficulty(self._map, index_offset, challenge_count)
+        return difficulties
+
+    def __getitem__(self, difficulty: str) -> PackDifficulty:
+        return self._difficulties[difficulty]
+
+    def __contains__(self, difficulty) -> bool:
+        return difficulty in self._difficulties
+
+    def __iter__(self):
+        return iter(self._difficulties)
+
+    def __len__(self) -> int:
+        return len(self._difficulties)
+
+    def keys(self):
+        return self._difficulties.keys()
+
+    def items(self):
+        return self._difficulties.items()
+
+    def close(self) -> None:
+        self._difficulties = {}
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
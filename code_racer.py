@@ -1,329 +1,76 @@
 """
 Code Racer - A racing-themed code reading quiz game
 Enhanced version with better UI, timing system, and expanded question bank
+
+Only what the home screen needs is imported up front; the game screen,
+the challenge bank, the leaderboard and the race client are loaded the
+first time they are used, so the menu paints as soon as Textual is up.
 """
 
+import argparse
+import getpass
+import os
+import struct
+
 from textual.app import App, ComposeResult
-from textual.widgets import Header, Footer, Static, Input, Button, Label
-from textual.containers import Container, Vertical, Horizontal, Center, ScrollableContainer
+from textual.widgets import Static, Button, Checkbox
+from textual.containers import Vertical, Center
 from textual.binding import Binding
 from textual.screen import Screen
-from textual import events
-import random
-import time
-
-
-# Expanded code challenges organized by difficulty
-CODE_CHALLENGES = {
-    "beginner": [
-        {
-            "code": '''total = 0
-for i in range(5):
-    total += i
-print(total)''',
-            "questions": [
-                {"question": "Where is total initialized?", "answer": 1},
-                {"question": "Which line starts the loop?", "answer": 2},
-                {"question": "Where does the addition happen?", "answer": 3},
-                {"question": "Which line outputs the result?", "answer": 4},
-            ]
-        },
-        {
-            "code": '''name = "Python"
-length = len(name)
-print(length)''',
-            "questions": [
-                {"question": "Where is the variable 'name' created?", "answer": 1},
-                {"question": "Which line calculates the length?", "answer": 2},
-                {"question": "Where is the output statement?", "answer": 3},
-            ]
-        },
-        {
-            "code": '''x = 10
-y = 20
-result = x + y
-print(result)''',
-            "questions": [
-                {"question": "Where is x assigned?", "answer": 1},
-                {"question": "Which line adds x and y?", "answer": 3},
-                {"question": "Where is y defined?", "answer": 2},
-            ]
-        },
-        {
-            "code": '''numbers = [1, 2, 3, 4, 5]
-first = numbers[0]
-last = numbers[-1]
-print(first, last)''',
-            "questions": [
-                {"question": "Where is the list created?", "answer": 1},
-                {"question": "Which line gets the first element?", "answer": 2},
-                {"question": "Where is the last element accessed?", "answer": 3},
-            ]
-        },
-        {
-            "code": '''age = 25
-if age >= 18:
-    print("Adult")
-else:
-    print("Minor")''',
-            "questions": [
-                {"question": "Where is the condition check?", "answer": 2},
-                {"question": "Which line prints 'Adult'?", "answer": 3},
-                {"question": "Where is the else clause?", "answer": 4},
-            ]
-        },
-    ],
-    "intermediate": [
-        {
-            "code": '''lower_str = ""
-for letter in my_str:
-    if "A" <= letter <= "Z":
-        lower_str += chr(ord(letter) + 32)
-    else:
-        lower_str += letter
-return lower_str''',
-            "questions": [
-                {"question": "Where does the loop start?", "answer": 2},
-                {"question": "Which line initializes the empty string?", "answer": 1},
-                {"question": "Where is the uppercase check condition?", "answer": 3},
-                {"question": "Which line converts uppercase to lowercase?", "answer": 4},
-                {"question": "Where is the result returned?", "answer": 7},
-            ]
-        },
-        {
-            "code": '''total = 0
-for num in numbers:
-    if num % 2 == 0:
-        total += num
-return total''',
-            "questions": [
-                {"question": "Where is the total initialized?", "answer": 1},
-                {"question": "Which line checks if a number is even?", "answer": 3},
-                {"question": "Where does the loop begin?", "answer": 2},
-                {"question": "Which line adds to the total?", "answer": 4},
-                {"question": "Where is the result returned?", "answer": 5},
-            ]
-        },
-        {
-            "code": '''def find_max(lst):
-    max_val = lst[0]
-    for num in lst:
-        if num > max_val:
-            max_val = num
-    return max_val''',
-            "questions": [
-                {"question": "Where is the function defined?", "answer": 1},
-                {"question": "Which line initializes max_val?", "answer": 2},
-                {"question": "Where is the comparison?", "answer": 4},
-                {"question": "Which line updates max_val?", "answer": 5},
-            ]
-        },
-        {
-            "code": '''words = ["hello", "world", "python"]
-result = []
-for word in words:
-    result.append(word.upper())
-print(result)''',
-            "questions": [
-                {"question": "Where is the result list initialized?", "answer": 2},
-                {"question": "Which line converts to uppercase?", "answer": 4},
-                {"question": "Where does the loop start?", "answer": 3},
-                {"question": "Which line prints the output?", "answer": 5},
-            ]
-        },
-        {
-            "code": '''count = 0
-while count < 10:
-    if count % 3 == 0:
-        print(count)
-    count += 1''',
-            "questions": [
-                {"question": "Where is the while loop condition?", "answer": 2},
-                {"question": "Which line checks divisibility by 3?", "answer": 3},
-                {"question": "Where is count incremented?", "answer": 5},
-                {"question": "Which line prints the count?", "answer": 4},
-            ]
-        },
-    ],
-    "advanced": [
-        {
-            "code": '''result = []
-for i in range(len(data)):
-    if data[i] > 0:
-        result.append(data[i] * 2)
-    else:
-        result.append(0)
-return result''',
-            "questions": [
-                {"question": "Where is the result list created?", "answer": 1},
-                {"question": "Which line checks if a value is positive?", "answer": 3},
-                {"question": "Where does the multiplication happen?", "answer": 4},
-                {"question": "Which line appends zero for negative values?", "answer": 6},
-                {"question": "Where is the result returned?", "answer": 7},
-            ]
-        },
-        {
-            "code": '''def fibonacci(n):
-    if n <= 1:
-        return n
-    return fibonacci(n-1) + fibonacci(n-2)
-
-result = fibonacci(5)''',
-            "questions": [
-                {"question": "Where does the function definition start?", "answer": 1},
-                {"question": "Which line contains the base case check?", "answer": 2},
-                {"question": "Where is the recursive call?", "answer": 4},
-                {"question": "Which line calls the function?", "answer": 6},
-                {"question": "Where is the base case return?", "answer": 3},
-            ]
-        },
-        {
-            "code": '''matrix = [[1, 2], [3, 4], [5, 6]]
-flat = []
-for row in matrix:
-    for item in row:
-        flat.append(item)
-print(flat)''',
-            "questions": [
-                {"question": "Where is the matrix defined?", "answer": 1},
-                {"question": "Which line starts the outer loop?", "answer": 3},
-                {"question": "Where is the inner loop?", "answer": 4},
-                {"question": "Which line appends to flat?", "answer": 5},
-            ]
-        },
-        {
-            "code": '''def quick_sort(arr):
-    if len(arr) <= 1:
-        return arr
-    pivot = arr[len(arr) // 2]
-    left = [x for x in arr if x < pivot]
-    middle = [x for x in arr if x == pivot]
-    right = [x for x in arr if x > pivot]
-    return quick_sort(left) + middle + quick_sort(right)''',
-            "questions": [
-                {"question": "Where is the base case?", "answer": 2},
-                {"question": "Which line selects the pivot?", "answer": 4},
-                {"question": "Where is the left partition created?", "answer": 5},
-                {"question": "Which line contains the recursive calls?", "answer": 8},
-                {"question": "Where is the right partition?", "answer": 7},
-            ]
-        },
-        {
-            "code": '''class Node:
-    def __init__(self, data):
-        self.data = data
-        self.next = None
+from rich.markup import escape
 
-head = Node(1)
-head.next = Node(2)''',
-            "questions": [
-                {"question": "Where is the class defined?", "answer": 1},
-                {"question": "Which line initializes the data attribute?", "answer": 3},
-                {"question": "Where is the next pointer set to None?", "answer": 4},
-                {"question": "Which line creates the first node?", "answer": 6},
-                {"question": "Where is the second node linked?", "answer": 7},
-            ]
-        },
-    ]
-}
-
-
-class CodeDisplay(Static):
-    """Widget to display code with line numbers and syntax highlighting"""
-    
-    CSS = """
-    CodeDisplay {
-        background: #1e1e1e;
-        color: #d4d4d4;
-        border: heavy #00ff00;
-        padding: 1 2;
-        height: auto;
-    }
-    """
-    
-    def __init__(self, code: str, **kwargs):
-        self.code_lines = code.split('\n')
-        super().__init__(**kwargs)
-    
-    def render(self) -> str:
-        lines = []
-        for i, line in enumerate(self.code_lines, 1):
-            lines.append(f"[cyan]{i:2d}[/cyan] │ [white]{line}[/white]")
-        return "\n".join(lines)
+from perf_stats import PerfStats
+from user_dirs import data_dir, session_snapshot_path
 
 
-class RaceProgress(Static):
-    """Display race progress with enhanced visuals"""
+class RaceTicker:
+    """One app-wide tick that drives every race time display
     
-    CSS = """
-    RaceProgress {
-        background: $panel;
-        border: solid #ffa500;
-        padding: 1 2;
-        height: auto;
-    }
+    Subscribers are called every interval while at least one is subscribed;
+    with none (no race on screen) the underlying timer is paused, so an
+    idle app does no periodic work at all.
     """
     
-    def __init__(self, total_questions: int, **kwargs):
-        self.total = total_questions
-        self.current = 0
-        super().__init__(**kwargs)
-    
-    def update_progress(self, current: int):
-        self.current = current
-        self.refresh()
-    
-    def render(self) -> str:
-        percentage = int((self.current / self.total) * 100) if self.total > 0 else 0
-        filled = int(percentage / 5)
-        bar = "[green]" + "█" * filled + "[/green][dim]" + "░" * (20 - filled) + "[/dim]"
-        
-        car_position = min(filled, 19)
-        track = list("─" * 20)
-        track[car_position] = "🏎️"
-        track_display = "".join(track)
-        
-        return f"""[bold yellow]🏁 RACE PROGRESS[/bold yellow]
-{bar} [bold]{percentage}%[/bold]
-{track_display}
-[bold cyan]Checkpoint:[/bold cyan] {self.current}/{self.total}"""
+    def __init__(self, app: App, interval: float = 0.1):
+        self.subscribers = []
+        self._timer = app.set_interval(interval, self._tick, pause=True)
+    
+    def subscribe(self, callback) -> None:
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+            if len(self.subscribers) == 1:
+                self._timer.resume()
+    
+    def unsubscribe(self, callback) -> None:
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+            if not self.subscribers:
+                self._timer.pause()
+    
+    def _tick(self) -> None:
+        for callback in tuple(self.subscribers):
+            callback()
 
 
-class Timer(Static):
-    """Display race timer"""
-    
-    CSS = """
-    Timer {
-        background: $panel;
-        border: solid #ff1493;
-        padding: 1 2;
-        height: auto;
-        text-align: center;
-    }
-    """
+class PerfOverlay(Static):
+    """Live latency percentiles from the app's perf stats, toggled with F12"""
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.start_time = time.time()
-        self.timer_active = True
+    REFRESH_INTERVAL = 0.5
     
     def on_mount(self) -> None:
-        """Start the timer when mounted"""
-        self.update_timer()
-    
-    def update_timer(self) -> None:
-        """Update the timer display"""
-        if self.timer_active:
-            elapsed = time.time() - self.start_time
-            minutes = int(elapsed // 60)
-            seconds = int(elapsed % 60)
-            self.update(f"[bold magenta]⏱️  TIME: {minutes:02d}:{seconds:02d}[/bold magenta]")
-            self.set_timer(0.1, self.update_timer)
-    
-    def stop(self) -> float:
-        """Stop the timer and return elapsed time"""
-        self.timer_active = False
-        return time.time() - self.start_time
+        self.refresh_stats()
+        self.set_interval(self.REFRESH_INTERVAL, self.refresh_stats)
+    
+    def refresh_stats(self) -> None:
+        lines = [f"[bold cyan]{'PERF (ms)':20} {'n':>6} {'p50':>7} {'p99':>7} {'max':>7}[/bold cyan]"]
+        histograms = self.app.perf.histograms
+        for name in sorted(histograms):
+            h = histograms[name]
+            lines.append(f"{name:20} {h.count:6d} {h.percentile(0.5) / 1e6:7.2f} "
+                         f"{h.percentile(0.99) / 1e6:7.2f} {h.max_ns / 1e6:7.2f}")
+        if len(lines) == 1:
+            lines.append("[dim]Nothing measured yet[/dim]")
+        self.update("\n".join(lines))
 
 
 class HomeScreen(Screen):
@@ -362,6 +109,11 @@ class HomeScreen(Screen):
         margin: 1;
     }
     
+    #marathon, #instant {
+        width: 100%;
+        margin: 0 1;
+    }
+    
     #instructions {
         text-align: center;
         color: $text-muted;
@@ -395,92 +147,67 @@ class HomeScreen(Screen):
   
                              Get ready to test your code reading skills![/dim]""", id="features")
                 
+                yield Button("⏯️ RESUME RACE - Pick Up Where You Stopped", id="resume", classes="difficulty-btn", variant="primary")
                 yield Button("🟢 BEGINNER RACE - Easy Warm-Up", id="beginner", classes="difficulty-btn", variant="success")
                 yield Button("🟡 INTERMEDIATE RACE - Challenge Mode", id="intermediate", classes="difficulty-btn", variant="warning")
                 yield Button("🔴 ADVANCED RACE - Expert Level", id="advanced", classes="difficulty-btn", variant="error")
+                yield Button("🏆 LEADERBOARD - Hall of Fame", id="leaderboard", classes="difficulty-btn", variant="primary")
+                yield Checkbox("🏃 Marathon - race snippet after snippet until you press ESC", id="marathon")
+                yield Checkbox("⚡ Instant answers - type the line number, no Enter needed", id="instant")
                 
                 yield Static("[dim italic]Choose your difficulty and start your engines! 🏁[/dim italic]", id="instructions")
     
+    def on_screen_resume(self) -> None:
+        self.show_resume()
+    
+    def show_resume(self) -> None:
+        """Offer to resume the race left unfinished last time, if there is one"""
+        self.query_one("#resume", Button).display = self.app.has_snapshot()
+    
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Handle difficulty selection"""
+        if event.button.id == "leaderboard":
+            self.app.push_screen(LeaderboardScreen())
+            return
+        if event.button.id == "resume":
+            self.app.resume_race(instant=self.query_one("#instant", Checkbox).value)
+            # A snapshot that could not be read is gone now
+            self.show_resume()
+            return
         difficulty = event.button.id
-        self.app.start_race(difficulty)
+        self.app.start_race(
+            difficulty,
+            marathon=self.query_one("#marathon", Checkbox).value,
+            instant=self.query_one("#instant", Checkbox).value,
+        )
 
 
-class GameScreen(Screen):
-    """Main game screen with enhanced UI"""
+class LeaderboardScreen(Screen):
+    """Top results for each difficulty and the player's personal bests"""
     
     CSS = """
-    GameScreen {
+    LeaderboardScreen {
+        align: center middle;
         background: $surface;
     }
     
-    #game-header {
-        dock: top;
-        height: 3;
-        background: #00ff00;
-        color: black;
-        content-align: center middle;
-        text-style: bold;
-    }
-    
-    #stats-container {
-        dock: top;
+    #leaderboard-container {
+        width: 80;
         height: auto;
-        layout: horizontal;
-    }
-    
-    #code-container {
-        height: auto;
-        margin: 1;
-    }
-    
-    #question-container {
-        height: auto;
-        border: heavy #ffa500;
+        border: heavy #ffd700;
         background: $panel;
-        padding: 1 2;
-        margin: 1;
+        padding: 1 3;
     }
     
-    #question-text {
-        color: #ffa500;
-        text-style: bold;
-        padding: 1;
-    }
-    
-    #input-container {
-        height: auto;
-        layout: horizontal;
-        align: center middle;
-        padding: 1;
-    }
-    
-    #feedback {
-        dock: bottom;
-        height: 3;
-        content-align: center middle;
+    #leaderboard-title {
         text-align: center;
+        color: #ffd700;
         text-style: bold;
+        padding: 1;
     }
     
-    .success {
-        background: #00ff00;
-        color: black;
-    }
-    
-    .error {
-        background: #ff0000;
-        color: white;
-    }
-    
-    Input {
-        width: 25;
-        margin-right: 1;
-    }
-    
-    Button {
-        width: 20;
+    .leaderboard-table {
+        padding: 1 0;
     }
     """
     
@@ -488,174 +215,42 @@ class GameScreen(Screen):
         Binding("escape", "back_home", "Back to Menu"),
     ]
     
-    def __init__(self, difficulty: str):
-        super().__init__()
-        self.difficulty = difficulty
-        self.current_question_idx = 0
-        self.score = 0
-        self.current_attempts = 0  # Local: attempts on current question
-        self.max_attempts = 2  # Maximum attempts per question
-        self.wrong_attempt = False # Decides to give point for question or not
-        self.load_challenge()
-    
-    def load_challenge(self):
-        """Load a random challenge for the selected difficulty"""
-        self.wrong_attemps = 0
-        self.challenge = random.choice(CODE_CHALLENGES[self.difficulty])
-        self.total_questions = len(self.challenge["questions"])
+    DIFFICULTIES = (("beginner", "🟢"), ("intermediate", "🟡"), ("advanced", "🔴"))
+    TOP_N = 5
     
     def compose(self) -> ComposeResult:
-        difficulty_emoji = {"beginner": "🟢", "intermediate": "🟡", "advanced": "🔴"}
-        yield Static(f"{difficulty_emoji[self.difficulty]} CODE RACER - {self.difficulty.upper()} MODE", id="game-header")
-        
-        with Container(id="stats-container"):
-            yield Timer(id="timer")
-            yield RaceProgress(self.total_questions, id="progress")
-        
-        with Container(id="code-container"):
-            yield CodeDisplay(self.challenge["code"], id="code-display")
-        
-        with Container(id="question-container"):
-            yield Static(self.get_current_question(), id="question-text")
-            with Container(id="input-container"):
-                yield Input(placeholder="Line number", id="answer-input")
-                yield Button("🏁 SUBMIT", id="submit-btn", variant="primary")
-        
-        yield Static("", id="feedback")
-    
-    def get_current_question(self) -> str:
-        if self.current_question_idx < len(self.challenge["questions"]):
-            q = self.challenge["questions"][self.current_question_idx]
-            return f"[bold]QUESTION {self.current_question_idx + 1}/{self.total_questions}[/bold]\n\n{q['question']}"
-        return "🏁 Race Complete!"
-    
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        """Handle button press"""
-        if event.button.id == "submit-btn":
-            self.check_answer()
+        with Center():
+            with Vertical(id="leaderboard-container"):
+                yield Static("🏆 HALL OF FAME 🏆", id="leaderboard-title")
+                for difficulty, _ in self.DIFFICULTIES:
+                    yield Static("", id=f"board-{difficulty}", classes="leaderboard-table")
+                yield Static("[dim]Press ESC to return to menu[/dim]")
     
-    def on_input_submitted(self, event: Input.Submitted) -> None:
-        """Handle enter key in input"""
-        self.check_answer()
+    def on_mount(self) -> None:
+        leaderboard = self.app.leaderboard
+        player = self.app.player
+        for difficulty, emoji in self.DIFFICULTIES:
+            lines = [f"[bold]{emoji} {difficulty.upper()}[/bold]"]
+            rows = leaderboard.top(difficulty, limit=self.TOP_N)
+            if not rows:
+                lines.append("[dim]  No races yet - be the first![/dim]")
+            for place, row in enumerate(rows, 1):
+                lines.append(self.format_row(f"{place}.", row))
+            best = leaderboard.personal_best(player, difficulty)
+            if best is not None:
+                lines.append(f"[cyan]{self.format_row('PB', best)}[/cyan]")
+            self.query_one(f"#board-{difficulty}", Static).update("\n".join(lines))
+    
+    @staticmethod
+    def format_row(place: str, row) -> str:
+        minutes = int(row["elapsed_time"] // 60)
+        seconds = int(row["elapsed_time"] % 60)
+        return (f"  {place:>3} {escape(row['player'][:16]):<16} [bold green]{row['final_score']:3d}/100[/bold green]"
+                f"  {minutes:02d}:{seconds:02d}  {row['rank']}")
     
     def action_back_home(self) -> None:
         """Return to home screen"""
         self.app.pop_screen()
-    
-    def check_answer(self):
-        """Check if the answer is correct"""
-        input_widget = self.query_one("#answer-input", Input)
-        feedback_widget = self.query_one("#feedback", Static)
-        
-        try:
-            user_answer = int(input_widget.value.strip())
-        except ValueError:
-            feedback_widget.update("⚠️  Please enter a valid line number!")
-            feedback_widget.remove_class("success", "error")
-            return
-        
-        correct_answer = self.challenge["questions"][self.current_question_idx]["answer"]
-        
-        if user_answer == correct_answer:
-            if self.wrong_attempt:
-                self.wrong_attempt = False
-            else:
-                self.score += 1
-            feedback_widget.update("✅ CORRECT! Checkpoint Passed! 🏁")
-            feedback_widget.remove_class("error")
-            feedback_widget.add_class("success")
-            
-            # Move to next question
-            self.current_question_idx += 1
-            progress = self.query_one("#progress", RaceProgress)
-            progress.update_progress(self.current_question_idx)
-            
-            if self.current_question_idx < len(self.challenge["questions"]):
-                question_widget = self.query_one("#question-text", Static)
-                question_widget.update(self.get_current_question())
-                input_widget.value = ""
-                input_widget.focus()
-            else:
-                self.show_results()
-        else:
-            feedback_widget.update(f"❌ PIT STOP! Correct answer: Line {correct_answer}")
-            feedback_widget.remove_class("success")
-            feedback_widget.add_class("error")
-            input_widget.value = ""
-            self.wrong_attempt = True
-            
-    
-    def show_results(self):
-        """Show final results with combined speed and accuracy score"""
-        timer = self.query_one("#timer", Timer)
-        elapsed_time = timer.stop()
-        
-        question_widget = self.query_one("#question-text", Static)
-        input_widget = self.query_one("#answer-input", Input)
-        submit_btn = self.query_one("#submit-btn", Button)
-        feedback_widget = self.query_one("#feedback", Static)
-        
-        # Calculate accuracy score (0-100)
-        # Max possible score if all correct on first try
-        max_possible_score = self.total_questions
-        # Actual score (can be fractional due to half points)
-        
-        accuracy_score = int(((self.score)/ max_possible_score) * 100)
-        
-        # Calculate speed score based on time (0-100)
-        # Target times by difficulty: beginner=60s, intermediate=90s, advanced=120s
-        target_times = {"beginner": 10 ,"intermediate": 10, "advanced": 120}
-        target_time = target_times[self.difficulty]
-        
-        # Speed score: 100 if under target, decreases as time increases
-        if elapsed_time <= target_time:
-            speed_score = 100
-        else:
-            # Lose 2 points per second over target (minimum 0)
-            speed_score = max(0, 100 - int((elapsed_time - target_time) * 2))
-        
-        # Combined score: 60% accuracy, 40% speed
-        final_score = int((accuracy_score * 0.6) + (speed_score * 0.4))
-        
-        minutes = int(elapsed_time // 60)
-        seconds = int(elapsed_time % 60)
-        
-        result_text = f"""[bold yellow]🏁 RACE FINISHED! 🏁[/bold yellow]
-
-[bold cyan]Difficulty:[/bold cyan] {self.difficulty.upper()}
-[bold cyan]Points Earned:[/bold cyan] {self.score}/{self.total_questions}
-[bold magenta]Race Time:[/bold magenta] {minutes:02d}:{seconds:02d}
-
-[bold white]━━━━━━━━━━ RACE SCORES ━━━━━━━━━━[/bold white]
-[bold cyan]📊 Accuracy Score:[/bold cyan] {accuracy_score}/100
-[bold magenta]⚡ Speed Score:[/bold magenta] {speed_score}/100
-[bold yellow]🏆 FINAL SCORE:[/bold yellow] [bold green]{final_score}/100[/bold green]
-
-"""
-        # Performance rating based on final score
-        if final_score >= 90:
-            result_text += "[bold green]🥇 LEGENDARY! You're a Code Racing Master![/bold green]"
-            rating = "S-RANK"
-        elif final_score >= 80:
-            result_text += "[bold yellow]🥈 EXCELLENT! Outstanding Performance![/bold yellow]"
-            rating = "A-RANK"
-        elif final_score >= 70:
-            result_text += "[bold]🥉 GREAT JOB! Strong Racing Skills![/bold]"
-            rating = "B-RANK"
-        elif final_score >= 60:
-            result_text += "[bold cyan]💪 GOOD EFFORT! You're Improving![/bold cyan]"
-            rating = "C-RANK"
-        else:
-            result_text += "[bold red]🔧 KEEP PRACTICING! Speed up and focus![/bold red]"
-            rating = "D-RANK"
-        
-        result_text += f"\n[bold white]Performance Rank:[/bold white] [bold]{rating}[/bold]"
-        result_text += "\n\n[dim]Press ESC to return to menu[/dim]"
-        
-        question_widget.update(result_text)
-        input_widget.display = False
-        submit_btn.display = False
-        feedback_widget.update("")
 
 
 class CodeRacerApp(App):
@@ -666,23 +261,279 @@ class CodeRacerApp(App):
     Screen {
         background: #0a0a0a;
     }
+    
+    PerfOverlay {
+        overlay: screen;
+        position: absolute;
+        offset: 1 1;
+        width: 58;
+        height: auto;
+        padding: 0 1;
+        background: $panel 90%;
+        border: round #00ffff;
+    }
     """
     
     BINDINGS = [
         Binding("q", "quit", "Quit"),
+        Binding("f12", "toggle_perf", "Perf stats", show=False),
     ]
     
+    def __init__(self, bank=None, player=None, server_address=None, replay=None, **kwargs):
+        super().__init__(**kwargs)
+        self.bank = bank  # A ChallengePack, or None for the built-in challenges
+        self.player = player or getpass.getuser()
+        self.server_address = server_address  # (host, port) to race online, or None
+        self.replay = replay  # (RecordedRace, challenge, realtime) to play back on start, or None
+        self._leaderboard = None
+        self._scheduler = None
+        self._replay_log = None
+        self._calibration = None
+        self._snapshots = None
+        self.perf = PerfStats()
+        self.game_screens = {}  # Screen name -> GameScreen, reused race after race
+    
+    @property
+    def leaderboard(self):
+        """The results store, opened on first use"""
+        if self._leaderboard is None:
+            from leaderboard import Leaderboard
+            
+            self._leaderboard = Leaderboard()
+        return self._leaderboard
+    
+    @property
+    def scheduler(self):
+        """The player's challenge scheduler for this bank, loaded on first use"""
+        if self._scheduler is None:
+            from scheduler import Scheduler
+            
+            pack_path = getattr(self.bank, "path", None)
+            bank_name = os.path.splitext(os.path.basename(pack_path))[0] if pack_path else "builtin"
+            self._scheduler = Scheduler.for_player(self.player, bank_name)
+        return self._scheduler
+    
+    @property
+    def calibration(self):
+        """Target times calibrated from recorded races, loaded on first use"""
+        if self._calibration is None:
+            from race_analytics import Calibration
+            
+            self._calibration = Calibration.load()
+        return self._calibration
+    
+    @property
+    def replay_log(self):
+        """The log every local race is recorded to, opened on first use"""
+        if self._replay_log is None:
+            from replay_log import ReplayLog
+            
+            self._replay_log = ReplayLog()
+        return self._replay_log
+    
+    @property
+    def snapshots(self):
+        """The saved snapshot of an unfinished race, opened on first use"""
+        if self._snapshots is None:
+            from session_snapshot import SessionSnapshots
+            
+            self._snapshots = SessionSnapshots()
+        return self._snapshots
+    
+    def has_snapshot(self) -> bool:
+        """Whether there is an unfinished race to resume; the snapshot is only read when resumed"""
+        if self._snapshots is None:
+            # Not even opened yet, so it is whatever the last run left on disk
+            return os.path.exists(session_snapshot_path())
+        return self._snapshots.saved
+    
+    def on_unmount(self) -> None:
+        """Write any queued results, the scheduler state and the perf stats before exiting"""
+        if self._leaderboard is not None:
+            self._leaderboard.close()
+        if self._snapshots is not None:
+            self._snapshots.close()
+        if self._replay_log is not None:
+            self._replay_log.close()
+        if self._scheduler is not None:
+            self._scheduler.save()
+        if self.perf.histograms:
+            self.perf.dump(os.path.join(data_dir(), "perf.json"))
+    
+    def action_toggle_perf(self) -> None:
+        """Show or hide the perf overlay on the current screen"""
+        overlays = self.screen.query(PerfOverlay)
+        if overlays:
+            overlays.remove()
+        else:
+            self.screen.mount(PerfOverlay())
+    
     def on_mount(self) -> None:
         """Show home screen on start"""
+        self.race_ticker = RaceTicker(self)
         self.push_screen(HomeScreen())
+        if self.replay is not None:
+            from game_screen import ReplayScreen
+            
+            self.push_screen(ReplayScreen(*self.replay))
     
-    def start_race(self, difficulty: str) -> None:
-        """Start a race with the selected difficulty"""
-        self.push_screen(GameScreen(difficulty))
+    def start_race(self, difficulty: str, marathon: bool = False, instant: bool = False) -> None:
+        """Start a race (or a marathon) with the selected difficulty, answered instantly if asked"""
+        if self.server_address is not None:
+            self.run_worker(self.join_online_race(difficulty), group="join", exclusive=True)
+            return
+        from game_screen import GameScreen, MarathonScreen
+        
+        name = f"marathon-{difficulty}" if marathon else f"race-{difficulty}"
+        if instant:
+            name += "-instant"
+        screen = self.game_screens.get(name)
+        if screen is None:
+            self.load_bank()
+            # Installed screens stay alive when popped, so the next race can reuse it
+            screen_class = MarathonScreen if marathon else GameScreen
+            screen = self.game_screens[name] = screen_class(difficulty, self.bank, self.scheduler, self.replay_log, instant)
+            self.install_screen(screen, name)
+        else:
+            screen.restart()
+        self.push_screen(screen)
+    
+    def resume_race(self, instant: bool = False) -> None:
+        """Carry on with the race left unfinished when the game was last closed"""
+        snapshot = self.snapshots.load()
+        if snapshot is None:
+            self.notify("The unfinished race could not be read", severity="warning")
+            return
+        from game_screen import ResumedGameScreen
+        
+        self.load_bank()
+        self.push_screen(ResumedGameScreen(snapshot, self.bank, self.scheduler, instant))
+    
+    def load_bank(self) -> None:
+        """Fall back to the built-in challenges when no pack was given"""
+        if self.bank is None:
+            from builtin_challenges import BUILTIN_BANK
+            
+            self.bank = BUILTIN_BANK
+    
+    async def join_online_race(self, difficulty: str) -> None:
+        """Join a head-to-head race on the race server"""
+        from game_screen import OnlineGameScreen
+        from race_server import RaceClient
+        
+        client = RaceClient()
+        try:
+            await client.connect(*self.server_address)
+            joined = await client.join(self.player, difficulty)
+        except (ConnectionError, OSError, RuntimeError) as error:
+            await client.close()
+            self.notify(f"Could not join a race: {error}", severity="error")
+            return
+        self.push_screen(OnlineGameScreen(difficulty, client, joined))
+
+
+def write_bank(pack_path: str, bank, output_questions: bool = False, workers=None) -> None:
+    """Check, deduplicate and write a bank to a challenge pack, adding "what does this print?" questions if asked"""
+    from bank_compiler import BankIndex, CompileReport, compile_bank
+    from challenge_pack import write_pack
+    
+    index = BankIndex()
+    report = CompileReport()
+    try:
+        bank = compile_bank(bank, index, report)
+        if not output_questions:
+            write_pack(pack_path, bank)
+        else:
+            from output_questions import OutputCache, add_output_questions
+            from sandbox import SandboxPool
+            
+            cache = OutputCache()
+            try:
+                with SandboxPool(workers) as pool:
+                    write_pack(pack_path, add_output_questions(bank, cache, pool))
+            finally:
+                cache.close()
+    finally:
+        index.close()
+    print(report.summary())
+
+
+def harvest_to_pack(source_dir: str, pack_path: str, workers=None, output_questions: bool = False) -> None:
+    """Harvest challenges from a source tree into a challenge pack"""
+    from challenge_pack import ChallengePack
+    from harvest import HarvestCache, harvest_bank
+    
+    cache = HarvestCache()
+    try:
+        bank, file_count, changed = harvest_bank(source_dir, cache, workers)
+        write_bank(pack_path, bank, output_questions, workers)
+    finally:
+        cache.close()
+    
+    with ChallengePack(pack_path) as pack:
+        counts = ", ".join(f"{len(pack[d])} {d}" for d in pack)
+    print(f"Harvested {file_count} files ({changed} parsed, {file_count - changed} unchanged): {counts}")
 
 
 def main():
-    app = CodeRacerApp()
+    parser = argparse.ArgumentParser(description="Code Racer - a code reading race game")
+    parser.add_argument("--pack", metavar="PATH", help="race with challenges from a challenge pack file")
+    parser.add_argument("--write-pack", metavar="PATH", help="write the built-in challenges to a pack file and exit")
+    parser.add_argument("--harvest", metavar="DIR", help="with --write-pack, build the pack from the Python files under DIR")
+    parser.add_argument("--output-questions", action="store_true",
+                        help="with --write-pack, run each snippet in a sandbox and add \"what does this print?\" questions")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes used by --harvest and --output-questions")
+    parser.add_argument("--player", help="name to record on the leaderboard (default: your login name)")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="race head-to-head on a race server")
+    parser.add_argument("--replay", metavar="PATH", help="play back a race from a replay log (races.crlog in the data directory)")
+    parser.add_argument("--replay-race", type=int, default=-1, metavar="N", help="which race in the log to play back (default: the last)")
+    parser.add_argument("--replay-speed", choices=("1x", "max"), default="1x", help="play back in real time or as fast as possible")
+    args = parser.parse_args()
+    
+    if args.harvest:
+        if not args.write_pack:
+            parser.error("--harvest needs --write-pack PATH")
+        harvest_to_pack(args.harvest, args.write_pack, args.workers, args.output_questions)
+        return
+    
+    if args.write_pack:
+        from builtin_challenges import CODE_CHALLENGES
+        
+        write_bank(args.write_pack, CODE_CHALLENGES, args.output_questions, args.workers)
+        return
+    if args.output_questions:
+        parser.error("--output-questions needs --write-pack PATH")
+    
+    bank = None
+    if args.pack:
+        from challenge_pack import ChallengePack
+        
+        bank = ChallengePack(args.pack)
+    server_address = None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        if not host or not port.isdigit():
+            parser.error("--connect expects HOST:PORT")
+        server_address = (host, int(port))
+    replay = None
+    if args.replay:
+        from builtin_challenges import BUILTIN_BANK
+        from replay_log import find_challenge, read_races
+        
+        try:
+            races = read_races(args.replay)
+            race = races[args.replay_race]
+        except (OSError, ValueError, struct.error) as error:
+            parser.error(f"--replay: {error}")
+        except IndexError:
+            parser.error(f"--replay: {args.replay} has no race {args.replay_race}")
+        bank = bank or BUILTIN_BANK
+        challenge = find_challenge(bank, race)
+        if challenge is None:
+            parser.error("--replay: the race's challenge is not in this bank (use the same --pack)")
+        replay = (race, challenge, args.replay_speed == "1x")
+    
+    app = CodeRacerApp(bank, args.player, server_address, replay)
     app.run()
 
 
@@ -0,0 +1,956 @@
+"""
+Race screens for Code Racer
+The game screen and its widgets, imported only once a race starts so the
+home screen comes up without loading them
+"""
+
+from textual import events
+from textual.app import ComposeResult
+from textual.widgets import Static, Input, Button
+from textual.containers import Container
+from textual.binding import Binding
+from textual.screen import Screen
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.geometry import Size
+from rich.cells import cell_len
+from rich.markup import escape
+from rich.text import Text
+from time import monotonic_ns
+import asyncio
+
+from builtin_challenges import BUILTIN_BANK
+from highlight import highlight_lines
+from marathon import MarathonTotals, Prefetcher, challenge_stream
+from race_engine import Ghost, RaceClock, RaceSession, answer_limit, challenge_key, is_choice_prompt, pick_challenge
+from race_server import RaceClient, RemoteRace
+from replay_log import INPUT, SUBMIT
+
+
+# Keys that type an answer in instant mode
+DIGIT_KEYS = frozenset("0123456789")
+
+
+class TimedRender:
+    """Mixin recording how long each render of a widget takes in the app's perf stats"""
+    
+    def render_lines(self, crop):
+        start = monotonic_ns()
+        strips = super().render_lines(crop)
+        self.app.perf.record(f"render.{type(self).__name__}", monotonic_ns() - start)
+        return strips
+
+
+class CodeDisplay(TimedRender, ScrollView):
+    """Widget to display code with line numbers and syntax highlighting
+    
+    Only the lines in view are rendered, and each line is styled once and
+    kept as a Strip, so repainting costs the same for any snippet length.
+    The highlighted lines come from highlight_lines, which is memoized per
+    snippet, so the code is lexed when the race is set up, never per keystroke.
+    """
+    
+    CSS = """
+    CodeDisplay {
+        background: #1e1e1e;
+        color: #d4d4d4;
+        border: heavy #00ff00;
+        padding: 1 2;
+        height: auto;
+        max-height: 24;
+    }
+    """
+    
+    def __init__(self, code: str, **kwargs):
+        super().__init__(**kwargs)
+        self.set_code(code)
+    
+    def set_code(self, code: str, highlighted=None) -> None:
+        """Show a different snippet, scrolled back to the top
+        
+        highlighted may be highlight_lines(code.expandtabs(4)), prepared ahead of time.
+        """
+        self.code_lines = code.expandtabs(4).split('\n')
+        self.highlighted = highlighted or highlight_lines('\n'.join(self.code_lines))
+        self.number_width = max(2, len(str(len(self.code_lines))))
+        self._strips = [None] * len(self.code_lines)
+        # Line number, " │ " separator, then the code
+        gutter = self.number_width + 3
+        width = gutter + max((cell_len(line) for line in self.code_lines), default=0)
+        self.virtual_size = Size(width, len(self.code_lines))
+        if self.is_mounted:
+            self.scroll_home(animate=False)
+            self.refresh()
+    
+    def line_text(self, index: int) -> Text:
+        """Styled text for one code line (0-based)"""
+        return Text.assemble(
+            (f"{index + 1:{self.number_width}d}", "cyan"),
+            " │ ",
+            self.highlighted[index],
+            no_wrap=True,
+        )
+    
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        rich_style = self.rich_style
+        width = self.size.width
+        if index >= len(self.code_lines):
+            return Strip.blank(width, rich_style)
+        
+        strip = self._strips[index]
+        if strip is None:
+            text = self.line_text(index)
+            strip = Strip(text.render(self.app.console), text.cell_len)
+            self._strips[index] = strip
+        return strip.crop_extend(scroll_x, scroll_x + width, rich_style).apply_offsets(scroll_x, index)
+
+
+class CachedStatic(Static):
+    """Static that only re-parses markup and repaints when its text changes"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shown_text = None
+    
+    def show(self, text: str) -> None:
+        if text != self.shown_text:
+            self.shown_text = text
+            self.update(text)
+
+
+def progress_frame(filled: int) -> str:
+    """Progress bar and track for 0-20 filled segments"""
+    bar = "[green]" + "█" * filled + "[/green][dim]" + "░" * (20 - filled) + "[/dim]"
+    
+    car_position = min(filled, 19)
+    track = list("─" * 20)
+    track[car_position] = "🏎️"
+    track_display = "".join(track)
+    return bar, track_display
+
+
+# Every frame the progress bar can show (one per 5%), built once
+PROGRESS_FRAMES = tuple(progress_frame(filled) for filled in range(21))
+
+
+def ghost_track(position: int) -> str:
+    track = list("─" * 20)
+    track[min(position, 19)] = "👻"
+    return "".join(track)
+
+
+# The ghost car's track at each of its 21 positions
+GHOST_TRACKS = tuple(ghost_track(position) for position in range(21))
+
+
+class RaceProgress(TimedRender, CachedStatic):
+    """Display race progress with enhanced visuals"""
+    
+    def __init__(self, total_questions: int, ghost=None, **kwargs):
+        super().__init__(**kwargs)
+        self.rivals = {}  # Rival name -> checkpoint, for multiplayer races
+        self.reset(total_questions, ghost)
+    
+    def reset(self, total_questions: int, ghost=None):
+        """Back to the start line for a new race, racing a Ghost if given"""
+        self.total = total_questions
+        self.current = 0
+        self.rivals.clear()
+        self.ghost = ghost
+        self.ghost_position = 0
+        self.ghost_checkpoint = 0
+        self.show(self.frame_text())
+    
+    def tick_ghost(self, elapsed: float) -> None:
+        """Move the ghost car to where the best run was at this race time"""
+        ghost = self.ghost
+        if ghost is None:
+            return
+        position = ghost.position(elapsed)
+        checkpoint = ghost.checkpoint(elapsed)
+        if position != self.ghost_position or checkpoint != self.ghost_checkpoint:
+            self.ghost_position = position
+            self.ghost_checkpoint = checkpoint
+            self.show(self.frame_text())
+    
+    def update_progress(self, current: int):
+        self.current = current
+        self.show(self.frame_text())
+    
+    def update_rival(self, name: str, current: int):
+        self.rivals[name] = current
+        self.show(self.frame_text())
+    
+    def remove_rival(self, name: str):
+        if self.rivals.pop(name, None) is not None:
+            self.show(self.frame_text())
+    
+    def percentage(self, current: int) -> int:
+        return int((current / self.total) * 100) if self.total > 0 else 0
+    
+    def frame_text(self) -> str:
+        percentage = self.percentage(self.current)
+        bar, track_display = PROGRESS_FRAMES[min(20, percentage // 5)]
+        
+        text = f"""[bold yellow]🏁 RACE PROGRESS[/bold yellow]
+{bar} [bold]{percentage}%[/bold]
+{track_display}
+[bold cyan]Checkpoint:[/bold cyan] {self.current}/{self.total}"""
+        for name, current in self.rivals.items():
+            _, rival_track = PROGRESS_FRAMES[min(20, self.percentage(current) // 5)]
+            text += f"\n[dim]{rival_track}[/dim] {escape(name)} {current}/{self.total}"
+        if self.ghost is not None:
+            text += f"\n[dim]{GHOST_TRACKS[self.ghost_position]}[/dim] best {self.ghost_checkpoint}/{self.total}"
+        return text
+
+
+class Timer(TimedRender, CachedStatic):
+    """Display race timer, updated by the app's RaceTicker"""
+    
+    def __init__(self, elapsed, **kwargs):
+        super().__init__(**kwargs)
+        self.elapsed = elapsed  # Callable returning seconds since the race started
+        self.timer_active = True
+    
+    def reset(self, elapsed) -> None:
+        """Time a new race"""
+        self.elapsed = elapsed
+        self.timer_active = True
+        self.update_timer()
+    
+    def on_mount(self) -> None:
+        """Show the starting time when mounted"""
+        self.update_timer()
+    
+    def update_timer(self) -> None:
+        """Update the timer display (repaints only when the shown second changes)"""
+        if self.timer_active:
+            elapsed = self.elapsed()
+            minutes = int(elapsed // 60)
+            seconds = int(elapsed % 60)
+            self.show(f"[bold magenta]⏱️  TIME: {minutes:02d}:{seconds:02d}[/bold magenta]")
+    
+    def stop(self) -> float:
+        """Stop the timer and return elapsed time"""
+        self.timer_active = False
+        return self.elapsed()
+
+
+class GameScreen(Screen):
+    """Main game screen with enhanced UI"""
+    
+    CSS = """
+    GameScreen {
+        background: $surface;
+    }
+    
+    #game-header {
+        dock: top;
+        height: 3;
+        background: #00ff00;
+        color: black;
+        content-align: center middle;
+        text-style: bold;
+    }
+    
+    #stats-container {
+        dock: top;
+        height: auto;
+        layout: horizontal;
+    }
+    
+    /* Side by side, so each needs a share of the width (a widget's own CSS is not applied) */
+    #timer, #progress {
+        width: 1fr;
+        height: auto;
+        background: $panel;
+        padding: 1 2;
+    }
+    
+    #timer {
+        border: solid #ff1493;
+        text-align: center;
+    }
+    
+    #progress {
+        border: solid #ffa500;
+    }
+    
+    #code-container {
+        height: auto;
+        margin: 1;
+    }
+    
+    #code-display {
+        height: auto;
+        max-height: 24;
+    }
+    
+    #question-container {
+        height: auto;
+        border: heavy #ffa500;
+        background: $panel;
+        padding: 1 2;
+        margin: 1;
+    }
+    
+    #question-text {
+        color: #ffa500;
+        text-style: bold;
+        padding: 1;
+    }
+    
+    #input-container {
+        height: auto;
+        layout: horizontal;
+        align: center middle;
+        padding: 1;
+    }
+    
+    #instant-entry {
+        width: auto;
+        min-width: 24;
+        border: tall #ffa500;
+        padding: 0 1;
+        text-style: bold;
+    }
+    
+    #feedback {
+        dock: bottom;
+        height: 3;
+        content-align: center middle;
+        text-align: center;
+        text-style: bold;
+    }
+    
+    .success {
+        background: #00ff00;
+        color: black;
+    }
+    
+    .error {
+        background: #ff0000;
+        color: white;
+    }
+    
+    Input {
+        width: 25;
+        margin-right: 1;
+    }
+    
+    Button {
+        width: 20;
+    }
+    """
+    
+    BINDINGS = [
+        Binding("escape", "back_home", "Back to Menu"),
+    ]
+    
+    # The scrollable code view can take focus too, but typing answers comes first
+    AUTO_FOCUS = "#answer-input"
+    
+    # The player's best run of the current challenge, when there is one
+    ghost = None
+    
+    # Unfinished races on this screen are saved, to be resumed from the home screen
+    resumable = True
+    
+    RESULTS_TEMPLATE = """[bold yellow]🏁 RACE FINISHED! 🏁[/bold yellow]
+
+[bold cyan]Difficulty:[/bold cyan] {difficulty}
+[bold cyan]Points Earned:[/bold cyan] {score}/{total_questions}
+[bold magenta]Race Time:[/bold magenta] {minutes:02d}:{seconds:02d}
+
+[bold white]━━━━━━━━━━ RACE SCORES ━━━━━━━━━━[/bold white]
+[bold cyan]📊 Accuracy Score:[/bold cyan] {accuracy_score}/100
+[bold magenta]⚡ Speed Score:[/bold magenta] {speed_score}/100
+[bold yellow]🏆 FINAL SCORE:[/bold yellow] [bold green]{final_score}/100[/bold green]
+
+{rank_message}
+[bold white]Performance Rank:[/bold white] [bold]{rank}[/bold]
+
+[dim]Press ESC to return to menu[/dim]"""
+    
+    RANK_MESSAGES = {
+        "S-RANK": "[bold green]🥇 LEGENDARY! You're a Code Racing Master![/bold green]",
+        "A-RANK": "[bold yellow]🥈 EXCELLENT! Outstanding Performance![/bold yellow]",
+        "B-RANK": "[bold]🥉 GREAT JOB! Strong Racing Skills![/bold]",
+        "C-RANK": "[bold cyan]💪 GOOD EFFORT! You're Improving![/bold cyan]",
+        "D-RANK": "[bold red]🔧 KEEP PRACTICING! Speed up and focus![/bold red]",
+    }
+    
+    def __init__(self, difficulty: str, bank=BUILTIN_BANK, scheduler=None, recorder=None, instant: bool = False):
+        super().__init__()
+        self.difficulty = difficulty
+        self.bank = bank  # BUILTIN_BANK or a ChallengePack
+        self.scheduler = scheduler  # Picks challenges when given, otherwise they are random
+        self.recorder = recorder  # ReplayLog every race on this screen is written to, or None
+        self.instant = instant  # Digit keys answer straight away, without the answer box
+        self.typed = ""  # Digits typed so far in instant mode
+        self.submitted_at = 0  # monotonic_ns() of the latest answer submission
+        self.load_challenge()
+    
+    def load_challenge(self):
+        """Load the next challenge for the selected difficulty"""
+        if self.scheduler is not None:
+            self.begin_session(*self.scheduler.pick(self.bank, self.difficulty))
+        else:
+            self.begin_session(None, pick_challenge(self.bank, self.difficulty))
+    
+    def begin_session(self, index, challenge, clock=None) -> None:
+        """Set up a RaceSession for a challenge (bank index or None) and log its start"""
+        key = challenge_key(challenge)
+        self.challenge_index = index
+        target_time = self.app.calibration.target_time(self.difficulty, key)
+        self.session = RaceSession(self.difficulty, challenge, clock, target_time)
+        self.challenge = self.session.challenge
+        self.total_questions = self.session.total_questions
+        self.ghost = self.load_ghost(key)
+        if self.recorder is not None:
+            self.recorder.start(self.difficulty, key, index)
+    
+    def load_ghost(self, key: str):
+        """The player's fastest run of this challenge as a Ghost, or None"""
+        checkpoints = self.app.leaderboard.best_checkpoints(self.app.player, key)
+        # A run of the challenge before its questions changed cannot be followed
+        if checkpoints is None or len(checkpoints) != self.total_questions:
+            return None
+        return Ghost(checkpoints)
+    
+    def restart(self) -> None:
+        """Reset this screen in place for a new race on a new challenge
+        
+        Only the content that changes between races is swapped; the widget
+        tree and its styles are kept, so a pooled screen is ready at once.
+        """
+        self.load_challenge()
+        self.timer.reset(self.race_elapsed)
+        self.progress.reset(self.total_questions, self.ghost)
+        self.code_display.set_code(self.challenge.code)
+        self.question_widget.update(self.get_current_question())
+        self.clear_answer()
+        self.show_answer_box(True)
+        self.feedback_widget.update("")
+        self.feedback_widget.remove_class("success", "error")
+    
+    def compose(self) -> ComposeResult:
+        # Widgets the race updates are kept as attributes, so answering never queries the DOM
+        self.timer = Timer(self.race_elapsed, id="timer")
+        self.progress = RaceProgress(self.total_questions, self.ghost, id="progress")
+        self.code_display = CodeDisplay(self.challenge.code, id="code-display")
+        self.question_widget = Static(self.get_current_question(), id="question-text")
+        self.input_widget = Input(placeholder="Line number", id="answer-input")
+        # In instant mode keys go to the screen, not the (hidden) answer box
+        self.input_widget.can_focus = not self.instant
+        self.submit_button = Button("🏁 SUBMIT", id="submit-btn", variant="primary")
+        self.entry_widget = Static(self.typed_text(""), id="instant-entry")
+        self.feedback_widget = Static("", id="feedback")
+        self.show_answer_box(True)
+        
+        difficulty_emoji = {"beginner": "🟢", "intermediate": "🟡", "advanced": "🔴"}
+        yield Static(f"{difficulty_emoji[self.difficulty]} CODE RACER - {self.difficulty.upper()} MODE", id="game-header")
+        
+        with Container(id="stats-container"):
+            yield self.timer
+            yield self.progress
+        
+        with Container(id="code-container"):
+            yield self.code_display
+        
+        with Container(id="question-container"):
+            yield self.question_widget
+            with Container(id="input-container"):
+                yield self.input_widget
+                yield self.submit_button
+                yield self.entry_widget
+        
+        yield self.feedback_widget
+    
+    def show_answer_box(self, shown: bool) -> None:
+        """Show or hide where answers are typed: the answer box, or the instant answer"""
+        self.input_widget.display = shown and not self.instant
+        self.submit_button.display = shown and not self.instant
+        self.entry_widget.display = shown and self.instant
+    
+    def typed_text(self, typed: str) -> str:
+        question = self.session.current_question
+        label = "Option" if question is not None and is_choice_prompt(question.text) else "Line"
+        return f"⚡ {label}: {typed}▏"
+    
+    def show_typed(self, typed: str) -> None:
+        self.typed = typed
+        self.entry_widget.update(self.typed_text(typed))
+    
+    def clear_answer(self) -> None:
+        """Empty the answer box (or the instant answer) for the next try"""
+        if self.instant:
+            self.show_typed("")
+        else:
+            self.input_widget.value = ""
+    
+    def race_elapsed(self) -> float:
+        """Seconds shown on the race timer"""
+        return self.session.elapsed()
+    
+    def get_current_question(self) -> str:
+        q = self.session.current_question
+        if q is not None:
+            return f"[bold]QUESTION {self.session.current_question_idx + 1}/{self.total_questions}[/bold]\n\n{escape(q.text)}"
+        return "🏁 Race Complete!"
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        """Handle button press"""
+        if event.button.id == "submit-btn":
+            self.submit_answer()
+    
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        """Handle enter key in input"""
+        self.submit_answer()
+    
+    def on_key(self, event: events.Key) -> None:
+        """In instant mode digit keys answer at once, wherever the focus is
+        
+        The answer is submitted as soon as no further digit could make it a
+        valid answer, so a snippet under 10 lines takes one key per answer;
+        Enter submits a shorter number early.
+        """
+        if not self.instant or not self.entry_widget.display or self.session.finished:
+            return
+        key = event.key
+        if key in DIGIT_KEYS:
+            # No line or option number starts with 0, so a stray 0 is dropped rather than scored
+            if key == "0" and not self.typed:
+                event.stop()
+                return
+            typed = self.typed + key
+        elif key == "backspace":
+            typed = self.typed[:-1]
+        elif key == "enter" and self.typed:
+            typed = self.typed
+        else:
+            return
+        event.stop()
+        self.show_typed(typed)
+        if self.recorder is not None and key != "enter":
+            self.recorder.input(typed)
+        if key == "enter" or typed and self.answer_complete(typed):
+            self.submit_answer()
+    
+    def answer_complete(self, typed: str) -> bool:
+        """Whether typing another digit could not give a valid answer"""
+        limit = answer_limit(self.session.current_question.text, len(self.challenge.lines))
+        return int(typed) * 10 > limit
+    
+    def submit_answer(self) -> None:
+        """Check the answer, timing it from the key or click to the repainted feedback"""
+        self.submitted_at = monotonic_ns()
+        self.check_answer()
+        self.app.perf.record("answer.check", monotonic_ns() - self.submitted_at)
+    
+    def feedback_painted(self, submitted_at: int) -> None:
+        self.app.perf.record("answer.feedback", monotonic_ns() - submitted_at)
+    
+    def on_screen_resume(self) -> None:
+        """Race clock runs and the timer ticks only while this screen is shown"""
+        self.session.clock.resume()
+        self.app.race_ticker.subscribe(self.timer.update_timer)
+        self.app.race_ticker.subscribe(self.tick_ghost)
+        self.save_snapshot()
+    
+    def on_screen_suspend(self) -> None:
+        self.session.clock.pause()
+        self.app.race_ticker.unsubscribe(self.timer.update_timer)
+        self.app.race_ticker.unsubscribe(self.tick_ghost)
+        self.save_snapshot()
+    
+    def save_snapshot(self) -> None:
+        """Save the race so far in the background, so it can be resumed if the game is closed"""
+        if self.resumable and not self.session.finished:
+            self.app.snapshots.save(self.session, self.challenge_index)
+    
+    def tick_ghost(self) -> None:
+        self.progress.tick_ghost(self.session.elapsed())
+    
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if self.recorder is not None:
+            self.recorder.input(event.value)
+    
+    def log_abort(self) -> None:
+        """Note in the replay log that a race was left unfinished"""
+        if self.recorder is not None and not self.session.finished:
+            self.recorder.abort()
+    
+    def action_back_home(self) -> None:
+        """Return to home screen"""
+        self.log_abort()
+        self.app.pop_screen()
+    
+    def read_answer(self):
+        """The typed line number, or None after warning that it is not one"""
+        try:
+            answer = int(self.typed if self.instant else self.input_widget.value.strip())
+        except ValueError:
+            if self.recorder is not None:
+                self.recorder.submit(None)
+            self.feedback_widget.update("⚠️  Please enter a valid number!")
+            self.feedback_widget.remove_class("success", "error")
+            return None
+        if self.recorder is not None:
+            self.recorder.submit(answer)
+        return answer
+    
+    def check_answer(self):
+        """Check if the answer is correct"""
+        if self.session.finished:
+            return
+        user_answer = self.read_answer()
+        if user_answer is None:
+            return
+        
+        question = self.session.current_question
+        correct = self.session.submit(user_answer)
+        self.save_snapshot()
+        self.answer_checked(correct, question.answer, question.text)
+    
+    def answer_checked(self, correct: bool, correct_answer: int, prompt: str = "") -> None:
+        """Show the outcome of an answer and move on if it was right"""
+        self.call_after_refresh(self.feedback_painted, self.submitted_at)
+        feedback_widget = self.feedback_widget
+        
+        if correct:
+            feedback_widget.update("✅ CORRECT! Checkpoint Passed! 🏁")
+            feedback_widget.remove_class("error")
+            feedback_widget.add_class("success")
+            
+            # Move to next question
+            self.progress.update_progress(self.session.current_question_idx)
+            
+            if not self.session.finished:
+                self.question_widget.update(self.get_current_question())
+                self.clear_answer()
+                if not self.instant:
+                    self.input_widget.focus()
+            else:
+                self.show_results()
+        else:
+            label = "Option" if is_choice_prompt(prompt) else "Line"
+            feedback_widget.update(f"❌ PIT STOP! Correct answer: {label} {correct_answer}")
+            feedback_widget.remove_class("success")
+            feedback_widget.add_class("error")
+            self.clear_answer()
+            
+    
+    def finish_race(self):
+        """Stop the race clock and save the result; returns the RaceResult"""
+        result = self.session.finish()
+        self.app.leaderboard.record(result, challenge_key(self.challenge), self.app.player, self.session.checkpoint_times)
+        if self.scheduler is not None:
+            self.scheduler.record(self.challenge_index, self.session)
+        if self.recorder is not None:
+            self.recorder.finish(result.final_score)
+        if self.resumable:
+            self.app.snapshots.discard()
+        return result
+    
+    def stop_timer(self) -> None:
+        timer = self.timer
+        timer.update_timer()
+        timer.stop()
+        self.app.race_ticker.unsubscribe(timer.update_timer)
+        self.app.race_ticker.unsubscribe(self.tick_ghost)
+    
+    def show_summary(self, text: str) -> None:
+        """Replace the question and answer box with an end-of-race summary"""
+        self.question_widget.update(text)
+        self.show_answer_box(False)
+        self.feedback_widget.update("")
+    
+    def show_results(self):
+        """Show final results with combined speed and accuracy score"""
+        result = self.finish_race()
+        self.stop_timer()
+        
+        result_text = self.RESULTS_TEMPLATE.format(
+            difficulty=self.difficulty.upper(),
+            score=result.score,
+            total_questions=result.total_questions,
+            minutes=int(result.elapsed_time // 60),
+            seconds=int(result.elapsed_time % 60),
+            accuracy_score=result.accuracy_score,
+            speed_score=result.speed_score,
+            final_score=result.final_score,
+            # Performance rating based on final score
+            rank_message=self.RANK_MESSAGES[result.rank],
+            rank=result.rank,
+        )
+        self.show_summary(result_text)
+
+
+class OnlineGameScreen(GameScreen):
+    """Game screen for a head-to-head race whose answers a race server checks"""
+    
+    # The race server keeps the race; it cannot be resumed alone
+    resumable = False
+    
+    def __init__(self, difficulty: str, client: RaceClient, joined):
+        self.client = client
+        self.joined = joined
+        self.rivals = {name: 0 for name in joined["players"] if name != joined["player"]}
+        self.waiting_for_reply = False
+        super().__init__(difficulty)
+    
+    def load_challenge(self):
+        """The challenge comes from the server, without its answers"""
+        self.session = RemoteRace(self.difficulty, self.joined)
+        self.challenge = self.session.challenge
+        self.total_questions = self.session.total_questions
+    
+    def on_mount(self) -> None:
+        for name, current in self.rivals.items():
+            self.progress.update_rival(name, current)
+        self.input_widget.disabled = not self.session.started
+        self.client.set_event_handler(self.on_race_event)
+    
+    def get_current_question(self) -> str:
+        if not self.session.started:
+            seconds = int(self.joined["starts_in"]) + 1
+            return f"[bold]🚦 WAITING FOR RIVALS[/bold]\n\nThe race starts in about {seconds} seconds"
+        return super().get_current_question()
+    
+    def on_race_event(self, message) -> None:
+        """Handle a broadcast from the race server"""
+        kind = message["type"]
+        if kind == "start":
+            self.session.start()
+            self.question_widget.update(self.get_current_question())
+            self.input_widget.disabled = False
+            self.input_widget.focus()
+            return
+        if kind == "disconnected":
+            if not self.session.finished:
+                self.input_widget.disabled = True
+                self.show_server_problem("the race server closed the connection")
+            return
+        
+        player = message.get("player")
+        if player == self.session.player:
+            return
+        progress = self.progress
+        if kind == "progress":
+            progress.update_rival(player, message["checkpoint"])
+        elif kind == "finished":
+            progress.update_rival(player, self.total_questions)
+            self.notify(f"🏁 {player} finished with {message['final_score']}/100 ({message['rank']})")
+        elif kind == "left":
+            progress.remove_rival(player)
+    
+    def on_screen_resume(self) -> None:
+        # The server's start signal, not the screen, starts an online race clock
+        if self.session.started:
+            self.session.clock.resume()
+        self.app.race_ticker.subscribe(self.timer.update_timer)
+    
+    def check_answer(self):
+        """Send the answer to the server; the reply updates the screen"""
+        if not self.session.started or self.session.finished or self.waiting_for_reply:
+            return
+        user_answer = self.read_answer()
+        if user_answer is None:
+            return
+        self.waiting_for_reply = True
+        self.run_worker(self.send_answer(user_answer), group="answers")
+    
+    async def send_answer(self, user_answer: int) -> None:
+        try:
+            checked = await self.client.answer(user_answer)
+        except (ConnectionError, OSError, RuntimeError) as error:
+            self.show_server_problem(str(error))
+            return
+        finally:
+            self.waiting_for_reply = False
+        prompt = self.session.current_question.text
+        self.session.apply(checked)
+        self.answer_checked(checked["correct"], checked["answer"], prompt)
+    
+    def show_server_problem(self, text: str) -> None:
+        feedback_widget = self.feedback_widget
+        feedback_widget.update(f"🔌 Race server problem: {escape(text)}")
+        feedback_widget.remove_class("success")
+        feedback_widget.add_class("error")
+    
+    def action_back_home(self) -> None:
+        """Leave the race and return to home screen"""
+        self.app.run_worker(self.client.close())
+        self.app.pop_screen()
+
+
+class MarathonScreen(GameScreen):
+    """A race through an endless stream of challenges, until ESC ends it
+    
+    The next challenge is prepared on a worker thread while the current one
+    is raced, so clearing a snippet swaps in the next one without a pause.
+    """
+    
+    resumable = False
+    
+    MARATHON_TEMPLATE = """[bold yellow]🏃 MARATHON FINISHED! 🏃[/bold yellow]
+
+[bold cyan]Difficulty:[/bold cyan] {difficulty}
+[bold cyan]Snippets Cleared:[/bold cyan] {challenges}
+[bold cyan]Points Earned:[/bold cyan] {score}/{total_questions}
+[bold magenta]Marathon Time:[/bold magenta] {minutes:02d}:{seconds:02d}
+
+[bold yellow]🏆 AVERAGE SCORE:[/bold yellow] [bold green]{average_score}/100[/bold green]
+[bold white]Performance Rank:[/bold white] [bold]{rank}[/bold]
+
+[dim]Press ESC to return to menu[/dim]"""
+    
+    def __init__(self, difficulty: str, bank=BUILTIN_BANK, scheduler=None, recorder=None, instant: bool = False):
+        self.prefetcher = Prefetcher(challenge_stream(bank, difficulty, scheduler))
+        self.totals = MarathonTotals()
+        self.ended = False
+        super().__init__(difficulty, bank, scheduler, recorder, instant)
+    
+    def load_challenge(self):
+        """Take the prefetched challenge; the one after it starts loading at once"""
+        start = monotonic_ns()
+        prepared = self.prefetcher.get()
+        self.app.perf.record("marathon.prefetch_wait", monotonic_ns() - start)
+        self.highlighted = prepared.highlighted
+        self.begin_session(prepared.index, prepared.challenge)
+    
+    def restart(self) -> None:
+        """Start a new marathon on this screen"""
+        self.totals = MarathonTotals()
+        self.ended = False
+        super().restart()
+    
+    def race_elapsed(self) -> float:
+        if self.ended:
+            return self.totals.elapsed_time
+        return self.totals.elapsed_time + self.session.elapsed()
+    
+    def get_current_question(self) -> str:
+        snippet = f"[bold green]🏃 MARATHON - SNIPPET {self.totals.challenges + 1}[/bold green]"
+        return f"{snippet}\n{super().get_current_question()}"
+    
+    def show_results(self):
+        """Bank the cleared challenge and swap in the prefetched next one"""
+        start = monotonic_ns()
+        self.totals.add(self.finish_race())
+        self.load_challenge()
+        self.progress.reset(self.total_questions, self.ghost)
+        self.code_display.set_code(self.challenge.code, self.highlighted)
+        self.question_widget.update(self.get_current_question())
+        self.clear_answer()
+        if not self.instant:
+            self.input_widget.focus()
+        self.feedback_widget.update(f"✅ SNIPPET {self.totals.challenges} CLEARED! Keep going! 🏁")
+        self.app.perf.record("marathon.transition", monotonic_ns() - start)
+    
+    def action_back_home(self) -> None:
+        """End the marathon with a summary, or leave once it has ended"""
+        if self.ended or not self.totals.challenges:
+            if not self.ended:
+                self.log_abort()
+            self.app.pop_screen()
+            return
+        # The challenge in progress does not count
+        self.log_abort()
+        self.ended = True
+        self.session.clock.stop()
+        self.stop_timer()
+        totals = self.totals
+        self.show_summary(self.MARATHON_TEMPLATE.format(
+            difficulty=self.difficulty.upper(),
+            challenges=totals.challenges,
+            score=totals.score,
+            total_questions=totals.total_questions,
+            minutes=int(totals.elapsed_time // 60),
+            seconds=int(totals.elapsed_time % 60),
+            average_score=totals.average_score,
+            rank=totals.rank,
+        ))
+    
+    def on_unmount(self) -> None:
+        self.prefetcher.close()
+
+
+class ReplayScreen(GameScreen):
+    """Plays a race from a replay log back through the game screen
+    
+    At full speed the race clock follows the recorded timestamps instead of
+    the wall clock, so the replayed race scores exactly as the original did.
+    """
+    
+    resumable = False
+    
+    def __init__(self, race, challenge, realtime: bool = True):
+        self.race = race  # A replay_log.RecordedRace
+        self.replay_challenge = challenge
+        self.realtime = realtime
+        self.replay_ns = race.start_ns  # Recorded time reached so far, at full speed
+        super().__init__(race.difficulty)
+    
+    def load_challenge(self):
+        clock = None if self.realtime else RaceClock(lambda: self.replay_ns)
+        self.begin_session(self.race.index, self.replay_challenge, clock)
+    
+    def finish_race(self):
+        """A replayed race is not saved anywhere"""
+        return self.session.finish()
+    
+    def on_mount(self) -> None:
+        self.run_worker(self.play(), group="replay", exclusive=True)
+    
+    async def play(self) -> None:
+        """Feed the recorded answer box changes and submissions to the screen"""
+        input_widget = self.input_widget
+        started = monotonic_ns()
+        for event in self.race.events:
+            if self.realtime:
+                delay_ns = (event.time_ns - self.race.start_ns) - (monotonic_ns() - started)
+                if delay_ns > 0:
+                    await asyncio.sleep(delay_ns / 1e9)
+            else:
+                self.replay_ns = event.time_ns
+                await asyncio.sleep(0)
+            if event.kind == INPUT:
+                input_widget.value = event.text
+            elif event.kind == SUBMIT:
+                self.submit_answer()
+        self.app.perf.record("replay.total", monotonic_ns() - started)
+        self.notify(f"Replay finished in {(monotonic_ns() - started) / 1e6:.0f} ms")
+
+
+class ResumedGameScreen(GameScreen):
+    """Carries on with a race saved in a session snapshot
+    
+    The race goes on from the question it was left at, with its score,
+    misses and race time as they were. It is not added to the replay log,
+    whose races are always played back from their first question.
+    """
+    
+    def __init__(self, snapshot, bank=BUILTIN_BANK, scheduler=None, instant: bool = False):
+        self.snapshot = snapshot  # A session_snapshot.Snapshot
+        super().__init__(snapshot.session.difficulty, bank, scheduler, None, instant)
+    
+    def load_challenge(self):
+        self.session = self.snapshot.session
+        self.challenge = self.session.challenge
+        self.total_questions = self.session.total_questions
+        key = challenge_key(self.challenge)
+        self.challenge_index = self.snapshot.index
+        challenges = self.bank[self.difficulty] if self.difficulty in self.bank else ()
+        index = self.challenge_index
+        if index is None or index >= len(challenges) or challenge_key(challenges[index]) != key:
+            # The bank changed since, so the scheduler cannot tell which challenge this was
+            self.challenge_index = None
+            self.scheduler = None
+        self.ghost = self.load_ghost(key)
+    
+    def on_mount(self) -> None:
+        self.progress.update_progress(self.session.current_question_idx)
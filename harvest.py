@@ -0,0 +1,199 @@
+"""
+Challenge harvesting for Code Racer
+Turns a directory of Python files into race material: functions and classes
+of the right size become challenges, with questions from question_gen
+
+Files are parsed across a process pool, and an incremental cache keyed on
+path, mtime and size lets re-runs skip every file that has not changed.
+Questions come from question_gen's content-hash cache, so a snippet in a
+touched, moved or copied file is not parsed for questions again.
+"""
+
+import ast
+import json
+import os
+import sqlite3
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+
+from question_gen import generate_questions
+from user_dirs import cache_dir
+
+
+# Bump when extraction or the cache layout changes, so cached results from older versions are not reused
+HARVEST_VERSION = 3
+
+# Snippet length in lines for each difficulty tier (inclusive)
+TIER_LINES = {
+    "beginner": (3, 6),
+    "intermediate": (7, 12),
+    "advanced": (13, 30),
+}
+
+MIN_QUESTIONS = 3
+MAX_QUESTIONS = 5
+
+# Snippets with longer lines do not fit the code display
+MAX_LINE_LENGTH = 100
+
+SKIP_DIRS = {".git", ".hg", ".svn", ".tox", ".nox", ".venv", "venv", "__pycache__", "node_modules", "site-packages"}
+
+# Below this many changed files a process pool costs more than it saves
+POOL_THRESHOLD = 32
+
+
+def tier_for(line_count: int):
+    """Difficulty tier for a snippet length, or None if it fits no tier"""
+    for difficulty, (low, high) in TIER_LINES.items():
+        if low <= line_count <= high:
+            return difficulty
+    return None
+
+
+def _pick_questions(questions):
+    """Up to MAX_QUESTIONS questions spread evenly over the snippet"""
+    if len(questions) <= MAX_QUESTIONS:
+        return questions
+    step = len(questions) / MAX_QUESTIONS
+    return [questions[int(i * step)] for i in range(MAX_QUESTIONS)]
+
+
+def extract_challenges(source: str):
+    """Challenges ({difficulty: [challenge, ...]}) from one file's source"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {}
+
+    # Split only where ast counts a new line: str.splitlines() also breaks on
+    # form feeds and other separators, which would shift every line number
+    lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    found = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        snippet_lines = lines[start - 1:node.end_lineno]
+        difficulty = tier_for(len(snippet_lines))
+        if difficulty is None:
+            continue
+        if any(len(line) > MAX_LINE_LENGTH or "\t" in line for line in snippet_lines):
+            continue
+
+        code = textwrap.dedent("\n".join(snippet_lines))
+        questions = generate_questions(code)
+        if len(questions) < MIN_QUESTIONS:
+            continue
+        found.setdefault(difficulty, []).append({"code": code, "questions": _pick_questions(questions)})
+    return found
+
+
+def harvest_file(path: str):
+    """Worker: challenges from one file, or {} if it cannot be read"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError):
+        return {}
+    return extract_challenges(source)
+
+
+def iter_python_files(root: str):
+    """Yield (path, mtime_ns, size) for every .py file under root"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in filenames:
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_mtime_ns, st.st_size
+
+
+class HarvestCache:
+    """Per-file harvest results keyed by path, valid while mtime and size match
+
+    Each difficulty's challenges have a column of their own, so reading the
+    bank one difficulty after another decodes every challenge just once.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cache_dir(), f"harvest-v{HARVEST_VERSION}.sqlite")
+        self.db = sqlite3.connect(path)
+        columns = ", ".join(f"{difficulty} TEXT" for difficulty in TIER_LINES)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            f"path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, {columns})"
+        )
+
+    def stamps(self):
+        """{path: (mtime_ns, size)} for every cached file"""
+        return {path: (mtime, size) for path, mtime, size in self.db.execute("SELECT path, mtime_ns, size FROM files")}
+
+    def store(self, rows) -> None:
+        """Save (path, mtime_ns, size, challenges) rows"""
+        placeholders = ", ".join("?" * (3 + len(TIER_LINES)))
+        self.db.executemany(
+            f"INSERT OR REPLACE INTO files VALUES ({placeholders})",
+            (
+                (path, mtime, size, *(
+                    json.dumps(challenges[difficulty], separators=(",", ":")) if challenges.get(difficulty) else None
+                    for difficulty in TIER_LINES
+                ))
+                for path, mtime, size, challenges in rows
+            ),
+        )
+        self.db.commit()
+
+    def forget(self, paths) -> None:
+        self.db.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in paths))
+        self.db.commit()
+
+    def challenges(self, paths, difficulty: str):
+        """Yield the cached challenges of one difficulty for the given files, in path order"""
+        if difficulty not in TIER_LINES:
+            return
+        wanted = set(paths)
+        # One pass over the files that have any, rather than a query per file
+        rows = self.db.execute(f"SELECT path, {difficulty} FROM files WHERE {difficulty} IS NOT NULL ORDER BY path")
+        for path, challenges in rows:
+            if path in wanted:
+                yield from json.loads(challenges)
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def harvest(root: str, cache: HarvestCache, workers=None):
+    """Bring the cache up to date for root and return (paths, changed count)
+
+    Only files whose mtime or size differ from the cache are parsed; files
+    that disappeared are dropped from the cache.
+    """
+    root = os.path.abspath(root)
+    cached = cache.stamps()
+    files = {path: (mtime, size) for path, mtime, size in iter_python_files(root)}
+    changed = [path for path, stamp in files.items() if cached.get(path) != stamp]
+
+    prefix = os.path.join(root, "")
+    cache.forget(path for path in cached if path.startswith(prefix) and path not in files)
+
+    if len(changed) < POOL_THRESHOLD or workers == 1:
+        results = map(harvest_file, changed)
+        cache.store((path, *files[path], result) for path, result in zip(changed, results))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(harvest_file, changed, chunksize=64)
+            cache.store((path, *files[path], result) for path, result in zip(changed, results))
+    return list(files), len(changed)
+
+
+def harvest_bank(root: str, cache: HarvestCache, workers=None):
+    """Harvest root and return a bank of lazily read challenges, for write_pack"""
+    paths, changed = harvest(root, cache, workers)
+    bank = {difficulty: cache.challenges(paths, difficulty) for difficulty in TIER_LINES}
+    return bank, len(paths), changed
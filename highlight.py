@@ -0,0 +1,103 @@
+"""
+Python syntax highlighting for Code Racer's code display
+Lexes a snippet with the stdlib tokenize module into one rich Text per line
+
+Results are memoized per snippet in a bounded LRU cache, so a challenge
+that comes back, a resize or a repaint never lexes the code again.
+"""
+
+import builtins
+import io
+import keyword
+import token
+import tokenize
+from functools import lru_cache
+
+from rich.text import Text
+
+
+# Colours match the #1e1e1e code background
+PLAIN_STYLE = "#d4d4d4"
+STYLES = {
+    "keyword": "bold #569cd6",
+    "builtin": "#dcdcaa",
+    "definition": "bold #4ec9b0",
+    "name": "#9cdcfe",
+    "string": "#ce9178",
+    "number": "#b5cea8",
+    "comment": "italic #6a9955",
+    "operator": "#d4d4d4",
+}
+
+BUILTIN_NAMES = frozenset(name for name in dir(builtins) if not name.startswith("_"))
+
+# Number of snippets whose highlighted lines are kept
+CACHE_SIZE = 256
+
+
+# f-strings are split into several tokens from Python 3.12 on
+_FSTRING_TYPES = frozenset(
+    getattr(token, name) for name in ("FSTRING_START", "FSTRING_MIDDLE", "FSTRING_END") if hasattr(token, name)
+)
+
+
+def _token_kind(tok, previous_name: str):
+    """Highlight kind for a token, or None to leave it plain"""
+    if tok.type == token.NAME:
+        if previous_name in ("def", "class"):
+            return "definition"
+        if keyword.iskeyword(tok.string) or tok.string in ("self", "cls"):
+            return "keyword"
+        if keyword.issoftkeyword(tok.string) and previous_name == "\n":
+            return "keyword"
+        if tok.string in BUILTIN_NAMES:
+            return "builtin"
+        return "name"
+    if tok.type == token.STRING or tok.type in _FSTRING_TYPES:
+        return "string"
+    if tok.type == token.NUMBER:
+        return "number"
+    if tok.type == token.COMMENT:
+        return "comment"
+    if tok.type == token.OP:
+        return "operator"
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def highlight_lines(code: str):
+    """Highlighted Text for every line of a snippet (treat as read-only)
+
+    Code that cannot be tokenized is returned unhighlighted.
+    """
+    lines = [Text(line, style=PLAIN_STYLE, no_wrap=True) for line in code.split("\n")]
+    previous_name = "\n"
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            kind = _token_kind(tok, previous_name)
+            if tok.type == token.NAME:
+                previous_name = tok.string
+            elif tok.type in (token.NEWLINE, token.NL):
+                previous_name = "\n"
+            elif tok.type not in (token.INDENT, token.DEDENT, token.COMMENT):
+                previous_name = ""
+            if kind is None:
+                continue
+            _stylize(lines, STYLES[kind], tok.start, tok.end)
+    except (tokenize.TokenError, SyntaxError):
+        # Keep whatever was highlighted before the error
+        pass
+    return tuple(lines)
+
+
+def _stylize(lines, style: str, start, end) -> None:
+    """Apply a style to a token that may span several lines"""
+    (start_row, start_col), (end_row, end_col) = start, end
+    for row in range(start_row, end_row + 1):
+        if row > len(lines):
+            break
+        line = lines[row - 1]
+        first = start_col if row == start_row else 0
+        last = end_col if row == end_row else len(line)
+        if last > first:
+            line.stylize(style, first, last)
@@ -0,0 +1,192 @@
+"""
+Leaderboard for Code Racer
+Finished races are kept in a local SQLite database (WAL mode), written in
+batches from a background thread so finishing a race never waits on disk
+
+Each player's fastest run of each challenge also keeps its checkpoint times,
+for the ghost car.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+
+from user_dirs import data_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    challenge TEXT NOT NULL,
+    final_score INTEGER NOT NULL,
+    accuracy_score INTEGER NOT NULL,
+    speed_score INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    total_questions INTEGER NOT NULL,
+    elapsed_time REAL NOT NULL,
+    rank TEXT NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_challenge
+    ON results (difficulty, challenge, final_score DESC, elapsed_time);
+CREATE INDEX IF NOT EXISTS results_by_difficulty
+    ON results (difficulty, final_score DESC, elapsed_time);
+CREATE INDEX IF NOT EXISTS results_by_player
+    ON results (player, difficulty, final_score DESC, elapsed_time);
+CREATE INDEX IF NOT EXISTS results_by_player_challenge
+    ON results (player, challenge, final_score DESC, elapsed_time);
+CREATE TABLE IF NOT EXISTS best_runs (
+    player TEXT NOT NULL,
+    challenge TEXT NOT NULL,
+    elapsed_time REAL NOT NULL,
+    checkpoints BLOB NOT NULL,
+    PRIMARY KEY (player, challenge)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = "player, difficulty, challenge, final_score, accuracy_score, speed_score, score, total_questions, elapsed_time, rank, finished_at"
+_INSERT = f"INSERT INTO results ({COLUMNS}) VALUES ({', '.join('?' * len(COLUMNS.split(', ')))})"
+_SELECT = f"SELECT {COLUMNS} FROM results"
+# Keeps whichever run of a challenge is faster
+_UPSERT_BEST = (
+    "INSERT INTO best_runs VALUES (?, ?, ?, ?) ON CONFLICT (player, challenge) DO UPDATE SET "
+    "elapsed_time = excluded.elapsed_time, checkpoints = excluded.checkpoints "
+    "WHERE excluded.elapsed_time < best_runs.elapsed_time"
+)
+
+# Most rows written in one transaction
+BATCH_SIZE = 500
+
+_STOP = object()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class Leaderboard:
+    """Race results store with batched background writes and indexed queries"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(data_dir(), "leaderboard.sqlite")
+        self.path = path
+        self.db = _connect(path)
+        self.db.executescript(SCHEMA)
+        self._pending = queue.Queue()
+        self._best = {}  # (player, challenge) -> (elapsed_time, checkpoint times) or None, as last looked up
+        self._writer = threading.Thread(target=self._write_loop, name="leaderboard-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, result, challenge: str, player: str, checkpoints=None) -> None:
+        """Queue a RaceResult (and the race time at each checkpoint) to be saved; returns immediately"""
+        row = (
+            player, result.difficulty, challenge, result.final_score, result.accuracy_score,
+            result.speed_score, result.score, result.total_questions, result.elapsed_time,
+            result.rank, time.time(),
+        )
+        best = None
+        if checkpoints:
+            checkpoints = array("d", checkpoints)
+            best = (player, challenge, result.elapsed_time, checkpoints.tobytes())
+            key = (player, challenge)
+            if key in self._best:
+                known = self._best[key]
+                if known is None or result.elapsed_time < known[0]:
+                    self._best[key] = (result.elapsed_time, checkpoints)
+        self._pending.put((row, best))
+
+    def _write_loop(self) -> None:
+        try:
+            db = _connect(self.path)
+        except sqlite3.Error:
+            # Nothing can be saved, but the queue is still drained so flush and close return
+            db = None
+        try:
+            while True:
+                item = self._pending.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stop = False
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        item = self._pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    if db is not None:
+                        with db:
+                            db.executemany(_INSERT, [row for row, _ in batch])
+                            db.executemany(_UPSERT_BEST, [best for _, best in batch if best is not None])
+                except sqlite3.Error:
+                    # A locked, corrupt or full database loses this batch, not the writer
+                    pass
+                finally:
+                    for _ in batch:
+                        self._pending.task_done()
+                if stop:
+                    return
+        finally:
+            if db is not None:
+                db.close()
+
+    def flush(self) -> None:
+        """Wait until every queued result is on disk"""
+        self._pending.join()
+
+    def top(self, difficulty: str, challenge=None, limit: int = 10):
+        """Best results for a difficulty, or for one challenge of it"""
+        if challenge is None:
+            return self.db.execute(
+                f"{_SELECT} WHERE difficulty = ? ORDER BY final_score DESC, elapsed_time LIMIT ?",
+                (difficulty, limit),
+            ).fetchall()
+        return self.db.execute(
+            f"{_SELECT} WHERE difficulty = ? AND challenge = ? ORDER BY final_score DESC, elapsed_time LIMIT ?",
+            (difficulty, challenge, limit),
+        ).fetchall()
+
+    def personal_best(self, player: str, difficulty: str, challenge=None):
+        """A player's best result for a difficulty (or one challenge), or None"""
+        if challenge is None:
+            return self.db.execute(
+                f"{_SELECT} WHERE player = ? AND difficulty = ? ORDER BY final_score DESC, elapsed_time LIMIT 1",
+                (player, difficulty),
+            ).fetchone()
+        return self.db.execute(
+            f"{_SELECT} WHERE player = ? AND difficulty = ? AND challenge = ? "
+            "ORDER BY final_score DESC, elapsed_time LIMIT 1",
+            (player, difficulty, challenge),
+        ).fetchone()
+
+    def best_checkpoints(self, player: str, challenge: str):
+        """Race times (array of seconds) at each checkpoint of a player's fastest run, or None"""
+        key = (player, challenge)
+        if key not in self._best:
+            row = self.db.execute(
+                "SELECT elapsed_time, checkpoints FROM best_runs WHERE player = ? AND challenge = ?", key
+            ).fetchone()
+            # Runs finished since are added in record(), before they reach the database
+            self._best[key] = None if row is None else (row[0], array("d", row[1]))
+        best = self._best[key]
+        return None if best is None else best[1]
+
+    def close(self) -> None:
+        """Write everything still queued and close the database"""
+        self._pending.put(_STOP)
+        self._writer.join()
+        self.db.close()
@@ -0,0 +1,254 @@
+"""
+Load test harness for Code Racer
+Spins up N simulated players who race challenges from the bank with a
+configurable think time and error rate, against the in-process race
+engine or a race server, and reports throughput, answer-to-feedback
+latency percentiles and memory per session
+
+    python loadtest.py --players 500 --think exponential --think-mean 0.5
+    python loadtest.py --players 300 --target server
+    python loadtest.py --players 300 --target server --connect 127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import resource
+import sys
+import time
+
+from race_engine import RaceSession, pick_challenge
+from race_server import RaceClient, RaceServer
+
+
+THINK_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+# Spread of the lognormal think time (sigma of the underlying normal)
+LOGNORMAL_SIGMA = 0.5
+
+
+def think_time_sampler(distribution: str, mean: float, rng: random.Random):
+    """A function returning think times in seconds with the given mean"""
+    if mean <= 0:
+        return lambda: 0.0
+    if distribution == "fixed":
+        return lambda: mean
+    if distribution == "uniform":
+        return lambda: rng.uniform(0, 2 * mean)
+    if distribution == "exponential":
+        return lambda: rng.expovariate(1 / mean)
+    if distribution == "lognormal":
+        mu = math.log(mean) - LOGNORMAL_SIGMA ** 2 / 2
+        return lambda: rng.lognormvariate(mu, LOGNORMAL_SIGMA)
+    raise ValueError(f"unknown think time distribution {distribution!r}")
+
+
+def percentile(sorted_values, fraction: float):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Stats:
+    """Counters and latency samples gathered by every simulated player"""
+
+    def __init__(self):
+        self.latencies_ns = []
+        self.answers = 0
+        self.wrong = 0
+        self.races = 0
+        self.errors = 0
+
+    def report(self, wall_time: float, players: int, memory_per_session):
+        latencies = sorted(self.latencies_ns)
+        return {
+            "players": players,
+            "races": self.races,
+            "answers": self.answers,
+            "wrong_answers": self.wrong,
+            "errors": self.errors,
+            "wall_time_s": round(wall_time, 3),
+            "answers_per_s": round(self.answers / wall_time, 1) if wall_time else 0,
+            "races_per_s": round(self.races / wall_time, 1) if wall_time else 0,
+            "latency_us": {
+                name: round(percentile(latencies, fraction) / 1000, 1)
+                for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+            },
+            "memory_per_session_bytes": memory_per_session,
+        }
+
+
+def wrong_answer(correct: int, line_count: int, rng: random.Random) -> int:
+    """A line number that is not the right one"""
+    if line_count < 2:
+        return correct + 1
+    answer = rng.randint(1, line_count - 1)
+    return answer if answer < correct else answer + 1
+
+
+async def engine_player(bank, difficulty: str, races: int, think, error_rate: float, rng: random.Random, stats: Stats):
+    """A player racing directly against RaceSession"""
+    for _ in range(races):
+        challenge = pick_challenge(bank, difficulty, rng)
+        session = RaceSession(difficulty, challenge)
+        line_count = len(challenge.lines)
+        while not session.finished:
+            await asyncio.sleep(think())
+            correct = session.current_answer
+            answer = wrong_answer(correct, line_count, rng) if rng.random() < error_rate else correct
+            start = time.perf_counter_ns()
+            ok = session.submit(answer)
+            stats.latencies_ns.append(time.perf_counter_ns() - start)
+            stats.answers += 1
+            if not ok:
+                stats.wrong += 1
+        session.finish()
+        stats.races += 1
+
+
+async def server_player(address, name: str, answer_key, difficulty: str, races: int, think,
+                        error_rate: float, rng: random.Random, stats: Stats):
+    """A player racing through a race server over a socket"""
+    for _ in range(races):
+        started = asyncio.Event()
+
+        def on_event(message):
+            if message["type"] == "start":
+                started.set()
+
+        client = RaceClient(on_event)
+        try:
+            await client.connect(*address)
+            joined = await client.join(name, difficulty)
+            await started.wait()
+            code = joined["challenge"]["code"]
+            # Players know the answers for challenges in the local bank; otherwise they learn them from a miss
+            answers = answer_key.get(code)
+            line_count = code.count("\n") + 1
+            checkpoint = 0
+            total = len(joined["challenge"]["questions"])
+            known = None
+            while checkpoint < total:
+                await asyncio.sleep(think())
+                if known is not None:
+                    answer = known
+                elif answers is None:
+                    answer = rng.randint(1, line_count)
+                else:
+                    correct = answers[checkpoint]
+                    answer = wrong_answer(correct, line_count, rng) if rng.random() < error_rate else correct
+                start = time.perf_counter_ns()
+                checked = await client.answer(answer)
+                stats.latencies_ns.append(time.perf_counter_ns() - start)
+                stats.answers += 1
+                if checked["correct"]:
+                    known = None
+                else:
+                    stats.wrong += 1
+                    known = checked["answer"]
+                checkpoint = checked["checkpoint"]
+            stats.races += 1
+        except (ConnectionError, OSError, RuntimeError):
+            stats.errors += 1
+        finally:
+            await client.close()
+
+
+def build_answer_key(bank, difficulty: str):
+    """{code: answers} for every challenge of a difficulty in the bank"""
+    return {challenge.code: challenge.answers for challenge in bank[difficulty]}
+
+
+async def run(args, bank):
+    rng = random.Random(args.seed)
+    stats = Stats()
+    players = []
+    server = None
+    rss_before = max_rss_bytes()
+
+    if args.target == "engine":
+        for _ in range(args.players):
+            player_rng = random.Random(rng.random())
+            think = think_time_sampler(args.think, args.think_mean, player_rng)
+            players.append(engine_player(bank, args.difficulty, args.races, think, args.error_rate, player_rng, stats))
+    else:
+        if args.connect:
+            host, _, port = args.connect.rpartition(":")
+            address = (host, int(port))
+        else:
+            server = RaceServer(bank, room_size=args.room_size, start_delay=args.start_delay, rng=random.Random(args.seed))
+            await server.start("127.0.0.1", 0)
+            address = ("127.0.0.1", server.port)
+        answer_key = build_answer_key(bank, args.difficulty)
+        for i in range(args.players):
+            player_rng = random.Random(rng.random())
+            think = think_time_sampler(args.think, args.think_mean, player_rng)
+            players.append(server_player(address, f"bot{i}", answer_key, args.difficulty, args.races,
+                                         think, args.error_rate, player_rng, stats))
+
+    start = time.perf_counter()
+    await asyncio.gather(*players)
+    wall_time = time.perf_counter() - start
+    if server is not None:
+        await server.close()
+
+    # Against a separate server process the sessions live elsewhere
+    memory_per_session = None
+    if not args.connect:
+        memory_per_session = max(0, max_rss_bytes() - rss_before) // max(1, args.players)
+    return stats.report(wall_time, args.players, memory_per_session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive simulated racers against Code Racer")
+    parser.add_argument("--players", type=int, default=100, help="number of concurrent simulated players")
+    parser.add_argument("--races", type=int, default=1, help="races per player")
+    parser.add_argument("--difficulty", default="beginner")
+    parser.add_argument("--target", choices=("engine", "server"), default="engine",
+                        help="race the in-process engine or a race server")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="with --target server, use this server instead of starting one in-process")
+    parser.add_argument("--think", choices=THINK_DISTRIBUTIONS, default="exponential",
+                        help="think time distribution before each answer")
+    parser.add_argument("--think-mean", type=float, default=0.0, help="mean think time in seconds (0 = none)")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="chance that an answer is wrong")
+    parser.add_argument("--room-size", type=int, default=8, help="racers per room for the in-process server")
+    parser.add_argument("--start-delay", type=float, default=0.1, help="room start delay for the in-process server")
+    parser.add_argument("--pack", metavar="PATH", help="take challenges from a challenge pack")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.pack:
+        from challenge_pack import ChallengePack
+        bank = ChallengePack(args.pack)
+    else:
+        from builtin_challenges import BUILTIN_BANK
+        bank = BUILTIN_BANK
+
+    report = asyncio.run(run(args, bank))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    latency = report["latency_us"]
+    memory = report["memory_per_session_bytes"]
+    print(f"{report['players']} players, {report['races']} races, {report['answers']} answers "
+          f"({report['wrong_answers']} wrong, {report['errors']} errors) in {report['wall_time_s']} s")
+    print(f"throughput: {report['answers_per_s']} answers/s, {report['races_per_s']} races/s")
+    print(f"answer-to-feedback latency: p50 {latency['p50']} us, p90 {latency['p90']} us, "
+          f"p99 {latency['p99']} us, max {latency['max']} us")
+    print(f"memory per session: {'n/a' if memory is None else f'{memory} bytes'}")
+
+
+if __name__ == "__main__":
+    main()
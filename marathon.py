@@ -0,0 +1,109 @@
+"""
+Marathon races for Code Racer
+A marathon is an endless stream of challenges raced back to back. The next
+challenge is picked, decoded and highlighted on a worker thread while the
+player is still answering the current one, so moving on costs nothing
+
+Only the current challenge, the one prefetched after it and a few running
+totals are ever held, so memory stays flat however long a marathon runs.
+"""
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from highlight import highlight_lines
+from race_engine import Challenge, RaceResult, rank_for
+
+
+class PreparedChallenge(NamedTuple):
+    """A challenge ready to race: its bank index and highlighted lines"""
+
+    index: int
+    challenge: Challenge
+    highlighted: tuple
+
+
+def challenge_stream(bank, difficulty: str, scheduler=None, rng=random):
+    """Endless (index, challenge) pairs for a difficulty, never the same one twice in a row
+
+    Each pair is picked while the one before it is still being raced, so
+    the scheduler is told to pass over that one rather than offer it again.
+    """
+    challenges = bank[difficulty]
+    count = len(challenges)
+    previous = None
+    while True:
+        if scheduler is not None:
+            index, challenge = scheduler.pick(bank, difficulty, exclude=previous)
+        else:
+            index = rng.randrange(count)
+            if index == previous and count > 1:
+                index = rng.randrange(count - 1)
+                if index >= previous:
+                    index += 1
+            challenge = challenges[index]
+        previous = index
+        yield index, challenge
+
+
+def prepare_challenge(item) -> PreparedChallenge:
+    """Do the slow work for a streamed challenge before it is needed"""
+    index, challenge = item
+    # The same text CodeDisplay highlights, so it is a cache hit there too
+    return PreparedChallenge(index, challenge, highlight_lines(challenge.code.expandtabs(4)))
+
+
+class Prefetcher:
+    """Keeps the next item of an iterator prepared on a worker thread"""
+
+    def __init__(self, iterator, prepare=prepare_challenge):
+        self._iterator = iterator
+        self._prepare = prepare
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._next = self._executor.submit(self._produce)
+
+    def _produce(self):
+        return self._prepare(next(self._iterator))
+
+    @property
+    def ready(self) -> bool:
+        """Whether get() will return without waiting"""
+        return self._next.done()
+
+    def get(self):
+        """The prepared next item, then start preparing the one after it"""
+        item = self._next.result()
+        self._next = self._executor.submit(self._produce)
+        return item
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MarathonTotals:
+    """Running totals over every finished challenge of a marathon"""
+
+    __slots__ = ("challenges", "score", "total_questions", "elapsed_time", "final_score_sum")
+
+    def __init__(self):
+        self.challenges = 0
+        self.score = 0
+        self.total_questions = 0
+        self.elapsed_time = 0.0
+        self.final_score_sum = 0
+
+    def add(self, result: RaceResult) -> None:
+        self.challenges += 1
+        self.score += result.score
+        self.total_questions += result.total_questions
+        self.elapsed_time += result.elapsed_time
+        self.final_score_sum += result.final_score
+
+    @property
+    def average_score(self) -> int:
+        return self.final_score_sum // self.challenges if self.challenges else 0
+
+    @property
+    def rank(self) -> str:
+        return rank_for(self.average_score)
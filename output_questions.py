@@ -0,0 +1,244 @@
+"""
+"What does this print?" questions for Code Racer
+Runs each snippet once in the sandbox pool and turns what it printed, and
+the final values of the names it assigned, into multiple-choice questions
+answered with an option number
+
+Run results are cached on disk by a hash of the snippet, so rebuilding a
+bank only runs snippets that are new or changed. The questions are written
+into challenge banks ahead of time; the game never runs any code.
+
+    python output_questions.py snippet.py other_snippet.py
+"""
+
+import ast
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+from itertools import islice
+
+from race_engine import choice_prompt, is_choice_prompt
+from sandbox import SandboxPool
+from user_dirs import cache_dir
+
+
+# Bump when the way snippets are run changes, so old cache entries are ignored
+OUTPUT_VERSION = 1
+
+# Output questions added to a challenge at most
+MAX_OUTPUT_QUESTIONS = 2
+
+# Options offered per question, the right one included
+CHOICES = 4
+
+# Longest option shown, and most printed lines asked about
+MAX_OPTION_LENGTH = 40
+MAX_OUTPUT_LINES = 4
+
+# Challenges run through the pool at a time while streaming a bank
+BATCH_SIZE = 1024
+
+# Shown between printed lines in an option
+LINE_SEPARATOR = " | "
+
+_NUMBER = re.compile(r"-?\d+")
+
+
+def output_hash(code: str) -> str:
+    """Content hash identifying a snippet's run (and the Python it ran on)"""
+    version = f"{OUTPUT_VERSION}\0{sys.version_info[0]}.{sys.version_info[1]}"
+    return hashlib.sha256(f"{version}\0{code}".encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """Sandbox run results keyed by snippet hash"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cache_dir(), f"outputs-v{OUTPUT_VERSION}.sqlite")
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS runs (hash TEXT PRIMARY KEY, result TEXT)")
+
+    def get_many(self, keys):
+        """{hash: result} for the given hashes that are cached"""
+        found = {}
+        keys = list(keys)
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, result in self.db.execute(f"SELECT hash, result FROM runs WHERE hash IN ({placeholders})", chunk):
+                found[key] = json.loads(result)
+        return found
+
+    def store(self, rows) -> None:
+        """Save (hash, result) rows"""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?)",
+            ((key, json.dumps(result, separators=(",", ":"))) for key, result in rows),
+        )
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def run_snippets(codes, cache: OutputCache, pool: SandboxPool):
+    """{code: run result} for each snippet, running only those not cached"""
+    keys = {code: output_hash(code) for code in codes}
+    cached = cache.get_many(set(keys.values()))
+    missing = {key: code for code, key in keys.items() if key not in cached}
+    fresh = dict(pool.imap_unordered(missing.items()))
+    cache.store(fresh.items())
+    cached.update(fresh)
+    return {code: cached[key] for code, key in keys.items()}
+
+
+def _assigned_names(tree):
+    """Top-level names that are assigned something other than a plain literal, in order"""
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+            targets, value = [node.target], None
+        else:
+            continue
+        if value is not None:
+            try:
+                ast.literal_eval(value)
+                # Reading a literal back is no challenge
+                continue
+            except ValueError:
+                pass
+        for target in targets:
+            if isinstance(target, ast.Name) and target.id not in names:
+                names.append(target.id)
+    return names
+
+
+def _literals(tree):
+    """Strings and numbers written in the snippet, for wrong options"""
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float)) and not isinstance(node.value, bool):
+            if node.value not in found:
+                found.append(node.value)
+    return found
+
+
+def _wrong_options(answer: str, alternatives, printed: bool):
+    """Plausible wrong answers: numbers off by a little, lines dropped, other literals"""
+    options = []
+    for match in _NUMBER.finditer(answer):
+        value = int(match.group())
+        for changed in (value + 1, value - 1, value * 2 if value else 2, value + 10):
+            options.append(f"{answer[:match.start()]}{changed}{answer[match.end():]}")
+    if printed and LINE_SEPARATOR in answer:
+        lines = answer.split(LINE_SEPARATOR)
+        options.append(LINE_SEPARATOR.join(lines[:-1]))
+        options.append(LINE_SEPARATOR.join(lines[1:]))
+    for literal in alternatives:
+        options.append(str(literal) if printed else repr(literal))
+    unique = []
+    for option in options:
+        if option and option != answer and len(option) <= MAX_OPTION_LENGTH and option not in unique:
+            unique.append(option)
+    return unique
+
+
+def _choice_question(question: str, answer: str, wrong, rng: random.Random):
+    """A {"question", "answer"} dict with shuffled options, or None without enough wrong options"""
+    if len(wrong) < 2:
+        return None
+    options = rng.sample(wrong, min(len(wrong), CHOICES - 1)) + [answer]
+    rng.shuffle(options)
+    return {"question": choice_prompt(question, options), "answer": options.index(answer) + 1}
+
+
+def build_output_questions(code: str, result):
+    """Output questions for a snippet from its sandbox run (the same every time for the same run)"""
+    if not result.get("ok"):
+        return []
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return []
+    rng = random.Random(output_hash(code))
+    literals = _literals(tree)
+    questions = []
+
+    printed_lines = result["stdout"].rstrip("\n").split("\n")
+    printed = LINE_SEPARATOR.join(printed_lines)
+    # Default object reprs differ from run to run
+    if printed and len(printed_lines) <= MAX_OUTPUT_LINES and len(printed) <= MAX_OPTION_LENGTH and " at 0x" not in printed:
+        question = _choice_question("What does this print?", printed, _wrong_options(printed, literals, True), rng)
+        if question is not None:
+            questions.append(question)
+
+    values = result["values"]
+    # Names set late in a snippet tend to hold its result
+    for name in reversed(_assigned_names(tree)):
+        if len(questions) >= MAX_OUTPUT_QUESTIONS:
+            break
+        answer = values.get(name)
+        if answer is None or len(answer) > MAX_OPTION_LENGTH or answer == printed:
+            continue
+        question = _choice_question(f"What is {name} at the end?", answer, _wrong_options(answer, literals, False), rng)
+        if question is not None:
+            questions.append(question)
+    return questions[:MAX_OUTPUT_QUESTIONS]
+
+
+def with_output_questions(challenge, result):
+    """A challenge dict with output questions added after its own"""
+    questions = list(challenge["questions"])
+    if any(is_choice_prompt(q["question"]) for q in questions):
+        # Already has them, from an earlier build
+        return challenge
+    questions.extend(build_output_questions(challenge["code"], result))
+    return {"code": challenge["code"], "questions": questions}
+
+
+def _augmented(challenges, cache: OutputCache, pool: SandboxPool):
+    challenges = iter(challenges)
+    while True:
+        batch = [c if isinstance(c, dict) else c.to_dict() for c in islice(challenges, BATCH_SIZE)]
+        if not batch:
+            return
+        results = run_snippets({c["code"] for c in batch}, cache, pool)
+        for challenge in batch:
+            yield with_output_questions(challenge, results[challenge["code"]])
+
+
+def add_output_questions(bank, cache: OutputCache, pool: SandboxPool):
+    """A bank with output questions added to every challenge, for write_pack
+
+    Challenges are run and rewritten in batches as the bank is read, so a
+    large harvested bank is never held in memory at once.
+    """
+    return {difficulty: _augmented(challenges, cache, pool) for difficulty, challenges in bank.items()}
+
+
+def main():
+    """Print the output questions for each file given on the command line"""
+    cache = OutputCache()
+    with SandboxPool() as pool:
+        for path in sys.argv[1:]:
+            with open(path, encoding="utf-8") as f:
+                code = f.read()
+            result = run_snippets([code], cache, pool)[code]
+            print(f"== {path}")
+            if not result["ok"]:
+                print(f"      did not run: {result['error']}")
+            for q in build_output_questions(code, result):
+                print(f"{q['answer']:4d}  {q['question']}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Latency instrumentation for Code Racer
+Fixed-size log-linear histograms of nanosecond durations, cheap enough to
+record on every keystroke and every frame
+
+Each power of two is split into SUB_BUCKETS linear buckets, so any recorded
+duration lands in a bucket at most 25% wider than its lower bound, and a
+histogram is the same 252 counters whether it holds ten samples or ten million.
+"""
+
+import json
+import os
+import time
+from array import array
+
+
+SUB_BUCKET_BITS = 2
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Enough buckets for any 64-bit duration
+BUCKETS = (64 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+DUMP_VERSION = 1
+
+
+def bucket_index(ns: int) -> int:
+    """Histogram bucket for a duration"""
+    bits = ns.bit_length()
+    if bits <= SUB_BUCKET_BITS:
+        return ns
+    shift = bits - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + ((ns >> shift) & (SUB_BUCKETS - 1))
+
+
+def bucket_bounds(index: int):
+    """(lowest, highest) duration in a bucket"""
+    if index < SUB_BUCKETS:
+        return index, index
+    shift = index // SUB_BUCKETS - 1
+    low = (SUB_BUCKETS + index % SUB_BUCKETS) << shift
+    return low, low + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    """Counts of nanosecond durations in BUCKETS fixed buckets"""
+
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKETS))
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int) -> None:
+        if ns < 0:
+            ns = 0
+        self.counts[bucket_index(ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> int:
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0
+        wanted = max(1, min(self.count, round(fraction * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(bucket_bounds(index)[1], self.max_ns)
+        return self.max_ns
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean_ns / 1e6, 3),
+            "p50_ms": round(self.percentile(0.5) / 1e6, 3),
+            "p90_ms": round(self.percentile(0.9) / 1e6, 3),
+            "p99_ms": round(self.percentile(0.99) / 1e6, 3),
+            "max_ms": round(self.max_ns / 1e6, 3),
+            # [lowest ns, count] for every bucket that was hit
+            "buckets": [[bucket_bounds(i)[0], count] for i, count in enumerate(self.counts) if count],
+        }
+
+
+class PerfStats:
+    """Named latency histograms, created on first use"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, name: str, ns: int) -> None:
+        """Add one duration in nanoseconds to a histogram"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(ns)
+
+    def to_dict(self):
+        return {
+            "version": DUMP_VERSION,
+            "started_at": self.started_at,
+            "finished_at": time.time(),
+            "histograms": {name: self.histograms[name].to_dict() for name in sorted(self.histograms)},
+        }
+
+    def dump(self, path: str) -> None:
+        """Write every histogram to a JSON file, replacing it atomically"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp_path, path)
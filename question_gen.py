@@ -0,0 +1,241 @@
+"""
+Automatic question generation for Code Racer
+Parses a snippet with ast and writes "which line...?" questions for its
+assignments, loops, conditionals, returns, calls, functions and classes
+
+Generated questions are cached by a hash of the snippet, in memory and on
+disk, so a snippet is only ever parsed once.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import sys
+from collections import Counter, OrderedDict
+
+from user_dirs import cache_dir
+
+
+# Bump when the questions produced for a snippet change, so old cache entries are ignored
+GENERATOR_VERSION = 1
+
+# Longest expression quoted inside a question
+MAX_EXPR_LENGTH = 40
+
+_AUG_OPS = {
+    ast.Add: "Which line adds to {target}?",
+    ast.Sub: "Which line subtracts from {target}?",
+    ast.Mult: "Which line multiplies {target}?",
+}
+
+
+def _expr(node) -> str:
+    """Source text for an expression, shortened to fit in a question"""
+    text = ast.unparse(node)
+    if len(text) > MAX_EXPR_LENGTH:
+        text = text[:MAX_EXPR_LENGTH - 3] + "..."
+    return text
+
+
+class _QuestionVisitor(ast.NodeVisitor):
+    """Collects (line, question, fallback question) entries
+
+    The fallback quotes the whole statement and is only used when the
+    plain question would be ambiguous.
+    """
+
+    def __init__(self):
+        self.found = []
+        self.assigned = set()
+
+    def add(self, node, question: str, simple: bool = True) -> None:
+        fallback = f"Which line runs {_expr(node)}?" if simple else None
+        self.found.append((node.lineno, question, fallback))
+
+    def visit_FunctionDef(self, node):
+        self.add(node, f"Where is the function {node.name} defined?", simple=False)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self.add(node, f"Where is the class {node.name} defined?", simple=False)
+        self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self._assignment(node, target)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self._assignment(node, node.target)
+        self.generic_visit(node)
+
+    def _assignment(self, node, target) -> None:
+        if isinstance(target, ast.Name):
+            if target.id in self.assigned:
+                self.add(node, f"Which line updates {target.id}?")
+            else:
+                self.assigned.add(target.id)
+                self.add(node, f"Where is {target.id} initialized?")
+        elif isinstance(target, ast.Attribute):
+            self.add(node, f"Where is {_expr(target)} set?")
+        elif isinstance(target, ast.Subscript):
+            self.add(node, f"Which line assigns to {_expr(target)}?")
+
+    def visit_AugAssign(self, node):
+        template = _AUG_OPS.get(type(node.op), "Where is {target} updated?")
+        self.add(node, template.format(target=_expr(node.target)))
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        self.add(node, f"Which line starts the loop over {_expr(node.iter)}?", simple=False)
+        self.generic_visit(node)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self.add(node, f"Where is the while loop condition {_expr(node.test)}?", simple=False)
+        self.generic_visit(node)
+
+    def visit_If(self, node):
+        self.add(node, f"Which line checks {_expr(node.test)}?", simple=False)
+        self.generic_visit(node)
+
+    def visit_Return(self, node):
+        if node.value is None:
+            self.add(node, "Where does the function return?")
+        else:
+            self.add(node, f"Where is {_expr(node.value)} returned?")
+        self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        if isinstance(node.value, ast.Call):
+            call = node.value
+            name = _expr(call.func)
+            if name == "print":
+                self.add(node, "Which line prints the output?")
+            else:
+                self.add(node, f"Which line calls {name}()?")
+        self.generic_visit(node)
+
+
+def parse_questions(code: str):
+    """Generate questions for a snippet without touching the cache
+
+    A question whose text would match more than one line is replaced by one
+    quoting the statement, or dropped if that is still ambiguous, since it
+    has no single right answer. Snippets that do not parse get no questions.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return []
+
+    visitor = _QuestionVisitor()
+    visitor.visit(tree)
+    counts = Counter(question for _, question, _ in visitor.found)
+    fallback_counts = Counter(fallback for _, _, fallback in visitor.found)
+    questions = []
+    for line, question, fallback in sorted(visitor.found, key=lambda entry: entry[0]):
+        if counts[question] > 1:
+            if fallback is None or fallback_counts[fallback] > 1 or fallback in counts:
+                continue
+            question = fallback
+        questions.append({"question": question, "answer": line})
+    return questions
+
+
+def code_hash(code: str) -> str:
+    """Content hash identifying a snippet (and the generator version)"""
+    return hashlib.sha256(f"{GENERATOR_VERSION}\0{code}".encode("utf-8")).hexdigest()
+
+
+class QuestionCache:
+    """Generated questions keyed by snippet hash, kept in memory and on disk
+
+    directory=None keeps the cache in memory only.
+    """
+
+    def __init__(self, directory=None, max_memory_entries: int = 4096):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, code: str):
+        """Questions for a snippet, parsing only on a cache miss"""
+        key = code_hash(code)
+        questions = self._memory.get(key)
+        if questions is not None:
+            self._memory.move_to_end(key)
+            return list(questions)
+
+        questions = self._load(key)
+        if questions is None:
+            questions = parse_questions(code)
+            self._store(key, questions)
+        self._remember(key, questions)
+        return list(questions)
+
+    def _remember(self, key: str, questions) -> None:
+        self._memory[key] = questions
+        if len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, questions) -> None:
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(questions, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is only an optimisation, a read-only disk must not break generation
+            pass
+
+
+_default_cache = None
+
+
+def default_cache() -> QuestionCache:
+    """The shared on-disk question cache in the user's cache directory"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = QuestionCache(cache_dir("questions"))
+    return _default_cache
+
+
+def generate_questions(code: str):
+    """Questions for a snippet, using the shared cache"""
+    return default_cache().get(code)
+
+
+def main():
+    """Print the generated questions for each file given on the command line"""
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as f:
+            code = f.read()
+        print(f"== {path}")
+        for q in generate_questions(code):
+            print(f"{q['answer']:4d}  {q['question']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Race analytics for Code Racer
+Streams over replay logs and estimates, per challenge and per question, how
+long races take and how often each question is missed. The result is a
+calibration file whose target times replace the fixed TARGET_TIMES when
+races are scored
+
+Races are read one at a time and every time distribution is kept in a
+quantile sketch with a fixed relative error, so memory depends on how many
+challenges the bank has, never on how many races the logs hold.
+
+    python race_analytics.py
+    python race_analytics.py old_races.crlog races.crlog --pack challenges.pack
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from array import array
+
+from race_engine import TARGET_TIMES, RaceClock, RaceSession, challenge_key
+from replay_log import SUBMIT, iter_races
+from user_dirs import data_dir
+
+
+CALIBRATION_VERSION = 1
+
+# Relative error of every quantile a sketch reports
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Times at or under this many seconds are counted as zero
+MIN_TIME = 1e-6
+
+# Finished races needed before a challenge (or a difficulty) gets its own target time
+MIN_RACES = 5
+
+# Quantile of finished race times used as the target: at the median, half
+# of all races earn full speed points
+TARGET_QUANTILE = 0.5
+
+
+class QuantileSketch:
+    """Quantiles of non-negative values to within RELATIVE_ACCURACY
+
+    Values are counted in logarithmically sized buckets (as in DDSketch), so
+    seconds from a microsecond to a day fit in about 1400 counters however
+    many values are added.
+    """
+
+    __slots__ = ("counts", "count", "zeros")
+
+    def __init__(self):
+        self.counts = {}  # Bucket index -> values in it
+        self.count = 0
+        self.zeros = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= MIN_TIME:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / _LOG_GAMMA)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        """The value below which a fraction q of the values fall (0.0 if empty)"""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.counts) / (_GAMMA + 1)
+
+
+class ChallengeStats:
+    """Everything learned about one challenge from its recorded races"""
+
+    __slots__ = ("difficulty", "races", "aborted", "times", "question_times", "missed", "misses")
+
+    def __init__(self, difficulty: str, questions: int):
+        self.difficulty = difficulty
+        self.races = 0  # Finished races
+        self.aborted = 0
+        self.times = QuantileSketch()
+        self.question_times = [QuantileSketch() for _ in range(questions)]
+        self.missed = array("I", bytes(4 * questions))  # Finished races with a miss on each question
+        self.misses = array("I", bytes(4 * questions))  # Wrong answers on each question
+
+    def add(self, session: RaceSession) -> None:
+        self.races += 1
+        self.times.add(session.elapsed())
+        for i, split in enumerate(session.splits):
+            self.question_times[i].add(split)
+        for i, count in enumerate(session.misses):
+            if count:
+                self.missed[i] += 1
+                self.misses[i] += count
+
+
+class _ChallengeLocator:
+    """Finds the challenge each race was run on, decoding as little of the bank as possible
+
+    A race records its challenge's bank index, so normally only challenges
+    that were raced are decoded, once each. Every challenge is decoded (to
+    index the bank by key) only if a race's index no longer points at its
+    challenge, because the bank changed since.
+    """
+
+    def __init__(self, bank):
+        self.bank = bank
+        self.decoded = {}  # (difficulty, index) -> (challenge key, challenge)
+        self.by_key = None  # Challenge key -> (difficulty, index), built on first need
+
+    def _decode(self, difficulty: str, index: int):
+        spot = (difficulty, index)
+        found = self.decoded.get(spot)
+        if found is None:
+            challenge = self.bank[difficulty][index]
+            found = self.decoded[spot] = (challenge_key(challenge), challenge)
+        return found
+
+    def find(self, race):
+        """(difficulty, challenge) of a recorded race, or None if the bank does not have it"""
+        difficulty, index = race.difficulty, race.index
+        if difficulty in self.bank and index is not None and index < len(self.bank[difficulty]):
+            key, challenge = self._decode(difficulty, index)
+            if key == race.challenge_key:
+                return difficulty, challenge
+        if self.by_key is None:
+            self.by_key = {}
+            for name in self.bank:
+                for i, challenge in enumerate(self.bank[name]):
+                    self.by_key[challenge_key(challenge)] = (name, i)
+        location = self.by_key.get(race.challenge_key)
+        if location is None:
+            return None
+        return location[0], self._decode(*location)[1]
+
+
+def replay_session(race, challenge):
+    """The RaceSession a recorded race ended with, timed by its log, or None if it was not finished"""
+    if not race.finished:
+        return None
+    now = [race.start_ns]
+    session = RaceSession(race.difficulty, challenge, RaceClock(lambda: now[0]))
+    for event in race.events:
+        # Text that was not a line number never reached the session
+        if event.kind == SUBMIT and event.value >= 0:
+            now[0] = event.time_ns
+            session.submit(event.value)
+            if session.finished:
+                return session
+    return None
+
+
+def analyse(paths, bank):
+    """(stats by challenge key, finished race time sketches by difficulty, races skipped)
+
+    Races on challenges that are not in the bank are skipped.
+    """
+    locator = _ChallengeLocator(bank)
+    stats = {}
+    difficulty_times = {}
+    skipped = 0
+    for path in paths:
+        for race in iter_races(path):
+            found = locator.find(race)
+            if found is None:
+                skipped += 1
+                continue
+            difficulty, challenge = found
+            entry = stats.get(race.challenge_key)
+            if entry is None:
+                entry = stats[race.challenge_key] = ChallengeStats(difficulty, len(challenge.answers))
+            session = replay_session(race, challenge)
+            if session is None:
+                entry.aborted += 1
+                continue
+            entry.add(session)
+            sketch = difficulty_times.get(difficulty)
+            if sketch is None:
+                sketch = difficulty_times[difficulty] = QuantileSketch()
+            sketch.add(session.elapsed())
+    return stats, difficulty_times, skipped
+
+
+def _seconds(value: float) -> float:
+    return round(value, 3)
+
+
+def calibration_data(stats, difficulty_times, quantile=TARGET_QUANTILE, min_races=MIN_RACES):
+    """The calibration file contents for an analysis"""
+    difficulties = {}
+    for difficulty, sketch in difficulty_times.items():
+        summary = {
+            "races": sketch.count,
+            "p50": _seconds(sketch.quantile(0.5)),
+            "p90": _seconds(sketch.quantile(0.9)),
+        }
+        if sketch.count >= min_races:
+            summary["target_time"] = _seconds(sketch.quantile(quantile))
+        difficulties[difficulty] = summary
+
+    challenges = {}
+    for key, entry in stats.items():
+        summary = {
+            "difficulty": entry.difficulty,
+            "races": entry.races,
+            "aborted": entry.aborted,
+            "p10": _seconds(entry.times.quantile(0.1)),
+            "p50": _seconds(entry.times.quantile(0.5)),
+            "p90": _seconds(entry.times.quantile(0.9)),
+            "questions": [
+                {
+                    "p50": _seconds(sketch.quantile(0.5)),
+                    "p90": _seconds(sketch.quantile(0.9)),
+                    "miss_rate": round(entry.missed[i] / entry.races, 3) if entry.races else 0.0,
+                    "misses": entry.misses[i],
+                }
+                for i, sketch in enumerate(entry.question_times)
+            ],
+        }
+        if entry.races >= min_races:
+            summary["target_time"] = _seconds(entry.times.quantile(quantile))
+        challenges[key] = summary
+
+    return {
+        "version": CALIBRATION_VERSION,
+        "quantile": quantile,
+        "min_races": min_races,
+        "difficulties": difficulties,
+        "challenges": challenges,
+    }
+
+
+def default_calibration_path() -> str:
+    return os.path.join(data_dir(), "calibration.json")
+
+
+def write_calibration(path: str, data) -> None:
+    """Write a calibration file, replacing it atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+class Calibration:
+    """Target times from a calibration file, falling back to TARGET_TIMES"""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.difficulty_targets = {
+            difficulty: summary["target_time"]
+            for difficulty, summary in data.get("difficulties", {}).items()
+            if "target_time" in summary
+        }
+        self.challenge_targets = {
+            key: summary["target_time"]
+            for key, summary in data.get("challenges", {}).items()
+            if "target_time" in summary
+        }
+
+    @classmethod
+    def load(cls, path=None):
+        """The calibration in a file, or none at all if it is missing or unreadable"""
+        path = path or default_calibration_path()
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        if not isinstance(data, dict) or data.get("version") != CALIBRATION_VERSION:
+            return cls()
+        return cls(data)
+
+    def target_time(self, difficulty: str, key: str) -> float:
+        """Seconds for full speed points on a challenge"""
+        target = self.challenge_targets.get(key)
+        if target is None:
+            target = self.difficulty_targets.get(difficulty, TARGET_TIMES[difficulty])
+        return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate Code Racer target times from replay logs")
+    parser.add_argument("logs", nargs="*", metavar="LOG", help="replay logs to read (default: races.crlog in the data directory)")
+    parser.add_argument("--pack", metavar="PATH", help="the challenge pack the races were run on")
+    parser.add_argument("--output", metavar="PATH", help="calibration file to write (default: calibration.json in the data directory)")
+    parser.add_argument("--quantile", type=float, default=TARGET_QUANTILE, help="quantile of race times used as the target time")
+    parser.add_argument("--min-races", type=int, default=MIN_RACES, help="finished races needed before a challenge gets its own target")
+    args = parser.parse_args()
+    if not 0 < args.quantile < 1:
+        parser.error("--quantile must be between 0 and 1")
+
+    if args.pack:
+        from challenge_pack import ChallengePack
+        bank = ChallengePack(args.pack)
+    else:
+        from builtin_challenges import BUILTIN_BANK
+        bank = BUILTIN_BANK
+    paths = args.logs or [os.path.join(data_dir(), "races.crlog")]
+
+    start = time.perf_counter()
+    try:
+        stats, difficulty_times, skipped = analyse(paths, bank)
+    except (OSError, ValueError) as error:
+        sys.exit(f"race_analytics: {error}")
+    elapsed = time.perf_counter() - start
+    data = calibration_data(stats, difficulty_times, args.quantile, args.min_races)
+
+    finished = sum(entry.races for entry in stats.values())
+    aborted = sum(entry.aborted for entry in stats.values())
+    print(f"{finished} finished and {aborted} unfinished races on {len(stats)} challenges "
+          f"({skipped} not in this bank) read in {elapsed:.2f} s")
+    for difficulty, summary in data["difficulties"].items():
+        target = summary.get("target_time")
+        target_text = f"target {target:.1f} s" if target is not None else "too few races for a target"
+        print(f"  {difficulty:<13} {summary['races']:6d} races  p50 {summary['p50']:6.1f} s  "
+              f"p90 {summary['p90']:6.1f} s  {target_text} (was {TARGET_TIMES[difficulty]} s)")
+    hardest = sorted(
+        ((question["miss_rate"], key, i) for key, summary in data["challenges"].items()
+         for i, question in enumerate(summary["questions"]) if summary["races"] >= args.min_races),
+        reverse=True,
+    )[:5]
+    if hardest:
+        print("Most missed questions:")
+        for miss_rate, key, i in hardest:
+            print(f"  {key} question {i + 1}: missed in {miss_rate:.0%} of races")
+
+    output = args.output or default_calibration_path()
+    write_calibration(output, data)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
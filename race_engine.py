@@ -0,0 +1,402 @@
+"""
+Race engine for Code Racer
+Headless race logic (question order, attempts, score, timing and ranking)
+that the Textual screens drive but that runs without any UI
+"""
+
+import hashlib
+import random
+import sys
+import time
+from array import array
+from typing import NamedTuple
+
+
+# Target times by difficulty in seconds: a race at or under target gets full speed points
+# (race_analytics can calibrate them per challenge from recorded races)
+TARGET_TIMES = {"beginner": 10, "intermediate": 10, "advanced": 120}
+
+# Combined score: 60% accuracy, 40% speed
+ACCURACY_WEIGHT = 0.6
+SPEED_WEIGHT = 0.4
+
+# Points lost per second over the target time
+SPEED_PENALTY_PER_SECOND = 2
+
+# Seconds between the ghost car positions worked out ahead of a race (the race ticker's interval)
+GHOST_TICK = 0.1
+
+# Minimum final score for each rank, best first
+RANK_THRESHOLDS = ((90, "S-RANK"), (80, "A-RANK"), (70, "B-RANK"), (60, "C-RANK"))
+LOWEST_RANK = "D-RANK"
+
+
+class Question:
+    """One question and the line number that answers it (immutable)"""
+
+    __slots__ = ("text", "answer")
+
+    def __init__(self, text: str, answer: int):
+        object.__setattr__(self, "text", sys.intern(text))
+        object.__setattr__(self, "answer", answer)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, Question):
+            return NotImplemented
+        return self.text == other.text and self.answer == other.answer
+
+    def __hash__(self):
+        return hash((self.text, self.answer))
+
+    def __repr__(self):
+        return f"Question({self.text!r}, {self.answer})"
+
+
+def choice_prompt(question: str, options) -> str:
+    """Prompt for a multiple-choice question, whose answer is an option number"""
+    return "\n".join([question] + [f"  {number}) {option}" for number, option in enumerate(options, 1)])
+
+
+def is_choice_prompt(prompt: str) -> bool:
+    """Whether a question is answered with an option number instead of a line number"""
+    return "\n  1) " in prompt
+
+
+def answer_limit(prompt: str, line_count: int) -> int:
+    """The largest answer a question can have: its last option number, or the last line"""
+    if is_choice_prompt(prompt):
+        return prompt.count("\n  ")
+    return line_count
+
+
+class Challenge:
+    """A code snippet and its questions, stored compactly (immutable)
+
+    The code is kept pre-split into lines, question texts are interned so
+    repeated wording is shared across a bank, and answers are packed into
+    an array('H'), so the hot path reads answers[i] instead of indexing dicts.
+    """
+
+    __slots__ = ("lines", "prompts", "answers")
+
+    def __init__(self, lines, prompts, answers):
+        object.__setattr__(self, "lines", tuple(lines))
+        object.__setattr__(self, "prompts", tuple(sys.intern(p) for p in prompts))
+        object.__setattr__(self, "answers", array("H", answers))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @classmethod
+    def from_dict(cls, data) -> "Challenge":
+        """Build from the {"code": ..., "questions": [{"question", "answer"}]} layout"""
+        questions = data["questions"]
+        return cls(
+            data["code"].split("\n"),
+            [q["question"] for q in questions],
+            [q["answer"] for q in questions],
+        )
+
+    def to_dict(self):
+        return {
+            "code": self.code,
+            "questions": [{"question": p, "answer": a} for p, a in zip(self.prompts, self.answers)],
+        }
+
+    @property
+    def code(self) -> str:
+        return "\n".join(self.lines)
+
+    @property
+    def questions(self):
+        return tuple(Question(p, a) for p, a in zip(self.prompts, self.answers))
+
+    def question(self, index: int) -> Question:
+        return Question(self.prompts[index], self.answers[index])
+
+    def __len__(self) -> int:
+        return len(self.prompts)
+
+    def __eq__(self, other):
+        if not isinstance(other, Challenge):
+            return NotImplemented
+        return self.lines == other.lines and self.prompts == other.prompts and self.answers == other.answers
+
+    def __hash__(self):
+        return hash((self.lines, self.prompts))
+
+    def __repr__(self):
+        return f"Challenge({len(self.lines)} lines, {len(self.prompts)} questions)"
+
+
+def build_bank(raw_bank):
+    """Convert a {difficulty: [challenge dict, ...]} bank into Challenges"""
+    return {difficulty: [Challenge.from_dict(c) for c in challenges] for difficulty, challenges in raw_bank.items()}
+
+
+class RaceResult(NamedTuple):
+    """Final numbers for a finished race"""
+    difficulty: str
+    score: int
+    total_questions: int
+    elapsed_time: float
+    accuracy_score: int
+    speed_score: int
+    final_score: int
+    rank: str
+
+
+def speed_score_for(elapsed_time: float, target_time: float) -> int:
+    """Speed score (0-100): 100 if under target, decreasing as time increases"""
+    if elapsed_time <= target_time:
+        return 100
+    return max(0, 100 - int((elapsed_time - target_time) * SPEED_PENALTY_PER_SECOND))
+
+
+def rank_for(final_score: int) -> str:
+    """Performance rank for a final score"""
+    for threshold, rank in RANK_THRESHOLDS:
+        if final_score >= threshold:
+            return rank
+    return LOWEST_RANK
+
+
+def score_race(difficulty: str, score: int, total_questions: int, elapsed_time: float,
+               target_time=None) -> RaceResult:
+    """Combine accuracy and speed into the final score and rank"""
+    accuracy_score = int((score / total_questions) * 100) if total_questions else 0
+    if target_time is None:
+        target_time = TARGET_TIMES[difficulty]
+    speed_score = speed_score_for(elapsed_time, target_time)
+    final_score = int((accuracy_score * ACCURACY_WEIGHT) + (speed_score * SPEED_WEIGHT))
+    return RaceResult(difficulty, score, total_questions, elapsed_time,
+                      accuracy_score, speed_score, final_score, rank_for(final_score))
+
+
+def challenge_key(challenge: Challenge) -> str:
+    """Stable identifier for a challenge, derived from its code"""
+    return hashlib.sha1(challenge.code.encode("utf-8")).hexdigest()[:16]
+
+
+def pick_challenge(bank, difficulty: str, rng=random):
+    """Pick a random challenge for a difficulty from a bank"""
+    return rng.choice(bank[difficulty])
+
+
+class RaceClock:
+    """Monotonic race clock with pause/resume and per-question lap splits
+
+    Built on time.monotonic_ns, so it never jumps with wall-clock changes.
+    """
+
+    __slots__ = ("now", "start_ns", "paused_at", "paused_ns", "stopped_at", "lap_marks")
+
+    def __init__(self, now=time.monotonic_ns):
+        self.now = now
+        self.start_ns = now()
+        self.paused_at = None  # When the current pause began
+        self.paused_ns = 0  # Total time spent paused
+        self.stopped_at = None
+        self.lap_marks = []  # Race time (ns) at the end of each lap
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_at is not None
+
+    @property
+    def stopped(self) -> bool:
+        return self.stopped_at is not None
+
+    def elapsed_ns(self) -> int:
+        """Race time in nanoseconds, not counting pauses"""
+        if self.stopped_at is not None:
+            end = self.stopped_at
+        elif self.paused_at is not None:
+            end = self.paused_at
+        else:
+            end = self.now()
+        return end - self.start_ns - self.paused_ns
+
+    def elapsed(self) -> float:
+        """Race time in seconds, not counting pauses"""
+        return self.elapsed_ns() / 1e9
+
+    def pause(self) -> None:
+        if self.paused_at is None and self.stopped_at is None:
+            self.paused_at = self.now()
+
+    def resume(self) -> None:
+        if self.paused_at is not None:
+            self.paused_ns += self.now() - self.paused_at
+            self.paused_at = None
+
+    def lap(self) -> float:
+        """Mark the end of a lap and return its split in seconds"""
+        mark = self.elapsed_ns()
+        previous = self.lap_marks[-1] if self.lap_marks else 0
+        self.lap_marks.append(mark)
+        return (mark - previous) / 1e9
+
+    @property
+    def splits(self):
+        """Seconds taken by each completed lap"""
+        previous = 0
+        splits = []
+        for mark in self.lap_marks:
+            splits.append((mark - previous) / 1e9)
+            previous = mark
+        return splits
+
+    @property
+    def lap_times(self):
+        """Race time in seconds at the end of each completed lap"""
+        return [mark / 1e9 for mark in self.lap_marks]
+
+    def stop(self) -> float:
+        """Stop the clock for good and return the race time in seconds"""
+        if self.stopped_at is None:
+            self.resume()
+            self.stopped_at = self.now()
+        return self.elapsed()
+
+
+class RaceSession:
+    """State of a single race, independent of any screen or widget"""
+
+    __slots__ = (
+        "difficulty", "challenge", "answers", "total_questions",
+        "current_question_idx", "score", "current_attempts", "max_attempts",
+        "wrong_attempt", "clock", "misses", "target_time",
+    )
+
+    def __init__(self, difficulty: str, challenge: Challenge, clock=None, target_time=None):
+        self.difficulty = difficulty
+        self.challenge = challenge
+        self.answers = challenge.answers
+        self.total_questions = len(self.answers)
+        self.current_question_idx = 0
+        self.score = 0
+        self.current_attempts = 0  # Attempts on current question
+        self.max_attempts = 2  # Maximum attempts per question
+        self.wrong_attempt = False  # Decides to give point for question or not
+        self.clock = clock if clock is not None else RaceClock()
+        self.misses = array("B", bytes(self.total_questions))  # Wrong answers per question
+        # Seconds for full speed points
+        self.target_time = target_time if target_time is not None else TARGET_TIMES[difficulty]
+
+    @property
+    def finished(self) -> bool:
+        return self.current_question_idx >= self.total_questions
+
+    @property
+    def current_question(self):
+        """The Question being raced, or None once every checkpoint is passed"""
+        if self.current_question_idx < self.total_questions:
+            return self.challenge.question(self.current_question_idx)
+        return None
+
+    @property
+    def current_answer(self) -> int:
+        return self.answers[self.current_question_idx]
+
+    def submit(self, answer: int) -> bool:
+        """Check an answer for the current question and advance if correct"""
+        if answer != self.answers[self.current_question_idx]:
+            self.current_attempts += 1
+            self.wrong_attempt = True
+            if self.misses[self.current_question_idx] < 255:
+                self.misses[self.current_question_idx] += 1
+            return False
+
+        # A question answered after a miss earns no point
+        if self.wrong_attempt:
+            self.wrong_attempt = False
+        else:
+            self.score += 1
+        self.current_attempts = 0
+        self.current_question_idx += 1
+        self.clock.lap()
+        return True
+
+    def elapsed(self) -> float:
+        """Seconds of race time so far (frozen once finished)"""
+        return self.clock.elapsed()
+
+    @property
+    def splits(self):
+        """Seconds spent on each question answered so far"""
+        return self.clock.splits
+
+    @property
+    def checkpoint_times(self):
+        """Race time in seconds at which each question so far was answered"""
+        return self.clock.lap_times
+
+    def finish(self) -> RaceResult:
+        """Stop the race clock and compute the final result"""
+        return score_race(self.difficulty, self.score, self.total_questions, self.clock.stop(), self.target_time)
+
+
+class Ghost:
+    """An earlier run's checkpoint times, replayed as positions on the race track
+
+    Where the ghost is at every GHOST_TICK of the run is worked out up front,
+    so following it on each clock tick is one array lookup.
+    """
+
+    __slots__ = ("total", "steps", "positions", "checkpoints", "_ticks_per_second")
+
+    def __init__(self, checkpoint_times, steps: int = 20):
+        self.total = len(checkpoint_times)  # Checkpoints in the run
+        self.steps = steps  # Track positions from start to finish line
+        ticks = int(checkpoint_times[-1] / GHOST_TICK) + 1 if self.total else 0
+        self.positions = array("B", bytes(ticks))
+        self.checkpoints = array("B", bytes(ticks))
+        passed = 0
+        previous = 0.0
+        for tick in range(ticks):
+            now = tick * GHOST_TICK
+            while passed < self.total and checkpoint_times[passed] <= now:
+                previous = checkpoint_times[passed]
+                passed += 1
+            self.checkpoints[tick] = passed
+            if passed < self.total:
+                # Part way to the next checkpoint
+                fraction = (now - previous) / (checkpoint_times[passed] - previous)
+                self.positions[tick] = int((passed + fraction) * steps / self.total)
+            else:
+                self.positions[tick] = steps
+        self._ticks_per_second = 1 / GHOST_TICK
+
+    def position(self, elapsed: float) -> int:
+        """Track position (0 to steps) after elapsed seconds of race time"""
+        tick = int(elapsed * self._ticks_per_second)
+        return self.positions[tick] if tick < len(self.positions) else self.steps
+
+    def checkpoint(self, elapsed: float) -> int:
+        """Checkpoints passed after elapsed seconds of race time"""
+        tick = int(elapsed * self._ticks_per_second)
+        return self.checkpoints[tick] if tick < len(self.checkpoints) else self.total
+
+
+def simulate_race(difficulty: str, challenge: Challenge, answers, elapsed_time: float) -> RaceResult:
+    """Run a whole race from a sequence of answers without a UI
+
+    The answers are submitted in order until the race is finished and the
+    race is scored as if it took elapsed_time seconds.
+    """
+    session = RaceSession(difficulty, challenge, clock=RaceClock(_zero_clock))
+    submit = session.submit
+    total = session.total_questions
+    for answer in answers:
+        submit(answer)
+        if session.current_question_idx >= total:
+            break
+    return score_race(difficulty, session.score, total, elapsed_time)
+
+
+def _zero_clock() -> int:
+    return 0
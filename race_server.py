@@ -0,0 +1,464 @@
+"""
+Multiplayer race server for Code Racer
+An asyncio server that holds the authoritative race sessions for
+head-to-head races and broadcasts every racer's checkpoints to the room
+
+Protocol: one JSON object per line over TCP
+    client -> server
+        {"type": "join", "player": name, "difficulty": difficulty}
+        {"type": "answer", "answer": line}
+    server -> client
+        {"type": "joined", "room": id, "player": name, "challenge": {"code": ..., "questions": [text, ...]},
+         "players": [name, ...], "starts_in": seconds}
+        {"type": "start"}
+        {"type": "checked", "correct": bool, "answer": line, "checkpoint": n, "result": {...} or null}
+        {"type": "progress", "player": name, "checkpoint": n, "total": n}
+        {"type": "finished", "player": name, "final_score": n, "rank": rank}
+        {"type": "left", "player": name}
+        {"type": "error", "message": text}
+
+Answers are checked on the server and a question's line is only sent
+back once that question has been answered, in its "checked" reply. The
+final "checked" of a race carries the racer's RaceResult.
+
+Room broadcasts are encoded once and kept per racer as "latest state", so
+a client that reads slowly only ever has one pending update per rival and
+never holds back the rest of the room.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+from collections import deque
+
+from race_engine import Challenge, Question, RaceClock, RaceResult, RaceSession, pick_challenge
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Racers per room, and how long a room waits for more racers before starting
+ROOM_SIZE = 8
+START_DELAY = 3.0
+
+# Direct replies queued for a client that is not reading; past this it is dropped
+MAX_OUTBOX = 64
+
+
+def encode(message) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class Connection:
+    """One connected racer and its outgoing messages"""
+
+    __slots__ = ("writer", "outbox", "latest", "ready", "closed", "player", "room", "session")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.outbox = deque()  # Replies to this racer, in order
+        self.latest = {}  # Newest room update per rival, replaced rather than queued
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.player = None
+        self.room = None
+        self.session = None
+
+    def send(self, data: bytes) -> None:
+        if self.closed:
+            return
+        if len(self.outbox) >= MAX_OUTBOX:
+            self.close()
+            return
+        self.outbox.append(data)
+        self.ready.set()
+
+    def send_state(self, key, data: bytes) -> None:
+        if not self.closed:
+            self.latest[key] = data
+            self.ready.set()
+
+    async def write_loop(self) -> None:
+        """Flush queued messages whenever there are some and the socket drains"""
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                chunks = list(self.outbox)
+                self.outbox.clear()
+                chunks.extend(self.latest.values())
+                self.latest.clear()
+                if chunks:
+                    self.writer.write(b"".join(chunks))
+                    await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.ready.set()
+            self.writer.close()
+
+
+class Room:
+    """Racers sharing one challenge and one start signal"""
+
+    def __init__(self, room_id: int, difficulty: str, challenge: Challenge):
+        self.id = room_id
+        self.difficulty = difficulty
+        self.challenge = challenge
+        self.racers = {}
+        self.started = False
+        self.start_handle = None
+
+    def broadcast(self, key, message) -> None:
+        data = encode(message)
+        for racer in self.racers.values():
+            racer.send_state(key, data)
+
+
+class RaceServer:
+    """Matches racers into rooms and checks their answers"""
+
+    def __init__(self, bank, room_size: int = ROOM_SIZE, start_delay: float = START_DELAY, rng=random):
+        self.bank = bank
+        self.room_size = room_size
+        self.start_delay = start_delay
+        self.rng = rng
+        self.waiting_rooms = {}  # difficulty -> room still accepting racers
+        self.connections = set()
+        self.handlers = set()
+        self.server = None
+        self._room_ids = itertools.count(1)
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        for connection in list(self.connections):
+            connection.close()
+        if self.handlers:
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    async def handle(self, reader, writer) -> None:
+        connection = Connection(writer)
+        self.connections.add(connection)
+        self.handlers.add(asyncio.current_task())
+        writer_task = asyncio.create_task(connection.write_loop())
+        try:
+            while not connection.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    kind = message["type"]
+                except (ValueError, KeyError, TypeError):
+                    connection.send(encode({"type": "error", "message": "malformed message"}))
+                    continue
+                if kind == "join":
+                    self.join(connection, message)
+                elif kind == "answer":
+                    self.answer(connection, message)
+                else:
+                    connection.send(encode({"type": "error", "message": f"unknown message type {kind!r}"}))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self.leave(connection)
+            connection.close()
+            self.connections.discard(connection)
+            self.handlers.discard(asyncio.current_task())
+            writer_task.cancel()
+
+    def room_for(self, difficulty: str) -> Room:
+        room = self.waiting_rooms.get(difficulty)
+        if room is None:
+            room = Room(next(self._room_ids), difficulty, pick_challenge(self.bank, difficulty, self.rng))
+            room.start_handle = asyncio.get_running_loop().call_later(self.start_delay, self.start_room, room)
+            self.waiting_rooms[difficulty] = room
+        return room
+
+    def join(self, connection: Connection, message) -> None:
+        difficulty = message.get("difficulty")
+        if connection.room is not None:
+            connection.send(encode({"type": "error", "message": "already in a race"}))
+            return
+        if difficulty not in self.bank:
+            connection.send(encode({"type": "error", "message": f"unknown difficulty {difficulty!r}"}))
+            return
+
+        room = self.room_for(difficulty)
+        name = str(message.get("player") or "racer")[:32]
+        unique = name
+        for n in itertools.count(2):
+            if unique not in room.racers:
+                break
+            unique = f"{name}#{n}"
+
+        connection.player = unique
+        connection.room = room
+        room.racers[unique] = connection
+        challenge = room.challenge
+        connection.send(encode({
+            "type": "joined",
+            "room": room.id,
+            "player": unique,
+            "challenge": {"code": challenge.code, "questions": list(challenge.prompts)},
+            "players": list(room.racers),
+            "starts_in": max(0.0, room.start_handle.when() - asyncio.get_running_loop().time()),
+        }))
+        room.broadcast(unique, {"type": "progress", "player": unique, "checkpoint": 0, "total": len(challenge)})
+
+        if len(room.racers) >= self.room_size:
+            room.start_handle.cancel()
+            self.start_room(room)
+
+    def start_room(self, room: Room) -> None:
+        if room.started:
+            return
+        room.started = True
+        if self.waiting_rooms.get(room.difficulty) is room:
+            del self.waiting_rooms[room.difficulty]
+        start = encode({"type": "start"})
+        for racer in room.racers.values():
+            racer.session = RaceSession(room.difficulty, room.challenge, RaceClock())
+            racer.send(start)
+
+    def answer(self, connection: Connection, message) -> None:
+        session = connection.session
+        if session is None or session.finished:
+            connection.send(encode({"type": "error", "message": "no race in progress"}))
+            return
+        try:
+            answer = int(message["answer"])
+        except (KeyError, TypeError, ValueError):
+            connection.send(encode({"type": "error", "message": "answer must be a line number"}))
+            return
+
+        correct_answer = session.current_answer
+        correct = session.submit(answer)
+        result = session.finish()._asdict() if session.finished else None
+        connection.send(encode({
+            "type": "checked",
+            "correct": correct,
+            "answer": correct_answer,
+            "checkpoint": session.current_question_idx,
+            "result": result,
+        }))
+        if not correct:
+            return
+
+        room = connection.room
+        player = connection.player
+        if result is None:
+            room.broadcast(player, {"type": "progress", "player": player,
+                                    "checkpoint": session.current_question_idx, "total": session.total_questions})
+        else:
+            room.broadcast(player, {"type": "finished", "player": player,
+                                    "final_score": result["final_score"], "rank": result["rank"]})
+
+    def leave(self, connection: Connection) -> None:
+        room = connection.room
+        if room is None:
+            return
+        connection.room = None
+        room.racers.pop(connection.player, None)
+        if room.racers:
+            room.broadcast(connection.player, {"type": "left", "player": connection.player})
+        elif not room.started:
+            room.start_handle.cancel()
+            if self.waiting_rooms.get(room.difficulty) is room:
+                del self.waiting_rooms[room.difficulty]
+
+
+class RaceClient:
+    """Client side of the race protocol
+
+    join() and answer() wait for the server's reply; every other message
+    (start, progress, finished, left) is passed to on_event, or held until
+    a handler is set. When the server closes the connection or sends a
+    line that is not JSON, on_event gets {"type": "disconnected"}.
+    """
+
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self.reader = None
+        self.writer = None
+        self._replies = deque()
+        self._held_events = []
+        self._read_task = None
+        self._closed = False
+
+    def set_event_handler(self, on_event) -> None:
+        """Start passing events to on_event, beginning with any held ones"""
+        self.on_event = on_event
+        held, self._held_events = self._held_events, []
+        for message in held:
+            on_event(message)
+
+    async def connect(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    # Nothing after a garbled line can be trusted; treat it as the end
+                    break
+                if message["type"] in ("joined", "checked", "error") and self._replies:
+                    self._replies.popleft().set_result(message)
+                else:
+                    self._event(message)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            error = ConnectionError("race server closed the connection")
+            while self._replies:
+                self._replies.popleft().set_exception(error)
+            self.writer.close()
+        if not self._closed:
+            self._event({"type": "disconnected"})
+
+    def _event(self, message) -> None:
+        if self.on_event is not None:
+            self.on_event(message)
+        else:
+            self._held_events.append(message)
+
+    async def _request(self, message):
+        reply = asyncio.get_running_loop().create_future()
+        self._replies.append(reply)
+        self.writer.write(encode(message))
+        await self.writer.drain()
+        message = await reply
+        if message["type"] == "error":
+            raise RuntimeError(message["message"])
+        return message
+
+    async def join(self, player: str, difficulty: str):
+        return await self._request({"type": "join", "player": player, "difficulty": difficulty})
+
+    async def answer(self, answer: int):
+        return await self._request({"type": "answer", "answer": answer})
+
+    async def close(self) -> None:
+        self._closed = True
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        if self._read_task is not None:
+            self._read_task.cancel()
+
+
+class RemoteRace:
+    """Client-side view of a race whose answers are checked by the server
+
+    Offers the parts of RaceSession's interface the game screen reads, with
+    the question position and final result taken from the server's replies.
+    """
+
+    def __init__(self, difficulty: str, joined):
+        challenge = joined["challenge"]
+        prompts = challenge["questions"]
+        self.difficulty = difficulty
+        self.player = joined["player"]
+        # The client never sees the answers, so they are left as zeros
+        self.challenge = Challenge(challenge["code"].split("\n"), prompts, [0] * len(prompts))
+        self.total_questions = len(prompts)
+        self.current_question_idx = 0
+        self.started = False
+        self.result = None
+        self.clock = RaceClock()
+        self.clock.pause()
+
+    @property
+    def finished(self) -> bool:
+        return self.current_question_idx >= self.total_questions
+
+    @property
+    def current_question(self):
+        if self.current_question_idx < self.total_questions:
+            return Question(self.challenge.prompts[self.current_question_idx], 0)
+        return None
+
+    def start(self) -> None:
+        self.started = True
+        self.clock.resume()
+
+    def apply(self, checked) -> None:
+        """Take the position (and final result) from a "checked" reply"""
+        if checked["correct"]:
+            self.clock.lap()
+        self.current_question_idx = checked["checkpoint"]
+        if checked["result"] is not None:
+            self.result = RaceResult(**checked["result"])
+
+    def elapsed(self) -> float:
+        return self.clock.elapsed()
+
+    @property
+    def splits(self):
+        return self.clock.splits
+
+    @property
+    def checkpoint_times(self):
+        return self.clock.lap_times
+
+    def finish(self) -> RaceResult:
+        self.clock.stop()
+        return self.result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Code Racer multiplayer race server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--pack", metavar="PATH", help="serve challenges from a challenge pack file")
+    parser.add_argument("--room-size", type=int, default=ROOM_SIZE)
+    parser.add_argument("--start-delay", type=float, default=START_DELAY)
+    args = parser.parse_args()
+
+    if args.pack:
+        from challenge_pack import ChallengePack
+        bank = ChallengePack(args.pack)
+    else:
+        from builtin_challenges import BUILTIN_BANK
+        bank = BUILTIN_BANK
+
+    async def serve():
+        server = RaceServer(bank, room_size=args.room_size, start_delay=args.start_delay)
+        await server.start(args.host, args.port)
+        print(f"Race server listening on {args.host}:{server.port}")
+        async with server.server:
+            await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
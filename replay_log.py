@@ -0,0 +1,162 @@
+"""
+Race replay log for Code Racer
+An append-only log of every race: its challenge, each change to the answer
+box, each submission and how the race ended, timestamped with monotonic_ns
+
+Every event is one fixed-size record, so writing costs a struct.pack and a
+buffered write, and a log can be scanned without parsing anything else.
+
+Log layout (all integers little-endian):
+    header  magic b"CRRL", version u16, record size u16
+    records time_ns u64, payload u64, kind u8, difficulty u8, reserved u16, value i32
+
+    START   payload = challenge key, value = bank index (-1 if unknown)
+    INPUT   payload = answer box text (first 8 UTF-8 bytes), value = its length
+    SUBMIT  value = the answer submitted (-1 if it was not a number)
+    FINISH  value = final score
+    ABORT   the player left before finishing
+"""
+
+import os
+import struct
+import time
+from typing import NamedTuple
+
+from race_engine import TARGET_TIMES, challenge_key
+from user_dirs import data_dir
+
+
+MAGIC = b"CRRL"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<QQBBHi")
+
+START, INPUT, SUBMIT, FINISH, ABORT = range(5)
+
+DIFFICULTIES = tuple(TARGET_TIMES)
+UNKNOWN_DIFFICULTY = 255
+
+# Records written before the buffer is handed to the OS
+BUFFER_SIZE = 64 * 1024
+
+# Records read at a time when scanning a log
+READ_RECORDS = 4096
+
+
+def encode_text(text: str) -> int:
+    return int.from_bytes(text.encode("utf-8")[:8], "little")
+
+
+def decode_text(payload: int, length: int) -> str:
+    data = payload.to_bytes(8, "little").rstrip(b"\0")
+    return data.decode("utf-8", errors="ignore")[:length]
+
+
+class Event(NamedTuple):
+    time_ns: int
+    kind: int
+    value: int
+    text: str  # INPUT events only
+
+
+class RecordedRace(NamedTuple):
+    """One race read back from a log"""
+
+    difficulty: str
+    challenge_key: str
+    index: int
+    start_ns: int
+    events: list
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.events) and self.events[-1].kind == FINISH
+
+
+class ReplayLog:
+    """Appends race events to a log file through a write buffer"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(data_dir(), "races.crlog")
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab", buffering=BUFFER_SIZE)
+        if new:
+            self._file.write(_HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.difficulty = UNKNOWN_DIFFICULTY
+
+    def _write(self, kind: int, payload: int = 0, value: int = 0) -> None:
+        self._file.write(RECORD.pack(time.monotonic_ns(), payload, kind, self.difficulty, 0, value))
+
+    def start(self, difficulty: str, challenge_key: str, index=None) -> None:
+        self.difficulty = DIFFICULTIES.index(difficulty) if difficulty in DIFFICULTIES else UNKNOWN_DIFFICULTY
+        self._write(START, int(challenge_key, 16), -1 if index is None else index)
+
+    def input(self, text: str) -> None:
+        self._write(INPUT, encode_text(text), len(text))
+
+    def submit(self, answer) -> None:
+        self._write(SUBMIT, 0, -1 if answer is None else answer)
+
+    def finish(self, final_score: int) -> None:
+        self._write(FINISH, 0, final_score)
+        self._file.flush()
+
+    def abort(self) -> None:
+        self._write(ABORT)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def iter_races(path: str):
+    """Every race in a log, oldest first, holding only one race in memory"""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"{path}: not a race replay log")
+        magic, version, record_size = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path}: not a race replay log")
+        race = None
+        while True:
+            data = f.read(READ_RECORDS * RECORD.size)
+            # A record cut short by a crash mid-write ends the log
+            data = data[:len(data) // RECORD.size * RECORD.size]
+            if not data:
+                break
+            for time_ns, payload, kind, difficulty, _, value in RECORD.iter_unpack(data):
+                if kind == START:
+                    if race is not None:
+                        yield race
+                    name = DIFFICULTIES[difficulty] if difficulty < len(DIFFICULTIES) else None
+                    race = RecordedRace(name, f"{payload:016x}", None if value < 0 else value, time_ns, [])
+                elif race is not None:
+                    text = decode_text(payload, value) if kind == INPUT else ""
+                    race.events.append(Event(time_ns, kind, value, text))
+        if race is not None:
+            yield race
+
+
+def read_races(path: str):
+    """Every race in a log, oldest first"""
+    return list(iter_races(path))
+
+
+def find_challenge(bank, race: RecordedRace):
+    """The challenge a recorded race was run on, or None if the bank no longer has it"""
+    if race.difficulty not in bank:
+        return None
+    challenges = bank[race.difficulty]
+    if race.index is not None and race.index < len(challenges):
+        challenge = challenges[race.index]
+        if challenge_key(challenge) == race.challenge_key:
+            return challenge
+    # The bank was reordered since; look for the same challenge anywhere in it
+    for challenge in challenges:
+        if challenge_key(challenge) == race.challenge_key:
+            return challenge
+    return None
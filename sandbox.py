@@ -0,0 +1,281 @@
+"""
+Sandboxed snippet runner for Code Racer
+Runs Python snippets in a warm pool of worker processes and reports what
+each one printed and the final values of its top-level names
+
+Each worker is a separate interpreter with a memory cap, no file writes,
+a short list of importable modules and no open(), and every snippet gets a
+time limit; a worker that overruns it is killed and replaced. This keeps
+harvested code from doing damage by accident, it is not a security
+boundary for hostile code. Only tools that build challenge banks use it,
+never the game itself.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+# Seconds a snippet may run before it is stopped
+TIMEOUT = 1.0
+# Extra seconds before a worker that ignored the time limit is killed
+KILL_GRACE = 0.5
+
+# Address space cap for each worker
+MEMORY_LIMIT = 512 * 1024 * 1024
+
+# Longest printed output and value repr kept
+MAX_OUTPUT = 4096
+MAX_REPR = 200
+
+# Modules a snippet may import (all deterministic)
+ALLOWED_MODULES = frozenset({
+    "bisect", "collections", "dataclasses", "enum", "fractions", "functools",
+    "heapq", "itertools", "math", "operator", "string", "typing",
+})
+
+# Value types whose repr is reported
+_PLAIN_TYPES = (bool, int, float, str, list, tuple, dict, set, type(None))
+
+_BLOCKED_BUILTINS = ("open", "input", "exit", "quit", "help", "breakpoint", "compile", "eval", "exec", "globals", "vars")
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+class _CappedOutput:
+    """sys.stdout for a snippet: keeps what it prints, up to MAX_OUTPUT characters"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, text: str) -> int:
+        self.size += len(text)
+        if self.size > MAX_OUTPUT:
+            raise OutputLimitExceeded()
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+
+def _guarded_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name.partition(".")[0] not in ALLOWED_MODULES:
+        raise ImportError(f"import of {name!r} is not allowed")
+    return __import__(name, globals, locals, fromlist, level)
+
+
+def _safe_builtins():
+    import builtins
+
+    allowed = {name: value for name, value in vars(builtins).items() if name not in _BLOCKED_BUILTINS}
+    allowed["__import__"] = _guarded_import
+    return allowed
+
+
+def _limit_resources() -> None:
+    try:
+        import resource
+    except ImportError:
+        # No rlimits on this platform; the time limit still applies
+        return
+    for limit, value in ((resource.RLIMIT_AS, MEMORY_LIMIT), (resource.RLIMIT_FSIZE, 0)):
+        try:
+            resource.setrlimit(limit, (value, value))
+        except (ValueError, OSError):
+            pass
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError()
+
+
+def run_snippet(code: str, builtins_dict) -> dict:
+    """Run one snippet in this process: {"ok", "stdout", "values", "error"}"""
+    namespace = {"__name__": "__main__", "__builtins__": builtins_dict}
+    output = _CappedOutput()
+    real_stdout = sys.stdout
+    sys.stdout = output
+    error = None
+    try:
+        exec(compile(code, "<snippet>", "exec"), namespace)
+    except BaseException as exc:  # The snippet may raise anything, SystemExit included
+        error = type(exc).__name__
+    finally:
+        sys.stdout = real_stdout
+    values = {}
+    if error is None:
+        for name, value in namespace.items():
+            if name.startswith("_") or not isinstance(value, _PLAIN_TYPES):
+                continue
+            try:
+                text = repr(value)
+            except Exception:
+                continue
+            if len(text) <= MAX_REPR:
+                values[name] = text
+    return {"ok": error is None, "stdout": output.getvalue(), "values": values, "error": error}
+
+
+def serve() -> None:
+    """Worker loop: one JSON request per line on stdin, one JSON result per line on stdout"""
+    import signal
+
+    # Imported before the memory cap, and so snippets import them for free
+    for name in ALLOWED_MODULES:
+        __import__(name)
+    _limit_resources()
+    builtins_dict = _safe_builtins()
+    has_alarm = hasattr(signal, "setitimer")
+    if has_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+    timeout = float(sys.argv[2]) if len(sys.argv) > 2 else TIMEOUT
+
+    requests = sys.stdin
+    responses = sys.stdout
+    sys.setrecursionlimit(2000)
+    for line in requests:
+        code = json.loads(line)["code"]
+        if has_alarm:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            result = run_snippet(code, builtins_dict)
+        except (TimeoutError, MemoryError) as exc:
+            # Raised after the snippet's own handlers were gone
+            result = {"ok": False, "stdout": "", "values": {}, "error": type(exc).__name__}
+        finally:
+            if has_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        responses.write(json.dumps(result) + "\n")
+        responses.flush()
+
+
+class _Worker:
+    """One warm worker process"""
+
+    def __init__(self, timeout: float, cwd: str):
+        self.timeout = timeout
+        self.cwd = cwd
+        self.process = None
+        self.start()
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, "-S", "-B", os.path.abspath(__file__), "--worker", str(self.timeout)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd,
+            # Fixed hash seed so set and dict orders, and so the output, never vary
+            env={"PYTHONHASHSEED": "0", "PYTHONIOENCODING": "utf-8"},
+        )
+
+    def run(self, code: str) -> dict:
+        killed = threading.Event()
+
+        def kill():
+            killed.set()
+            self.process.kill()
+
+        timer = threading.Timer(self.timeout + KILL_GRACE, kill)
+        timer.start()
+        try:
+            self.process.stdin.write(json.dumps({"code": code}).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except OSError:
+            line = b""
+        finally:
+            timer.cancel()
+        if line:
+            return json.loads(line)
+        # Killed for running too long, or crashed: replace it
+        self.stop()
+        self.start()
+        return {"ok": False, "stdout": "", "values": {}, "error": "TimeoutError" if killed.is_set() else "WorkerCrashed"}
+
+    def stop(self) -> None:
+        self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class SandboxPool:
+    """A warm pool of sandbox workers, started on first use and kept until closed"""
+
+    def __init__(self, workers=None, timeout: float = TIMEOUT):
+        self.size = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._workers = []
+        self._scratch = None
+
+    def _ensure_workers(self) -> None:
+        if self._scratch is None:
+            # Snippets run in an empty directory of their own
+            self._scratch = tempfile.TemporaryDirectory(prefix="code-racer-sandbox-")
+        while len(self._workers) < self.size:
+            self._workers.append(_Worker(self.timeout, self._scratch.name))
+
+    def run(self, code: str) -> dict:
+        """Run one snippet"""
+        self._ensure_workers()
+        return self._workers[0].run(code)
+
+    def imap_unordered(self, items):
+        """Run (tag, code) pairs across the pool, yielding (tag, result) as they finish"""
+        self._ensure_workers()
+        items = iter(items)
+        lock = threading.Lock()
+        results = queue.Queue(maxsize=4 * self.size)
+
+        def work(worker):
+            while True:
+                with lock:
+                    item = next(items, None)
+                if item is None:
+                    break
+                tag, code = item
+                results.put((tag, worker.run(code)))
+            results.put(None)
+
+        threads = [threading.Thread(target=work, args=(worker,), daemon=True) for worker in self._workers]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        while running:
+            item = results.get()
+            if item is None:
+                running -= 1
+            else:
+                yield item
+        for thread in threads:
+            thread.join()
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        if self._scratch is not None:
+            self._scratch.cleanup()
+            self._scratch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--worker"]:
+    serve()
@@ -0,0 +1,287 @@
+"""
+Adaptive challenge scheduler for Code Racer
+Spaced repetition over a challenge bank: challenges a player stumbles on
+come back after a race or two, ones they know well come back rarely, and
+unseen challenges fill the gaps in between
+
+Time is counted in races played at a difficulty. Each difficulty keeps its
+reviews in a heap ordered by due race, so picking the next challenge is
+O(log n) however large the bank is, and nothing is done per unseen challenge.
+
+State file layout (all integers little-endian):
+    header      magic b"CRSC", version u16, difficulty count u16
+    difficulty  name length u8, name (utf-8), races played u32, entry count u32
+    entries     per entry: key u64, index u32, due u32, interval u32, ease u16,
+                races u16, streak u16, lapses u16, question count u8
+    questions   per entry: misses u8 for each question, then mean time u16
+                (centiseconds) for each question
+"""
+
+import heapq
+import os
+import random
+import re
+import struct
+import threading
+from array import array
+
+from race_engine import TARGET_TIMES, challenge_key
+from user_dirs import data_dir
+
+
+MAGIC = b"CRSC"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHH")
+_DECK = struct.Struct("<II")
+_ENTRY = struct.Struct("<QIIIHHHHB")
+
+# SM-2 style ease factor, in hundredths
+START_EASE = 250
+MIN_EASE = 130
+
+# Races until the first and second review after answering a challenge well
+FIRST_INTERVAL = 3
+SECOND_INTERVAL = 8
+MAX_INTERVAL = 100_000
+
+# Every this many races, an unseen challenge is raced even if reviews are due
+NEW_CHALLENGE_EVERY = 3
+
+# Unseen challenges tried at random before falling back to the earliest review
+NEW_PICK_ATTEMPTS = 32
+
+
+class Entry:
+    """What the scheduler knows about one challenge a player has raced"""
+
+    __slots__ = ("key", "index", "due", "interval", "ease", "races", "streak", "lapses", "misses", "times")
+
+    def __init__(self, key: int, index: int, questions: int):
+        self.key = key  # challenge_key as an integer, to notice a changed bank
+        self.index = index  # Position in bank[difficulty]
+        self.due = 0  # Race number at which it should come back
+        self.interval = 0
+        self.ease = START_EASE
+        self.races = 0
+        self.streak = 0  # Good races in a row
+        self.lapses = 0
+        self.misses = array("B", bytes(questions))  # Wrong answers per question, all races
+        self.times = array("H", bytes(2 * questions))  # Mean centiseconds per question
+
+
+class Deck:
+    """Scheduling state for one difficulty"""
+
+    __slots__ = ("races", "entries", "heap")
+
+    def __init__(self):
+        self.races = 0
+        self.entries = {}  # Bank index -> Entry
+        self.heap = []  # (due, index); stale pairs are skipped when popped
+
+    def rebuild_heap(self) -> None:
+        self.heap = [(entry.due, index) for index, entry in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def earliest(self):
+        """The Entry due soonest, or None"""
+        heap = self.heap
+        while heap:
+            due, index = heap[0]
+            entry = self.entries.get(index)
+            if entry is not None and entry.due == due:
+                return entry
+            heapq.heappop(heap)
+        return None
+
+
+def race_quality(difficulty: str, misses, splits, target_time=None) -> int:
+    """SM-2 style grade (0-5) for a race: first-try answers, less one if slow"""
+    total = len(misses)
+    if not total:
+        return 5
+    first_try = sum(1 for count in misses if not count)
+    quality = round(5 * first_try / total)
+    if target_time is None:
+        target_time = TARGET_TIMES[difficulty]
+    target_per_question = target_time / total
+    if quality >= 3 and splits and sum(splits) / len(splits) > target_per_question:
+        quality -= 1
+    return quality
+
+
+def _file_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "_"
+
+
+class Scheduler:
+    """Picks the next challenge for a player and learns from each race
+
+    pick, record and save may be called from different threads.
+    """
+
+    def __init__(self, path=None, rng=random):
+        self.path = path
+        self.rng = rng
+        self.decks = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    @classmethod
+    def for_player(cls, player: str, bank_name: str = "builtin"):
+        """The saved scheduler for a player and a bank (fresh if none was saved)"""
+        path = os.path.join(data_dir("schedules", _file_name(player)), f"{_file_name(bank_name)}.sched")
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error, UnicodeDecodeError):
+            # An unreadable state file is replaced on the next save
+            scheduler = cls()
+            scheduler.path = path
+            return scheduler
+
+    def deck(self, difficulty: str) -> Deck:
+        deck = self.decks.get(difficulty)
+        if deck is None:
+            deck = self.decks[difficulty] = Deck()
+        return deck
+
+    def pick(self, bank, difficulty: str, exclude=None):
+        """(index, challenge) to race next from bank[difficulty]
+
+        A challenge whose review is due comes first, except that every
+        NEW_CHALLENGE_EVERY races brings an unseen challenge; with no
+        review due it is an unseen challenge, or else the one due soonest.
+        The bank index exclude (the challenge still being raced, say) is
+        only picked if there is nothing else.
+        """
+        with self._lock:
+            return self._pick(bank[difficulty], self.deck(difficulty), difficulty, exclude)
+
+    def _pick(self, challenges, deck: Deck, difficulty: str, exclude=None):
+        new_turn = deck.races % NEW_CHALLENGE_EVERY == NEW_CHALLENGE_EVERY - 1
+        set_aside = None
+        try:
+            while True:
+                entry = deck.earliest()
+                if entry is not None and entry.index == exclude:
+                    # Off the heap until the next best is found
+                    set_aside = heapq.heappop(deck.heap)
+                    continue
+                if entry is None or entry.due > deck.races or new_turn:
+                    index = self._unseen_index(deck, len(challenges), exclude)
+                    if index is not None:
+                        return index, challenges[index]
+                    if entry is None:
+                        if exclude is not None and exclude < len(challenges):
+                            return exclude, challenges[exclude]
+                        raise IndexError(f"no challenges for {difficulty!r}")
+                    new_turn = False
+                if entry.index < len(challenges):
+                    challenge = challenges[entry.index]
+                    if int(challenge_key(challenge), 16) == entry.key:
+                        return entry.index, challenge
+                # The bank changed under this entry; forget it
+                del deck.entries[entry.index]
+        finally:
+            if set_aside is not None:
+                heapq.heappush(deck.heap, set_aside)
+
+    def _unseen_index(self, deck: Deck, count: int, exclude=None):
+        if len(deck.entries) + (exclude is not None and exclude not in deck.entries) >= count:
+            return None
+        for _ in range(NEW_PICK_ATTEMPTS):
+            index = self.rng.randrange(count)
+            if index not in deck.entries and index != exclude:
+                return index
+        return None
+
+    def record(self, index: int, session) -> None:
+        """Learn from a finished race of bank[session.difficulty][index]"""
+        with self._lock:
+            self._record(index, session)
+
+    def _record(self, index: int, session) -> None:
+        deck = self.deck(session.difficulty)
+        deck.races += 1
+        key = int(challenge_key(session.challenge), 16)
+        entry = deck.entries.get(index)
+        if entry is None or entry.key != key or len(entry.misses) != session.total_questions:
+            entry = deck.entries[index] = Entry(key, index, session.total_questions)
+
+        splits = session.splits
+        races = entry.races
+        for i, count in enumerate(session.misses):
+            entry.misses[i] = min(255, entry.misses[i] + count)
+            if i < len(splits):
+                centiseconds = min(65535, int(splits[i] * 100))
+                entry.times[i] = (entry.times[i] * races + centiseconds) // (races + 1)
+        entry.races = min(65535, races + 1)
+
+        quality = race_quality(session.difficulty, session.misses, splits, session.target_time)
+        if quality < 3:
+            entry.streak = 0
+            entry.lapses = min(65535, entry.lapses + 1)
+            entry.interval = 1
+        else:
+            entry.streak = min(65535, entry.streak + 1)
+            if entry.streak == 1:
+                entry.interval = FIRST_INTERVAL
+            elif entry.streak == 2:
+                entry.interval = SECOND_INTERVAL
+            else:
+                entry.interval = min(MAX_INTERVAL, entry.interval * entry.ease // 100)
+        entry.ease = min(65535, max(MIN_EASE, entry.ease + 10 - (5 - quality) * (8 + (5 - quality) * 2)))
+        entry.due = deck.races + entry.interval
+        heapq.heappush(deck.heap, (entry.due, index))
+        # Stale heap pairs pile up as entries are rescheduled
+        if len(deck.heap) > 2 * len(deck.entries) + 64:
+            deck.rebuild_heap()
+
+    def load(self, path: str) -> None:
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a scheduler state file")
+        offset = _HEADER.size
+        for _ in range(count):
+            name_length = data[offset]
+            name = data[offset + 1:offset + 1 + name_length].decode("utf-8")
+            offset += 1 + name_length
+            deck = self.deck(name)
+            deck.races, entry_count = _DECK.unpack_from(data, offset)
+            offset += _DECK.size
+            table_end = offset + entry_count * _ENTRY.size
+            fields = list(_ENTRY.iter_unpack(data[offset:table_end]))
+            offset = table_end
+            for key, index, due, interval, ease, races, streak, lapses, questions in fields:
+                entry = Entry(key, index, 0)
+                entry.due, entry.interval, entry.ease = due, interval, ease
+                entry.races, entry.streak, entry.lapses = races, streak, lapses
+                entry.misses = array("B", data[offset:offset + questions])
+                entry.times = array("H", struct.unpack_from(f"<{questions}H", data, offset + questions))
+                offset += 3 * questions
+                deck.entries[index] = entry
+            deck.rebuild_heap()
+
+    def save(self, path=None) -> None:
+        """Write the state to a file, replacing it atomically"""
+        path = path or self.path
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._lock, open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self.decks)))
+            for name, deck in self.decks.items():
+                encoded = name.encode("utf-8")
+                f.write(bytes([len(encoded)]) + encoded)
+                f.write(_DECK.pack(deck.races, len(deck.entries)))
+                entries = list(deck.entries.values())
+                f.write(b"".join(
+                    _ENTRY.pack(e.key, e.index, e.due, e.interval, e.ease, e.races, e.streak, e.lapses, len(e.misses))
+                    for e in entries
+                ))
+                for e in entries:
+                    f.write(e.misses.tobytes())
+                    f.write(struct.pack(f"<{len(e.times)}H", *e.times))
+        os.replace(tmp_path, path)
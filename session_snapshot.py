@@ -0,0 +1,208 @@
+"""
+Session snapshots for Code Racer
+The race in progress, saved after every answer so that a race cut short by
+a closed or crashed terminal can be resumed where it stopped
+
+A snapshot is a few hundred bytes, packed on the UI thread in microseconds
+and written on a background thread. Each write goes to a temporary file
+that then replaces the old snapshot, so a snapshot on disk is always whole.
+
+Snapshot layout (all integers little-endian):
+    header     magic b"CRSS", version u16, difficulty u8, wrong attempt u8,
+               bank index i32 (-1 if unknown), question u16, score u16,
+               attempts u16, questions u16, race time ns u64, target time f64
+    misses     u8 per question
+    laps       race time ns u64 per checkpoint passed
+    challenge  the challenge as UTF-8 JSON
+"""
+
+import json
+import os
+import queue
+import struct
+import threading
+from array import array
+from typing import NamedTuple
+
+from race_engine import TARGET_TIMES, Challenge, RaceClock, RaceSession
+from user_dirs import session_snapshot_path
+
+
+MAGIC = b"CRSS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHBBiHHHHQd")
+
+DIFFICULTIES = tuple(TARGET_TIMES)
+
+_STOP = object()
+_UNREAD = object()
+
+
+class Snapshot(NamedTuple):
+    """A race read back from a snapshot, ready to carry on"""
+
+    index: int  # Bank index of the challenge, or None if unknown
+    session: RaceSession  # Its clock paused at the saved race time
+
+
+class _ChallengeCache:
+    """The encoded challenge of the race being saved, so each answer only packs the race state"""
+
+    __slots__ = ("challenge", "data")
+
+    def __init__(self):
+        self.challenge = None
+        self.data = b""
+
+    def encode(self, challenge: Challenge) -> bytes:
+        if challenge is not self.challenge:
+            self.challenge = challenge
+            self.data = json.dumps(challenge.to_dict(), separators=(",", ":")).encode("utf-8")
+        return self.data
+
+
+def pack_session(session: RaceSession, index=None, cache=None) -> bytes:
+    """A snapshot of a race in progress"""
+    challenge = (cache or _ChallengeCache()).encode(session.challenge)
+    header = _HEADER.pack(
+        MAGIC, VERSION, DIFFICULTIES.index(session.difficulty), session.wrong_attempt,
+        -1 if index is None else index, session.current_question_idx, session.score,
+        session.current_attempts, session.total_questions, session.clock.elapsed_ns(), session.target_time,
+    )
+    return b"".join((header, session.misses.tobytes(), array("Q", session.clock.lap_marks).tobytes(), challenge))
+
+
+def unpack_session(data: bytes):
+    """The Snapshot in some bytes, or None if they are not a snapshot of an unfinished race"""
+    if len(data) < _HEADER.size:
+        return None
+    (magic, version, difficulty, wrong_attempt, index, question, score,
+     attempts, questions, elapsed_ns, target_time) = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or difficulty >= len(DIFFICULTIES) or question >= questions:
+        return None
+    offset = _HEADER.size
+    misses = array("B", data[offset:offset + questions])
+    offset += questions
+    laps = array("Q", data[offset:offset + 8 * question])
+    offset += 8 * question
+    if len(misses) != questions or len(laps) != question:
+        return None
+    try:
+        challenge = Challenge.from_dict(json.loads(data[offset:].decode("utf-8")))
+    except (ValueError, KeyError, TypeError):
+        return None
+    if len(challenge) != questions:
+        return None
+
+    # The clock is paused at the saved race time, and carries on when the race is shown
+    clock = RaceClock()
+    clock.start_ns -= elapsed_ns
+    clock.lap_marks = laps.tolist()
+    clock.pause()
+    session = RaceSession(DIFFICULTIES[difficulty], challenge, clock, target_time)
+    session.current_question_idx = question
+    session.score = score
+    session.current_attempts = attempts
+    session.wrong_attempt = bool(wrong_attempt)
+    session.misses = misses
+    return Snapshot(None if index < 0 else index, session)
+
+
+class SessionSnapshots:
+    """The saved snapshot of the latest unfinished race, replaced on a background thread
+
+    Nothing is read until the saved race is loaded, and the writer thread
+    starts with the first snapshot written.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = session_snapshot_path()
+        self.path = path
+        self._latest = _UNREAD  # Snapshot bytes, None once discarded, or _UNREAD for whatever is on disk
+        self._cache = _ChallengeCache()
+        self._pending = queue.Queue()
+        self._writer = None
+
+    @property
+    def saved(self) -> bool:
+        """Whether there is a saved race, without reading it"""
+        if self._latest is _UNREAD:
+            return os.path.exists(self.path)
+        return self._latest is not None
+
+    def save(self, session: RaceSession, index=None) -> None:
+        """Queue a snapshot of a race in progress (bank index or None); returns immediately"""
+        self._latest = pack_session(session, index, self._cache)
+        self._queue(self._latest)
+
+    def discard(self) -> None:
+        """Forget the saved race, once it is finished"""
+        if self._latest is not None:
+            self._latest = None
+            self._queue(None)
+
+    def load(self):
+        """The saved race as a Snapshot, or None if there is none to resume"""
+        if self._latest is _UNREAD:
+            try:
+                with open(self.path, "rb") as f:
+                    self._latest = f.read()
+            except OSError:
+                self._latest = None
+        if self._latest is None:
+            return None
+        snapshot = unpack_session(self._latest)
+        if snapshot is None:
+            # Corrupt or from another version; it would only be offered again
+            self.discard()
+        return snapshot
+
+    def _queue(self, data) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="snapshot-writer", daemon=True)
+            self._writer.start()
+        self._pending.put(data)
+
+    def _write_loop(self) -> None:
+        while True:
+            items = [self._pending.get()]
+            while True:
+                try:
+                    items.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = items[-1] is _STOP
+            if stop:
+                items.pop()
+            # Only the newest snapshot matters
+            if items:
+                self._write(items[-1])
+            for _ in range(len(items) + stop):
+                self._pending.task_done()
+            if stop:
+                return
+
+    def _write(self, data) -> None:
+        try:
+            if data is None:
+                os.remove(self.path)
+                return
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Not saved this time (or nothing to remove); the race goes on regardless
+            pass
+
+    def flush(self) -> None:
+        """Wait until the latest snapshot is on disk"""
+        self._pending.join()
+
+    def close(self) -> None:
+        """Write the latest snapshot and stop the writer"""
+        if self._writer is not None:
+            self._pending.put(_STOP)
+            self._writer.join()
@@ -0,0 +1,31 @@
+"""
+Per-user directories for Code Racer's caches and saved data
+Follows the XDG base directory variables, falling back to ~/.cache and ~/.local/share
+"""
+
+import os
+
+
+APP_NAME = "code_racer"
+
+
+def cache_dir(*parts) -> str:
+    """Directory for data that can be rebuilt at any time (created if missing)"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return _ensure(os.path.join(base, APP_NAME, *parts))
+
+
+def data_dir(*parts) -> str:
+    """Directory for data the player would miss if it was deleted (created if missing)"""
+    base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return _ensure(os.path.join(base, APP_NAME, *parts))
+
+
+def session_snapshot_path() -> str:
+    """File the unfinished race is saved to; checked by the home screen before any race module loads"""
+    return os.path.join(data_dir(), "session.snapshot")
+
+
+def _ensure(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    return path